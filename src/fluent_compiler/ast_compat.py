@@ -44,12 +44,14 @@ Index = ast.Index
 List = ast.List
 Load = ast.Load
 Module = ast.Module
+Not = ast.Not
 Or = ast.Or
 Pass = ast.Pass
 Return = ast.Return
 Store = ast.Store
 Subscript = ast.Subscript
 Tuple = ast.Tuple
+UnaryOp = ast.UnaryOp
 arguments = ast.arguments
 JoinedStr = ast.JoinedStr
 FormattedValue = ast.FormattedValue
@@ -1,4 +1,8 @@
-from .compiler import compile_messages
+import weakref
+
+import attr
+
+from .compiler import compile_messages, compile_messages_async, get_compile_options
 from .resource import FtlResource
 from .utils import ATTRIBUTE_SEPARATOR, TERM_SIGIL
 
@@ -16,38 +20,132 @@ class FluentBundle:
 
     """
 
-    def __init__(self, locale, resources, functions=None, use_isolating=True, escapers=None):
-        self.locale = locale
-        compiled_ftl = compile_messages(
+    def __init__(self, locale, resources, functions=None, use_isolating=True, escapers=None, **options):
+        """
+        `options` are the other keyword arguments of `compile_messages`.
+        """
+        self._set_options(
             locale,
             resources,
-            use_isolating=use_isolating,
-            functions=functions,
-            escapers=escapers,
+            dict(options, functions=functions, use_isolating=use_isolating, escapers=escapers),
         )
-        self._compiled_messages = compiled_ftl.message_functions
+        self._install(compile_messages(locale, resources, **self._compile_options()))
+
+    @classmethod
+    def from_compiled_ftl(cls, compiled_ftl, resources=None, **options):
+        """
+        Creates a bundle from an already compiled CompiledFtl object. The
+        options should be the ones it was compiled with, and `resources` is
+        needed to use `recompile` without passing resources.
+        """
+        bundle = cls.__new__(cls)
+        bundle._set_options(compiled_ftl.locale, resources, options)
+        bundle._install(compiled_ftl)
+        return bundle
+
+    def _set_options(self, locale, resources, options):
+        self.locale = locale
+        self._resources = resources
+        self._options = get_compile_options(options)
+        # Weak references to methods to call when the compiled messages are
+        # replaced, see `_add_install_callback`
+        self._install_callbacks = []
+
+    @property
+    def _fallbacks(self):
+        return self._options["fallbacks"]
+
+    def _compile_options(self):
+        if self._fallbacks is None:
+            fallbacks = None
+        else:
+            fallbacks = [bundle._compiled_ftl for bundle in self._fallbacks]
+        return dict(self._options, fallbacks=fallbacks)
+
+    def _install(self, compiled_ftl):
+        # `format` only uses `_compiled_messages`, which is replaced with a
+        # single assignment, so other threads see either the old or the new
+        # messages, never a mixture.
         self._compilation_errors = compiled_ftl.errors
+        self._message_stats = compiled_ftl.message_stats
+        # Kept for use as a fallback, and for pickling, but without the AST,
+        # which can be large.
+        self._compiled_ftl = attr.evolve(compiled_ftl, module_ast=None)
+        self._compiled_messages = compiled_ftl.message_functions
+        for ref in list(self._install_callbacks):
+            callback = ref()
+            if callback is None:
+                self._install_callbacks.remove(ref)
+            else:
+                callback()
+
+    def _add_install_callback(self, method):
+        # Used by objects that copy `_compiled_messages` and need to know when
+        # it changes. Only a weak reference is kept, so the object can be
+        # garbage collected.
+        self._install_callbacks.append(weakref.WeakMethod(method))
+
+    def recompile(self, resources=None):
+        """
+        Compiles the bundle again, from new resources if passed, and
+        replaces the compiled messages once compilation is complete.
+        """
+        if resources is None:
+            resources = self._get_resources()
+        compiled_ftl = compile_messages(self.locale, resources, **self._compile_options())
+        self._resources = resources
+        self._install(compiled_ftl)
+
+    async def recompile_async(self, resources=None, executor=None):
+        """
+        Version of `recompile` for asyncio code. Compilation is done in the
+        executor (by default the event loop's default executor), and the
+        compiled messages are replaced when it is complete.
+        """
+        if resources is None:
+            resources = self._get_resources()
+        compiled_ftl = await compile_messages_async(
+            self.locale, resources, executor=executor, **self._compile_options()
+        )
+        self._resources = resources
+        self._install(compiled_ftl)
+
+    def __reduce__(self):
+        # The compiled messages are pickled as a CompiledFtl object, see
+        # CompiledFtl.__reduce__
+        return (_restore_bundle, (type(self), self._compiled_ftl, self._resources, self._options))
+
+    def _get_resources(self):
+        if self._resources is None:
+            raise ValueError("This bundle was not created from resources, so they must be passed to recompile")
+        return self._resources
 
     @classmethod
-    def from_string(cls, locale, text, functions=None, use_isolating=True, escapers=None):
+    def from_string(cls, locale, text, functions=None, use_isolating=True, escapers=None, **options):
         return cls(
             locale,
             [FtlResource.from_string(text)],
-            use_isolating=use_isolating,
             functions=functions,
+            use_isolating=use_isolating,
             escapers=escapers,
+            **options,
         )
 
     @classmethod
-    def from_files(cls, locale, filenames, functions=None, use_isolating=True, escapers=None):
+    def from_files(cls, locale, filenames, functions=None, use_isolating=True, escapers=None, **options):
         return cls(
             locale,
-            [FtlResource.from_file(f) for f in filenames],
-            use_isolating=use_isolating,
+            FtlResource.from_files(filenames),
             functions=functions,
+            use_isolating=use_isolating,
             escapers=escapers,
+            **options,
         )
 
+    @classmethod
+    def from_directory(cls, locale, path, pattern="**/*.ftl", **options):
+        return cls(locale, FtlResource.from_directory(path, pattern=pattern), **options)
+
     def has_message(self, message_id):
         if message_id.startswith(TERM_SIGIL) or ATTRIBUTE_SEPARATOR in message_id:
             return False
@@ -59,3 +157,23 @@ class FluentBundle:
 
     def check_messages(self):
         return self._compilation_errors
+
+    def stats(self, reset=False):
+        """
+        Returns a dictionary of message ID to MessageCallStats objects, for
+        bundles created with `instrument` enabled. Pass `reset=True` to reset
+        the counters at the same time.
+        """
+        if not self._options["instrument"]:
+            raise ValueError("FluentBundle.stats requires the bundle to be created with instrument=True")
+        retval = {}
+        for message_id, message_stats in self._message_stats.items():
+            retval[message_id] = message_stats.snapshot()
+            if reset:
+                message_stats.reset()
+        return retval
+
+
+def _restore_bundle(cls, compiled_ftl, resources, options):
+    # Used for unpickling, see FluentBundle.__reduce__
+    return cls.from_compiled_ftl(compiled_ftl, resources, **options)
@@ -0,0 +1,257 @@
+import hashlib
+import sys
+import threading
+import types
+from collections import OrderedDict
+
+import attr
+
+from .bundle import FluentBundle
+from .compiler import (
+    REFERENCE_ESCAPED_CONSTANT,
+    REFERENCE_MESSAGE_STATS,
+    get_compile_options,
+    get_generated_function_code,
+    make_include_predicate,
+)
+
+# Default maximum estimated size of all cached bundles, in bytes.
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+@attr.s(frozen=True)
+class CacheStats:
+    hits = attr.ib()
+    misses = attr.ib()
+    evictions = attr.ib()
+    # Number of bundles in the cache, and their total estimated size in bytes
+    count = attr.ib()
+    size = attr.ib()
+
+
+class BundleCache:
+    """
+    An in-process cache of FluentBundle objects, keyed by locale, the contents
+    of the FTL resources, and the other options used to create the bundle.
+
+    The least recently used bundles are evicted when the total estimated size
+    of the cached bundles exceeds `max_size` bytes. Concurrent requests for
+    the same missing bundle wait for a single compilation.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # key -> (bundle, size), least recently used first
+        self._entries = OrderedDict()
+        # key -> _PendingCompilation
+        self._pending = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_bundle(self, locale, resources, **options):
+        """
+        Returns a FluentBundle for the arguments, which are the same as for
+        `FluentBundle`, creating it if it isn't in the cache.
+        """
+        key = make_cache_key(locale, resources, **options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingCompilation()
+                self._misses += 1
+                compile_here = True
+            else:
+                self._hits += 1
+                compile_here = False
+
+        if not compile_here:
+            return pending.wait()
+
+        try:
+            bundle = FluentBundle(locale, resources, **options)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_error(e)
+            raise
+
+        size = estimate_bundle_size(bundle, fallbacks=options.get("fallbacks"))
+        with self._lock:
+            del self._pending[key]
+            self._entries[key] = (bundle, size)
+            self._size += size
+            self._evict()
+        pending.set_result(bundle)
+        return bundle
+
+    def _evict(self):
+        while self._size > self.max_size and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._size -= size
+            self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns a CacheStats object with a snapshot of the cache statistics
+        """
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                count=len(self._entries),
+                size=self._size,
+            )
+
+
+class _PendingCompilation:
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_error(self, error):
+        self._error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class _Identity:
+    # Wrapper that makes any object usable in a cache key, compared by identity.
+    # Keeps a reference to the object so that its id can't be reused.
+    __slots__ = ["obj"]
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and other.obj is self.obj
+
+
+def make_cache_key(locale, resources, **options):
+    """
+    Returns a hashable key for the arguments to `FluentBundle`. Resources are
+    compared by a hash of their contents, everything else by identity.
+    """
+    options = get_compile_options(options)
+    return (
+        str(locale),
+        tuple(hashlib.sha256(resource.text.encode("utf-8")).digest() for resource in resources),
+        tuple((name, _OPTION_KEY_FUNCTIONS.get(name, _Identity)(value)) for name, value in sorted(options.items())),
+    )
+
+
+def _freeze_handlers(handlers):
+    return tuple((_Identity(cls), _Identity(handler)) for cls, handler in (handlers or {}).items())
+
+
+def _freeze_argument_types(argument_types):
+    items = []
+    for key, value in sorted((argument_types or {}).items()):
+        if isinstance(value, dict):
+            value = tuple(sorted((name, _Identity(arg_type)) for name, arg_type in value.items()))
+        else:
+            value = _Identity(value)
+        items.append((key, value))
+    return tuple(items)
+
+
+def _freeze_include(include):
+    # Raises TypeError for the same values that compile_messages rejects.
+    make_include_predicate(include)
+    if include is None:
+        return None
+    if callable(include):
+        return _Identity(include)
+    return tuple(include)
+
+
+# Functions that make the values of options usable in cache keys. Options that
+# are not listed are compared by identity.
+_OPTION_KEY_FUNCTIONS = {
+    "use_isolating": bool,
+    "functions": lambda functions: tuple(sorted((name, _Identity(func)) for name, func in (functions or {}).items())),
+    "escapers": lambda escapers: tuple(_Identity(escaper) for escaper in escapers or []),
+    "fallbacks": lambda fallbacks: tuple(_Identity(bundle) for bundle in fallbacks or []),
+    "argument_handlers": _freeze_handlers,
+    "output_handlers": _freeze_handlers,
+    "argument_types": _freeze_argument_types,
+    "instrument": bool,
+    "term_inline_threshold": lambda threshold: threshold,
+    "include": _freeze_include,
+}
+
+
+def estimate_bundle_size(bundle, fallbacks=None):
+    """
+    Returns an estimate, in bytes, of the memory used by a FluentBundle's
+    compiled message functions, including term helper functions and
+    constants created at compile time. Functions belonging to `fallbacks`
+    bundles are not counted.
+    """
+    size = sys.getsizeof(bundle._compiled_messages)
+    seen = set()
+    for fallback in fallbacks or []:
+        seen.update(id(f.__code__) for f in fallback._compiled_messages.values())
+    module_globals = bundle._compiled_ftl.module_globals
+    if module_globals is None:
+        # Not from compile_messages, so only the message functions are known.
+        for message_function in bundle._compiled_messages.values():
+            size += _estimate_object_size(message_function.__code__, seen)
+        return size
+
+    # Everything the compiled code created is in its globals: the functions
+    # (whether or not they are message functions), and the objects listed in
+    # the global references. Other globals are shared with other bundles.
+    size += sys.getsizeof(module_globals)
+    for code in get_generated_function_code(module_globals).values():
+        size += _FUNCTION_SIZE + _estimate_object_size(code, seen)
+    for name, reference in bundle._compiled_ftl.global_references.items():
+        if reference[0] in (REFERENCE_ESCAPED_CONSTANT, REFERENCE_MESSAGE_STATS) and name in module_globals:
+            size += _estimate_object_size(module_globals[name], seen)
+    return size
+
+
+_FUNCTION_SIZE = sys.getsizeof(estimate_bundle_size)
+
+
+def _estimate_object_size(obj, seen):
+    # Size of code objects, including their bytecode, constants and names,
+    # counting each object only once.
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, types.CodeType):
+        size += sys.getsizeof(obj.co_code)
+        for item in obj.co_consts + obj.co_names + obj.co_varnames:
+            size += _estimate_object_size(item, seen)
+    elif isinstance(obj, (tuple, frozenset)):
+        for item in obj:
+            size += _estimate_object_size(item, seen)
+    return size
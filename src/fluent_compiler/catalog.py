@@ -0,0 +1,277 @@
+"""
+Catalog files, which contain compiled messages for many locales in a single
+file, for deploying compiled messages without compiling them in every process.
+
+The file starts with a fixed size header containing the offset of an index
+of locales. For each locale there is an index of the message functions, and
+each function's code object is stored separately, using `marshal`. Files are
+memory mapped, and only the indexes and functions that are used are loaded.
+"""
+
+import importlib.util
+import marshal
+import mmap
+import struct
+import threading
+import types
+
+from .bundle import FluentBundle
+from .compiler import CompiledFtl, get_babel_locale, get_generated_function_code, link_module_globals
+
+CATALOG_MAGIC = b"FTLC"
+CATALOG_FORMAT_VERSION = 1
+
+# Magic, format version, Python bytecode magic number, offset and length of
+# the locale index
+_HEADER = struct.Struct("<4sH4sQQ")
+
+
+def write_catalog(filename, compiled_ftls):
+    """
+    Writes a list of CompiledFtl objects, for different locales, to a catalog
+    file.
+    """
+    locale_index = {}
+    with open(filename, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        for compiled_ftl in compiled_ftls:
+            key = _locale_key(compiled_ftl.locale)
+            if key in locale_index:
+                raise ValueError(f"More than one CompiledFtl for locale {key}")
+            functions = {}
+            for name, code in _get_function_code(compiled_ftl).items():
+                data = marshal.dumps(code)
+                functions[name] = (f.tell(), len(data), code)
+                f.write(data)
+            data = marshal.dumps(
+                {
+                    "message_mapping": compiled_ftl.message_mapping,
+                    "fallback_message_ids": [
+                        msg_id
+                        for msg_id in compiled_ftl.message_functions
+                        if msg_id not in compiled_ftl.message_mapping
+                    ],
+                    "global_references": compiled_ftl.global_references,
+                    "functions": {
+                        name: (offset, length, _get_dependencies(code, functions))
+                        for name, (offset, length, code) in functions.items()
+                    },
+                }
+            )
+            locale_index[key] = (f.tell(), len(data))
+            f.write(data)
+        data = marshal.dumps(locale_index)
+        index_offset = f.tell()
+        f.write(data)
+        f.seek(0)
+        f.write(
+            _HEADER.pack(CATALOG_MAGIC, CATALOG_FORMAT_VERSION, importlib.util.MAGIC_NUMBER, index_offset, len(data))
+        )
+
+
+def _locale_key(locale):
+    return str(get_babel_locale(locale))
+
+
+def _get_function_code(compiled_ftl):
+    if compiled_ftl.module_globals is None:
+        raise ValueError("CompiledFtl objects must come from compile_messages to be written to a catalog")
+    return get_generated_function_code(compiled_ftl.module_globals)
+
+
+def _get_dependencies(function_code, functions):
+    # Names of the other compiled functions that the code uses
+    names = set()
+    stack = [function_code]
+    while stack:
+        code = stack.pop()
+        names.update(code.co_names)
+        stack.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+    return tuple(sorted(name for name in names if name in functions and name != function_code.co_name))
+
+
+class Catalog:
+    """
+    A catalog file written by `write_catalog`, opened for loading compiled
+    messages. Message functions are loaded when they are first used.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, python_magic, index_offset, index_length = _HEADER.unpack(self._mmap[: _HEADER.size])
+        if magic != CATALOG_MAGIC:
+            raise ValueError(f"{filename} is not a fluent_compiler catalog file")
+        if version != CATALOG_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format version {version}")
+        if python_magic != importlib.util.MAGIC_NUMBER:
+            raise ValueError(f"{filename} was written by a different version of Python")
+        self._locale_index = self._load(index_offset, index_length)
+
+    def _load(self, offset, length):
+        return marshal.loads(self._mmap[offset : offset + length])
+
+    @property
+    def locales(self):
+        return list(self._locale_index)
+
+    def get_compiled_ftl(
+        self, locale, functions=None, escapers=None, fallbacks=None, argument_handlers=None, output_handlers=None
+    ):
+        """
+        Returns a CompiledFtl for the locale, whose `message_functions` are
+        loaded from the catalog when they are used.
+
+        `locale` can be a locale string or a `babel.Locale` object, which is
+        used for formatting. The other arguments must be the same as those
+        passed to `compile_messages`, except that `fallbacks` only needs to
+        contain the messages that are used from it.
+        """
+        key = _locale_key(locale)
+        if key not in self._locale_index:
+            raise KeyError(f"Locale {key} is not in the catalog")
+        locale_index = self._load(*self._locale_index[key])
+        module_globals, message_stats = link_module_globals(
+            locale,
+            locale_index["global_references"],
+            functions=functions,
+            escapers=escapers,
+            fallbacks=fallbacks,
+            argument_handlers=argument_handlers,
+            output_handlers=output_handlers,
+        )
+        loader = _FunctionLoader(self, module_globals, locale_index["functions"])
+        message_functions = _LazyMessageFunctions(loader, locale_index["message_mapping"])
+        for msg_id in locale_index["fallback_message_ids"]:
+            for fallback in fallbacks or []:
+                if msg_id in fallback.message_functions:
+                    message_functions.add_fallback(msg_id, fallback.message_functions[msg_id])
+                    break
+        return CompiledFtl(
+            message_functions=message_functions,
+            locale=locale,
+            message_stats=message_stats,
+            message_mapping=locale_index["message_mapping"],
+            module_globals=module_globals,
+            global_references=locale_index["global_references"],
+            functions=functions,
+            escapers=escapers,
+            fallbacks=fallbacks,
+            argument_handlers=argument_handlers,
+            output_handlers=output_handlers,
+        )
+
+    def get_bundle(
+        self, locale, functions=None, escapers=None, fallbacks=None, argument_handlers=None, output_handlers=None
+    ):
+        """
+        Returns a FluentBundle for the locale, whose messages are loaded from
+        the catalog when they are used. Arguments are as for `get_compiled_ftl`,
+        except that `fallbacks` is a list of FluentBundle objects.
+        """
+        compiled_ftl = self.get_compiled_ftl(
+            locale,
+            functions=functions,
+            escapers=escapers,
+            fallbacks=None if fallbacks is None else [bundle._compiled_ftl for bundle in fallbacks],
+            argument_handlers=argument_handlers,
+            output_handlers=output_handlers,
+        )
+        return FluentBundle.from_compiled_ftl(
+            compiled_ftl,
+            functions=functions,
+            escapers=escapers,
+            fallbacks=fallbacks,
+            argument_handlers=argument_handlers,
+            output_handlers=output_handlers,
+            instrument=bool(compiled_ftl.message_stats),
+        )
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _FunctionLoader:
+    def __init__(self, catalog, module_globals, function_index):
+        self._catalog = catalog
+        self._module_globals = module_globals
+        self._function_index = function_index
+        self._lock = threading.Lock()
+        # Names of functions whose dependencies are all loaded, which can be
+        # used without taking the lock.
+        self._linked = set()
+
+    def load(self, name):
+        """
+        Returns the compiled function with the given name, loading it, and the
+        functions it uses, if they have not been loaded already.
+        """
+        module_globals = self._module_globals
+        if name in self._linked:
+            return module_globals[name]
+        with self._lock:
+            # Without recursion, because chains of references can be long.
+            loaded = {}
+            stack = [name]
+            while stack:
+                function_name = stack.pop()
+                if function_name in self._linked or function_name in loaded:
+                    continue
+                offset, length, dependencies = self._function_index[function_name]
+                code = self._catalog._load(offset, length)
+                loaded[function_name] = types.FunctionType(code, module_globals, function_name)
+                stack.extend(dependencies)
+            # Functions may call each other, so none are marked as linked
+            # until all are in the globals.
+            module_globals.update(loaded)
+            self._linked.update(loaded)
+        return module_globals[name]
+
+
+class _LazyMessageFunctions(dict):
+    # Dictionary of message IDs to functions, that loads functions from a
+    # catalog the first time they are looked up. Once loaded, lookups are
+    # normal dictionary lookups.
+
+    def __init__(self, loader, message_mapping):
+        super().__init__()
+        self._loader = loader
+        self._message_mapping = dict(message_mapping)
+
+    def add_fallback(self, msg_id, function):
+        self._message_mapping[msg_id] = None
+        self[msg_id] = function
+
+    def __missing__(self, msg_id):
+        function_name = self._message_mapping[msg_id]
+        function = self[msg_id] = self._loader.load(function_name)
+        return function
+
+    def __contains__(self, msg_id):
+        return msg_id in self._message_mapping
+
+    def get(self, msg_id, default=None):
+        if msg_id in self._message_mapping:
+            return self[msg_id]
+        return default
+
+    def __iter__(self):
+        return iter(self._message_mapping)
+
+    def __len__(self):
+        return len(self._message_mapping)
+
+    def keys(self):
+        return self._message_mapping.keys()
+
+    def items(self):
+        return [(msg_id, self[msg_id]) for msg_id in self._message_mapping]
+
+    def values(self):
+        return [self[msg_id] for msg_id in self._message_mapping]
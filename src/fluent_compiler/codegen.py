@@ -5,6 +5,9 @@ Utilities for doing Python code generation
 import keyword
 import platform
 import re
+from collections import Counter
+
+import attr
 
 from . import ast_compat as ast
 from .utils import allowable_keyword_arg_name, allowable_name
@@ -241,6 +244,21 @@ class Scope:
         # Convenience utility for returning a VariableReference
         return VariableReference(name, self)
 
+    def copy(self):
+        """
+        Returns a copy of this root scope, which can be modified without
+        affecting the original.
+        """
+        assert self.parent_scope is None, "Only root scopes can be copied"
+        new_scope = Scope()
+        new_scope.names = self.names.copy()
+        new_scope._function_arg_reserved_names = self._function_arg_reserved_names.copy()
+        # Properties can be updated in place by set_name_properties, so we
+        # need to copy the inner dicts too.
+        new_scope._properties = {name: props.copy() for name, props in self._properties.items()}
+        new_scope._assignments = self._assignments.copy()
+        return new_scope
+
 
 _IDENTIFIER_SANITIZER_RE = re.compile("[^a-zA-Z0-9_]")
 _IDENTIFIER_START_RE = re.compile("^[a-zA-Z_]")
@@ -352,8 +370,9 @@ class Block(PythonAstList):
 
 
 class Module(Block, PythonAst):
-    def __init__(self):
-        scope = Scope(parent_scope=None)
+    def __init__(self, scope=None):
+        if scope is None:
+            scope = Scope(parent_scope=None)
         Block.__init__(self, scope)
 
     def as_ast(self):
@@ -843,6 +862,17 @@ class Equals(BinaryOperator):
         )
 
 
+class Not(Expression):
+    child_elements = ["value"]
+    type = bool
+
+    def __init__(self, value):
+        self.value = value
+
+    def as_ast(self):
+        return ast.UnaryOp(op=ast.Not(), operand=self.value.as_ast(), **DEFAULT_AST_ARGS)
+
+
 class BoolOp(BinaryOperator):
     type = bool
     op = NotImplemented
@@ -867,17 +897,57 @@ def traverse(ast_node, func):
         func(node)
 
 
-def simplify(codegen_ast, simplifier):
+@attr.s
+class SimplifyStats:
+    passes = attr.ib(default=0)
+    # Number of nodes in the simplified AST
+    nodes = attr.ib(default=0)
+    # Number of changes made, keyed on the values the simplifier added to
+    # `changes` (e.g. the name of the rule)
+    changes = attr.ib(factory=Counter)
+    # Function name -> Counter of changes made inside that function
+    function_changes = attr.ib(factory=dict)
+
+
+def simplify(codegen_ast, simplifier, stats=None):
+    """
+    Applies `simplifier` to all nodes repeatedly until it stops making
+    changes. `simplifier` is called with each node and a `changes` list, to
+    which it should append a true value if it makes a change.
+
+    If a SimplifyStats object is passed as `stats` it is updated.
+    """
     changes = [True]
+    nodes = 0
+    function_name = None
 
     # Wrap `simplifier` (which takes additional `changes` arg)
     # into function that take just `node`, as required by rewriting_traverse
     def rewriter(node):
-        return simplifier(node, changes)
+        nonlocal nodes, function_name
+        nodes += 1
+        if stats is None:
+            return simplifier(node, changes)
+        # Nodes are visited parent first, so everything up to the next
+        # function belongs to this one.
+        if isinstance(node, Function):
+            function_name = node.func_name
+        change_count = len(changes)
+        new_node = simplifier(node, changes)
+        if len(changes) > change_count and function_name is not None:
+            stats.function_changes.setdefault(function_name, Counter()).update(changes[change_count:])
+        return new_node
 
     while any(changes):
         changes[:] = []
+        nodes = 0
+        function_name = None
         rewriting_traverse(codegen_ast, rewriter)
+        if stats is not None:
+            stats.passes += 1
+            stats.changes.update(changes)
+    if stats is not None:
+        stats.nodes = nodes
     return codegen_ast
 
 
@@ -1,10 +1,17 @@
 # The heart of the FTL -> Python compiler. See the architecture docs in
 # ARCHITECTURE.rst for the big picture, and comments on compile_expr below.
 
+import ast
+import asyncio
 import builtins
 import contextlib
-from collections import OrderedDict
+import functools
+import inspect
+import marshal
+import time
+from collections import Counter, OrderedDict
 from functools import singledispatch
+from types import FunctionType
 
 import attr
 import babel
@@ -48,7 +55,6 @@ from .utils import (
     display_location,
     inspect_function_args,
     reference_to_id,
-    span_to_position,
 )
 
 # Unicode bidi isolation characters.
@@ -78,6 +84,29 @@ CLDR_PLURAL_FORMS = {
     "other",
 }
 PROPERTY_EXTERNAL_ARG = "PROPERTY_EXTERNAL_ARG"
+PROPERTY_ARGUMENT_TYPE = "PROPERTY_ARGUMENT_TYPE"
+
+# Types that can be used in `argument_types`
+SUPPORTED_ARGUMENT_TYPES = (str, int)
+
+# Value for the `instrument` option that also measures time spent
+INSTRUMENT_TIMING = "timing"
+PERF_COUNTER_NAME = "perf_counter_ns"
+
+# Terms are normally inlined wherever they are referenced. If the estimated
+# size of the inlined code for a term (the number of expressions in it,
+# including inlined terms, multiplied by the number of references to it) is
+# more than this, references are compiled to calls to shared helper functions
+# instead. See `term_inline_threshold`.
+DEFAULT_TERM_INLINE_THRESHOLD = 2000
+
+# Kinds of objects in `CompiledFtl.global_references`
+REFERENCE_FUNCTION = "function"
+REFERENCE_ESCAPER = "escaper"
+REFERENCE_ESCAPED_CONSTANT = "escaped_constant"
+REFERENCE_FALLBACK = "fallback"
+REFERENCE_MESSAGE_STATS = "message_stats"
+REFERENCE_PERF_COUNTER = "perf_counter"
 
 
 @attr.s
@@ -104,13 +133,54 @@ class CompilerEnvironment:
     functions_arg_spec = attr.ib(factory=dict)
     message_ids_to_ast = attr.ib(factory=dict)
     term_ids_to_ast = attr.ib(factory=dict)
+    # Message functions from fallback locales, and the module names used
+    # for the ones that are referenced.
+    fallback_functions = attr.ib(factory=dict)
+    fallback_function_names = attr.ib(factory=dict)
+    # (escaper function name, arg) -> (module name, value) for escaper calls
+    # evaluated at compile time. `arg` is a string, or for joins a tuple of
+    # the keys of the joined constants.
+    escaped_constants = attr.ib(factory=dict)
+    # Cache of message ID -> escaper
+    message_escapers = attr.ib(factory=dict)
+    # Declared types of external arguments, for all messages, and for
+    # specific messages.
+    argument_types = attr.ib(factory=dict)
+    message_argument_types = attr.ib(factory=dict)
+    # Instrumentation option, and message ID -> module name of MessageStats
+    # object
+    instrument = attr.ib(default=False)
+    message_stats_names = attr.ib(factory=dict)
+    # CompileStats object to update, or None
+    stats = attr.ib(default=None)
+    # Term inlining threshold, term ID -> number of references and estimated
+    # inlined size, (term ID, arguments) -> (helper function name or None,
+    # constant value, compilation errors), and dump of the simplified body
+    # -> helper function name
+    term_inline_threshold = attr.ib(default=DEFAULT_TERM_INLINE_THRESHOLD)
+    term_reference_counts = attr.ib(default=None)
+    term_sizes = attr.ib(factory=dict)
+    term_functions = attr.ib(factory=dict)
+    term_function_bodies = attr.ib(factory=dict)
+    # Simplifier for the module, used for term helper functions before they
+    # are added to the module
+    simplifier = attr.ib(default=None)
+    # codegen.Function objects for term helper functions, to be added to the
+    # module
+    term_function_definitions = attr.ib(factory=list)
+    # Message ID -> string, for messages that compile to a constant
+    message_constants = attr.ib(factory=dict)
     current = attr.ib(factory=CurrentEnvironment)
 
     def add_current_message_error(self, error):
         self.errors.append((self.current.message_id, error))
 
     def escaper_for_message(self, message_id=None):
-        return escaper_for_message(self.escapers, message_id=message_id)
+        try:
+            return self.message_escapers[message_id]
+        except KeyError:
+            escaper = self.message_escapers[message_id] = escaper_for_message(self.escapers, message_id=message_id)
+            return escaper
 
     @contextlib.contextmanager
     def modified(self, **replacements):
@@ -122,8 +192,21 @@ class CompilerEnvironment:
         # shallow copy returned by attr.evolve is fine.
         old_current = self.current
         self.current = attr.evolve(old_current, **replacements)
-        yield self
-        self.current = old_current
+        try:
+            yield self
+        finally:
+            self.current = old_current
+
+    def declared_argument_type(self, name):
+        """
+        Returns the type declared for the external argument in the current
+        message, or None.
+        """
+        message_id = self.current.message_id
+        for key in [message_id, message_id.split(ATTRIBUTE_SEPARATOR)[0]]:
+            if key in self.message_argument_types:
+                return self.message_argument_types[key].get(name)
+        return self.argument_types.get(name)
 
     def modified_for_term_reference(self, term_args=None):
         return self.modified(term_args=term_args if term_args is not None else {})
@@ -143,7 +226,58 @@ class FtlSource:
         self.ast_node = ast_node
         self.ftl_resource = ftl_resource
         self.filename = self.ftl_resource.filename
-        self.row, self.column = span_to_position(ast_node.span, ftl_resource.text)
+        self.row, self.column = ftl_resource.position(ast_node.span.start)
+
+
+@attr.s
+class CompileStats:
+    """
+    Timings and counts for a call to `compile_messages`. Times are in seconds.
+    """
+
+    # Parsing FTL
+    parse_time = attr.ib(default=0.0)
+    # Checking for cyclic references
+    cycle_check_time = attr.ib(default=0.0)
+    # Compiling FTL AST to codegen AST, not including `cycle_check_time`
+    compile_time = attr.ib(default=0.0)
+    # Simplifying codegen AST
+    simplify_time = attr.ib(default=0.0)
+    # Converting codegen AST to Python AST
+    as_ast_time = attr.ib(default=0.0)
+    # Compiling Python AST to bytecode and executing it
+    exec_time = attr.ib(default=0.0)
+    total_time = attr.ib(default=0.0)
+
+    message_count = attr.ib(default=0)
+    term_count = attr.ib(default=0)
+    function_count = attr.ib(default=0)
+    simplifier_passes = attr.ib(default=0)
+    # Number of times each simplifier rule was applied
+    simplifier_rule_hits = attr.ib(factory=dict)
+    # Message ID -> {rule name: count}, for messages where simplifier rules
+    # were applied
+    message_rule_hits = attr.ib(factory=dict)
+    # Number of nodes in the codegen AST
+    ast_node_count = attr.ib(default=0)
+
+
+# Functions called with the CompiledFtl object after each compilation, see
+# add_compile_stats_callback
+_compile_stats_callbacks = []
+
+
+def add_compile_stats_callback(callback):
+    """
+    Registers a function to be called with the CompiledFtl object at the end
+    of every call to `compile_messages`, for example to send
+    `CompiledFtl.stats` to a metrics system.
+    """
+    _compile_stats_callbacks.append(callback)
+
+
+def remove_compile_stats_callback(callback):
+    _compile_stats_callbacks.remove(callback)
 
 
 @attr.s
@@ -162,24 +296,186 @@ class CompiledFtl:
 
     locale = attr.ib(default=None)
 
+    # A dictionary of message IDs to runtime.MessageStats objects, if
+    # compiled with `instrument`
+    message_stats = attr.ib(factory=dict)
+
+    # CompileStats object
+    stats = attr.ib(default=None)
+
+    # The information needed to recreate the message functions from their
+    # code objects, e.g. when loading them from a catalog file: the
+    # dictionary of message IDs to function names, the globals dictionary the
+    # functions were created in, and a dictionary of global names to
+    # references to the objects outside the compiled code that they use, see
+    # `link_module_globals`.
+    message_mapping = attr.ib(factory=dict)
+    module_globals = attr.ib(default=None)
+    global_references = attr.ib(factory=dict)
+    # The arguments to `compile_messages` containing objects that the
+    # compiled code uses.
+    functions = attr.ib(default=None)
+    escapers = attr.ib(default=None)
+    fallbacks = attr.ib(default=None)
+    argument_handlers = attr.ib(default=None)
+    output_handlers = attr.ib(default=None)
+
+    def __reduce__(self):
+        # The message functions can't be pickled, because they were created by
+        # `exec`, so their code objects are marshalled instead, and the objects
+        # they use are pickled normally, by reference for functions.
+        if self.module_globals is None:
+            raise TypeError("Only CompiledFtl objects created by compile_messages can be pickled")
+        # Make sure functions loaded on demand (e.g. from a catalog) are loaded.
+        message_functions = dict(self.message_functions.items())
+        return (
+            restore_compiled_ftl,
+            (
+                self.locale,
+                marshal.dumps(get_generated_function_code(self.module_globals)),
+                self.message_mapping,
+                self.global_references,
+                [msg_id for msg_id in message_functions if msg_id not in self.message_mapping],
+                self.errors,
+                self.stats,
+                self.functions,
+                self.escapers,
+                self.fallbacks,
+                self.argument_handlers,
+                self.output_handlers,
+            ),
+        )
+
+
+def restore_compiled_ftl(
+    locale,
+    function_code,
+    message_mapping,
+    global_references,
+    fallback_message_ids,
+    errors,
+    stats,
+    functions,
+    escapers,
+    fallbacks,
+    argument_handlers,
+    output_handlers,
+):
+    """
+    Recreates a CompiledFtl object from the values returned by
+    `CompiledFtl.__reduce__`.
+    """
+    module_globals, message_stats = link_module_globals(
+        locale,
+        global_references,
+        functions=functions,
+        escapers=escapers,
+        fallbacks=fallbacks,
+        argument_handlers=argument_handlers,
+        output_handlers=output_handlers,
+    )
+    for name, code in marshal.loads(function_code).items():
+        module_globals[name] = FunctionType(code, module_globals, name)
+    message_functions = {msg_id: module_globals[function_name] for msg_id, function_name in message_mapping.items()}
+    for msg_id in fallback_message_ids:
+        message_functions[msg_id] = _find_fallback_function(msg_id, fallbacks or [])
+    return CompiledFtl(
+        message_functions=message_functions,
+        errors=errors,
+        locale=locale,
+        message_stats=message_stats,
+        stats=stats,
+        message_mapping=message_mapping,
+        module_globals=module_globals,
+        global_references=global_references,
+        functions=functions,
+        escapers=escapers,
+        fallbacks=fallbacks,
+        argument_handlers=argument_handlers,
+        output_handlers=output_handlers,
+    )
+
 
-def compile_messages(locale, resources, use_isolating=True, functions=None, escapers=None):
+def get_generated_function_code(module_globals):
+    """
+    Returns a dictionary of names to code objects for the functions created by
+    the compiled code in `module_globals`, including term helper functions.
+    """
+    return {
+        name: value.__code__
+        for name, value in module_globals.items()
+        if isinstance(value, FunctionType) and value.__globals__ is module_globals
+    }
+
+
+def compile_messages(
+    locale,
+    resources,
+    use_isolating=True,
+    functions=None,
+    escapers=None,
+    fallbacks=None,
+    argument_handlers=None,
+    output_handlers=None,
+    argument_types=None,
+    instrument=False,
+    term_inline_threshold=DEFAULT_TERM_INLINE_THRESHOLD,
+    include=None,
+):
     """
     Compile a list of FtlResource to a Python module,
     and returns a CompiledFtl objects
+
+    `fallbacks` is an optional list of CompiledFtl objects, most preferred
+    first, used for messages that are missing from `resources`.
+
+    `argument_handlers` is an optional dictionary of type -> handler function
+    for converting external arguments. `output_handlers` is the same for
+    converting values of other types returned by functions to strings.
+
+    `argument_types` is an optional dictionary of argument name -> type (str
+    or int), or message ID -> {argument name: type}, declaring the types of
+    external arguments, which allows more efficient code to be generated.
+
+    If `instrument` is True, message functions count calls and errors, in
+    the `CompiledFtl.message_stats` objects. Pass `instrument="timing"` to
+    also measure the time spent in them.
+
+    Terms are inlined where they are referenced, unless the estimated size of
+    the inlined code is more than `term_inline_threshold`, in which case
+    shared helper functions are used. Pass None to always inline.
+
+    `include` optionally limits the messages that are compiled, see
+    `make_include_predicate`. Messages and terms they reference are also
+    compiled, and everything else is skipped.
     """
+    stats = CompileStats()
+    start = time.perf_counter()
     _functions = BUILTINS.copy()
     if functions:
         _functions.update(functions)
     messages, parsing_issues = _parse_resources(resources)
-
-    babel_locale = babel.Locale.parse(locale.replace("-", "_"))
-    module, message_mapping, module_globals, compilation_errors = messages_to_module(
+    stats.parse_time = time.perf_counter() - start
+    include_predicate = make_include_predicate(include)
+    fallback_functions = {}
+    for fallback in reversed(fallbacks or []):
+        fallback_functions.update(fallback.message_functions)
+
+    babel_locale = get_babel_locale(locale)
+    module, message_mapping, module_globals, compilation_errors, message_stats, global_references = messages_to_module(
         messages,
         babel_locale,
         use_isolating=use_isolating,
         functions=_functions,
         escapers=escapers,
+        fallback_functions=fallback_functions,
+        argument_handlers=argument_handlers,
+        output_handlers=output_handlers,
+        argument_types=argument_types,
+        instrument=instrument,
+        term_inline_threshold=term_inline_threshold,
+        include=include_predicate,
+        stats=stats,
     )
 
     # A hack below to allow `.ftl` files to appear in tracebacks, should that
@@ -188,13 +484,17 @@ def compile_messages(locale, resources, use_isolating=True, functions=None, esca
     # To do this, we split the module into multiple modules, to allow each
     # function to have it's own filename associated with it, because the
     # original FTL may come from different sources.
-    for module_ast in module.as_multiple_module_ast():
+    as_ast_start = time.perf_counter()
+    module_asts = module.as_multiple_module_ast()
+    exec_start = time.perf_counter()
+    for module_ast in module_asts:
         if hasattr(module_ast.body[0], "filename"):
             filename = module_ast.body[0].filename
         else:
             filename = "<string>"
         code_obj = compile(module_ast, filename, "exec")
         exec(code_obj, module_globals)
+    exec_end = time.perf_counter()
 
     message_functions = {}
     for key, val in message_mapping.items():
@@ -202,12 +502,96 @@ def compile_messages(locale, resources, use_isolating=True, functions=None, esca
             # term, shouldn't be in publicly available messages
             continue
         message_functions[str(key)] = module_globals[val]
+    for key, val in fallback_functions.items():
+        if include_predicate is None or include_predicate(key):
+            message_functions.setdefault(key, val)
 
-    return CompiledFtl(
+    module_ast = module.as_ast()
+    end = time.perf_counter()
+    stats.as_ast_time = (exec_start - as_ast_start) + (end - exec_end)
+    stats.exec_time = exec_end - exec_start
+    stats.total_time = end - start
+
+    compiled_ftl = CompiledFtl(
         message_functions=message_functions,
         errors=parsing_issues + compilation_errors,
-        module_ast=module.as_ast(),
+        module_ast=module_ast,
         locale=locale,
+        message_stats=message_stats,
+        stats=stats,
+        message_mapping=message_mapping,
+        module_globals=module_globals,
+        global_references=global_references,
+        functions=functions,
+        escapers=escapers,
+        fallbacks=fallbacks,
+        argument_handlers=argument_handlers,
+        output_handlers=output_handlers,
+    )
+    for callback in _compile_stats_callbacks:
+        callback(compiled_ftl)
+    return compiled_ftl
+
+
+# Names and defaults of the options of `compile_messages`, which are passed
+# through by FluentBundle and BundleCache.
+COMPILE_OPTION_DEFAULTS = {
+    name: param.default
+    for name, param in inspect.signature(compile_messages).parameters.items()
+    if param.default is not param.empty
+}
+
+
+def get_compile_options(options):
+    """
+    Returns a dictionary of all the options of `compile_messages`, taken from
+    the dictionary `options`, with defaults for those missing from it. Raises
+    TypeError for unknown options.
+    """
+    unknown = options.keys() - COMPILE_OPTION_DEFAULTS.keys()
+    if unknown:
+        raise TypeError(f"Unknown options: {', '.join(sorted(unknown))}")
+    return {**COMPILE_OPTION_DEFAULTS, **options}
+
+
+async def compile_messages_async(
+    locale,
+    resources,
+    use_isolating=True,
+    functions=None,
+    escapers=None,
+    fallbacks=None,
+    argument_handlers=None,
+    output_handlers=None,
+    argument_types=None,
+    instrument=False,
+    term_inline_threshold=DEFAULT_TERM_INLINE_THRESHOLD,
+    include=None,
+    executor=None,
+):
+    """
+    Version of `compile_messages` for asyncio code, which does the compilation
+    in `executor` (by default the event loop's default executor), so that the
+    event loop is not blocked.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(
+            compile_messages,
+            locale,
+            resources,
+            use_isolating=use_isolating,
+            functions=functions,
+            escapers=escapers,
+            fallbacks=fallbacks,
+            argument_handlers=argument_handlers,
+            output_handlers=output_handlers,
+            argument_types=argument_types,
+            instrument=instrument,
+            term_inline_threshold=term_inline_threshold,
+            include=include,
+        ),
     )
 
 
@@ -243,7 +627,7 @@ def _parse_resources(ftl_resources):
                                 "  {}: {}".format(
                                     display_location(
                                         ftl_resource.filename,
-                                        span_to_position(a.span, ftl_resource.text),
+                                        ftl_resource.position(a.span.start),
                                     ),
                                     a.message,
                                 )
@@ -256,28 +640,48 @@ def _parse_resources(ftl_resources):
     return output_dict, parsing_issues
 
 
-def messages_to_module(messages, locale, use_isolating=True, functions=None, escapers=None):
+def messages_to_module(
+    messages,
+    locale,
+    use_isolating=True,
+    functions=None,
+    escapers=None,
+    fallback_functions=None,
+    argument_handlers=None,
+    output_handlers=None,
+    argument_types=None,
+    instrument=False,
+    term_inline_threshold=DEFAULT_TERM_INLINE_THRESHOLD,
+    include=None,
+    stats=None,
+):
     """
     Compile a set of {id: Message/Term objects} to a Python module, returning a tuple:
     (codegen.Module object, dictionary mapping message IDs to Python functions,
-     module globals dictionary, errors list)
+     module globals dictionary, errors list, dictionary of message IDs to
+     MessageStats objects, dictionary of global references - see
+     `link_module_globals`)
+
+    References to messages that are missing are compiled to calls to the
+    functions in `fallback_functions`, if present.
+
+    If `include` is passed, it is a function that is called with message IDs
+    and returns True for the messages to compile. Messages and terms they
+    reference are also compiled.
+
+    If a CompileStats object is passed as `stats` it is updated.
     """
     if functions is None:
         functions = {}
+    if fallback_functions is None:
+        fallback_functions = {}
 
     message_ids_to_ast = OrderedDict(get_message_function_ast(messages))
     term_ids_to_ast = OrderedDict(get_term_ast(messages))
+    if include is not None:
+        message_ids_to_ast, term_ids_to_ast = get_included_items(include, message_ids_to_ast, term_ids_to_ast)
 
-    # Plural form function
-    plural_form_for_number_main = babel.plural.to_python(locale.plural_form)
-
-    def plural_form_for_number(number):
-        try:
-            return plural_form_for_number_main(number)
-        except TypeError:
-            # This function can legitimately be passed strings if we incorrectly
-            # guessed it was a CLDR category. So we ignore silently
-            return None
+    plural_form_for_number = get_plural_form_function(locale)
 
     function_arg_errors = []
     compiler_env = CompilerEnvironment(
@@ -286,11 +690,16 @@ def messages_to_module(messages, locale, use_isolating=True, functions=None, esc
         use_isolating=use_isolating,
         functions=functions,
         functions_arg_spec={
-            name: inspect_function_args(func, name, function_arg_errors) for name, func in functions.items()
+            name: get_function_arg_spec(func, name, function_arg_errors) for name, func in functions.items()
         },
         message_ids_to_ast=message_ids_to_ast,
         term_ids_to_ast=term_ids_to_ast,
+        fallback_functions=fallback_functions,
+        instrument=instrument,
+        term_inline_threshold=term_inline_threshold,
+        stats=stats,
     )
+    compiler_env.argument_types, compiler_env.message_argument_types = split_argument_types(argument_types)
     for err in function_arg_errors:
         compiler_env.add_current_message_error(err)
 
@@ -299,47 +708,27 @@ def messages_to_module(messages, locale, use_isolating=True, functions=None, esc
             raise ValueError("Every escaper must have a unique 'name' attribute'")
         compiler_env.escapers = [RegisteredEscaper(escaper, compiler_env) for escaper in escapers]
 
-    # Setup globals, and reserve names for them
-    module_globals = {k: getattr(runtime, k) for k in runtime.__all__}
-    module_globals.update(builtins.__dict__)
-    module_globals[LOCALE_NAME] = locale
-
-    # Return types of known functions.
-    known_return_types = {}
-    known_return_types.update(BUILTIN_RETURN_TYPES)
-    known_return_types.update(runtime.RETURN_TYPES)
-
-    module_globals[PLURAL_FORM_FOR_NUMBER_NAME] = plural_form_for_number
-    known_return_types[PLURAL_FORM_FOR_NUMBER_NAME] = str
-
-    def get_name_properties(name):
-        properties = {}
-        if name in known_return_types:
-            properties[codegen.PROPERTY_RETURN_TYPE] = known_return_types[name]
-        return properties
-
-    module = codegen.Module()
-    for k in module_globals:
-        name = module.scope.reserve_name(k, properties=get_name_properties(k), is_builtin=k in builtins.__dict__)
-        # We should have chosen all our module_globals to avoid name conflicts:
-        assert name == k, f"Expected {name}=={k}"
+    # Setup globals. Names for these are already reserved in the root scope.
+    module_globals = make_module_globals(
+        locale, plural_form_for_number, argument_handlers=argument_handlers, output_handlers=output_handlers
+    )
+    module = codegen.Module(scope=get_root_scope())
+    compiler_env.simplifier = Simplifier(compiler_env, module.scope)
+    # Other globals are recorded in global_references, so that they can be
+    # found again when loading compiled code.
+    global_references = {}
 
     # Reserve names for escapers
     if compiler_env.escapers is not None:
-        for escaper in compiler_env.escapers:
-            for name, func, properties in escaper.get_reserved_names_with_properties():
+        for index, escaper in enumerate(compiler_env.escapers):
+            for name, attribute, func, properties in escaper.get_reserved_names_with_properties():
                 assigned_name = module.scope.reserve_name(name, properties=properties)
                 # We've chosen the names to not clash with anything that
                 # we've already set up.
                 assert assigned_name == name
                 assert assigned_name not in module_globals
                 module_globals[assigned_name] = func
-
-    # Reserve names for function arguments, so that we always
-    # know the name of these arguments without needing to do
-    # lookups etc.
-    for arg in MESSAGE_FUNCTION_ARGS:
-        module.scope.reserve_function_arg_name(arg)
+                global_references[assigned_name] = (REFERENCE_ESCAPER, index, escaper.name, attribute)
 
     # -- User defined names
     # functions from context
@@ -349,6 +738,7 @@ def messages_to_module(messages, locale, use_isolating=True, functions=None, esc
         assigned_name = module.scope.reserve_name(name, properties=get_name_properties(name))
         compiler_env.function_renames[name] = assigned_name
         module_globals[assigned_name] = func
+        global_references[assigned_name] = (REFERENCE_FUNCTION, name)
 
     # Pass one, find all the names, so that we can populate message_mapping,
     # which is needed for compilation.
@@ -360,19 +750,317 @@ def messages_to_module(messages, locale, use_isolating=True, functions=None, esc
         )
         compiler_env.message_mapping[msg_id] = function_name
 
-    # Pass 2, actual compilation
-    for msg_id, msg in message_ids_to_ast.items():
-        with compiler_env.modified(
-            message_id=msg_id,
-            ftl_resource=msg.ftl_resource,
-            escaper=compiler_env.escaper_for_message(message_id=msg_id),
-        ):
+    # Objects for collecting statistics, if instrumented
+    message_stats = {}
+    if instrument:
+        for msg_id, function_name in compiler_env.message_mapping.items():
+            stats_name = module.scope.reserve_name(function_name + "__stats")
+            compiler_env.message_stats_names[msg_id] = stats_name
+            message_stats[msg_id] = module_globals[stats_name] = runtime.MessageStats(
+                timing=instrument == INSTRUMENT_TIMING
+            )
+            global_references[stats_name] = (REFERENCE_MESSAGE_STATS, msg_id, instrument == INSTRUMENT_TIMING)
+        if instrument == INSTRUMENT_TIMING:
+            module.scope.reserve_name(PERF_COUNTER_NAME)
+            module_globals[PERF_COUNTER_NAME] = time.perf_counter_ns
+            global_references[PERF_COUNTER_NAME] = (REFERENCE_PERF_COUNTER,)
+
+    # Pass 2, actual compilation. Messages are compiled after the messages
+    # they reference, so that references to messages that compile to
+    # constants can be replaced with the constant.
+    compile_start = time.perf_counter()
+    errors_start = len(compiler_env.errors)
+    message_functions = {}
+    for msg_id in get_compilation_order(compiler_env):
+        msg = message_ids_to_ast[msg_id]
+        escaper = compiler_env.escaper_for_message(message_id=msg_id)
+        with compiler_env.modified(message_id=msg_id, ftl_resource=msg.ftl_resource, escaper=escaper):
             function_name = compiler_env.message_mapping[msg_id]
-            function = compile_message(msg, msg_id, function_name, module, compiler_env)
-            module.add_function(function_name, function)
+            function = message_functions[msg_id] = compile_message(msg, msg_id, function_name, module, compiler_env)
+        # With instrumentation, calls must be made so that they are counted.
+        if escaper is null_escaper and not instrument:
+            constant = get_constant_return_value(function)
+            if constant is not None:
+                compiler_env.message_constants[msg_id] = constant
+    for msg_id, function_name in compiler_env.message_mapping.items():
+        module.add_function(function_name, message_functions[msg_id])
+    # Report errors in the order of the messages in the source. sorted() is
+    # stable, so errors for the same message stay in order.
+    message_indexes = {msg_id: i for i, msg_id in enumerate(message_ids_to_ast)}
+    compiler_env.errors[errors_start:] = sorted(
+        compiler_env.errors[errors_start:], key=lambda error: message_indexes.get(error[0], -1)
+    )
+
+    # Helper functions for terms that are not inlined
+    for function in compiler_env.term_function_definitions:
+        module.add_function(function.func_name, function)
+
+    # Fallback functions that were used, already compiled for their own locale.
+    for msg_id, function_name in compiler_env.fallback_function_names.items():
+        module_globals[function_name] = fallback_functions[msg_id]
+        global_references[function_name] = (REFERENCE_FALLBACK, msg_id)
+
+    simplify_start = time.perf_counter()
+    simplify_stats = codegen.SimplifyStats()
+    module = codegen.simplify(module, compiler_env.simplifier, stats=simplify_stats)
+    if stats is not None:
+        stats.compile_time = simplify_start - compile_start - stats.cycle_check_time
+        stats.simplify_time = time.perf_counter() - simplify_start
+        stats.message_count = len(message_ids_to_ast)
+        stats.term_count = sum(1 for term_id in term_ids_to_ast if term_id.startswith(TERM_SIGIL))
+        stats.function_count = sum(1 for statement in module.statements if isinstance(statement, codegen.Function))
+        stats.simplifier_passes = simplify_stats.passes
+        stats.simplifier_rule_hits = dict(simplify_stats.changes)
+        stats.message_rule_hits = {
+            msg_id: dict(simplify_stats.function_changes[function_name])
+            for msg_id, function_name in compiler_env.message_mapping.items()
+            if function_name in simplify_stats.function_changes
+        }
+        stats.ast_node_count = simplify_stats.nodes
+    if compiler_env.escaped_constants:
+        # Some constants may have been replaced by others during simplification
+        used_names = get_used_names(module)
+        for (function_name, arg), (name, value) in compiler_env.escaped_constants.items():
+            if name in used_names:
+                module_globals[name] = value
+                global_references[name] = (REFERENCE_ESCAPED_CONSTANT, function_name, arg)
+    return (
+        module,
+        compiler_env.message_mapping,
+        module_globals,
+        compiler_env.errors,
+        message_stats,
+        global_references,
+    )
 
-    module = codegen.simplify(module, Simplifier(compiler_env))
-    return (module, compiler_env.message_mapping, module_globals, compiler_env.errors)
+
+def split_argument_types(argument_types):
+    """
+    Splits an `argument_types` dictionary into a tuple of (types for all
+    messages, {message ID: types}), checking that the types are supported.
+    """
+    all_messages = {}
+    per_message = {}
+    for key, value in (argument_types or {}).items():
+        if isinstance(value, dict):
+            per_message[key] = value
+        else:
+            all_messages[key] = value
+    for types in [all_messages, *per_message.values()]:
+        for name, arg_type in types.items():
+            if arg_type not in SUPPORTED_ARGUMENT_TYPES:
+                raise ValueError(
+                    f"Unsupported type {arg_type!r} for argument {name!r}, expected one of "
+                    + ", ".join(t.__name__ for t in SUPPORTED_ARGUMENT_TYPES)
+                )
+    return all_messages, per_message
+
+
+def get_used_names(codegen_ast):
+    """
+    Returns the set of variable names referenced in the codegen AST
+    """
+    names = set()
+
+    def collect(node):
+        if isinstance(node, codegen.VariableReference):
+            names.add(node.name)
+        return node
+
+    codegen.rewriting_traverse(codegen_ast, collect)
+    return names
+
+
+def get_babel_locale(locale):
+    """
+    Returns the babel.Locale object for a locale string like 'en-US'. If a
+    babel.Locale object is passed, it is returned unchanged.
+    """
+    if isinstance(locale, babel.Locale):
+        return locale
+    return _parse_babel_locale(locale.replace("-", "_"))
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_babel_locale(locale):
+    return babel.Locale.parse(locale)
+
+
+@functools.lru_cache(maxsize=None)
+def get_plural_form_function(locale):
+    """
+    Returns the plural form function for a babel.Locale object
+    """
+    plural_form_for_number_main = babel.plural.to_python(locale.plural_form)
+
+    def plural_form_for_number(number):
+        try:
+            return plural_form_for_number_main(number)
+        except TypeError:
+            # This function can legitimately be passed strings if we incorrectly
+            # guessed it was a CLDR category. So we ignore silently
+            return None
+
+    return plural_form_for_number
+
+
+def get_function_arg_spec(function, name, errors):
+    """
+    Cached version of `inspect_function_args`
+    """
+    try:
+        arg_spec, spec_errors = _inspect_function_args_cached(function, name)
+    except TypeError:
+        # Unhashable callable
+        return inspect_function_args(function, name, errors)
+    errors.extend(spec_errors)
+    return arg_spec
+
+
+@functools.lru_cache(maxsize=1024)
+def _inspect_function_args_cached(function, name):
+    errors = []
+    arg_spec = inspect_function_args(function, name, errors)
+    return arg_spec, tuple(errors)
+
+
+# Return types of known functions.
+KNOWN_RETURN_TYPES = {}
+KNOWN_RETURN_TYPES.update(BUILTIN_RETURN_TYPES)
+KNOWN_RETURN_TYPES.update(runtime.RETURN_TYPES)
+KNOWN_RETURN_TYPES[PLURAL_FORM_FOR_NUMBER_NAME] = str
+
+RUNTIME_GLOBALS = {k: getattr(runtime, k) for k in runtime.__all__}
+
+
+def get_name_properties(name):
+    properties = {}
+    if name in KNOWN_RETURN_TYPES:
+        properties[codegen.PROPERTY_RETURN_TYPE] = KNOWN_RETURN_TYPES[name]
+    return properties
+
+
+def make_module_globals(locale, plural_form_for_number, argument_handlers=None, output_handlers=None):
+    module_globals = RUNTIME_GLOBALS.copy()
+    if argument_handlers:
+        module_globals.update(
+            runtime.make_argument_handlers({**runtime.DEFAULT_ARGUMENT_HANDLERS, **argument_handlers})
+        )
+    if output_handlers:
+        module_globals.update(runtime.make_output_handlers({**runtime.DEFAULT_OUTPUT_HANDLERS, **output_handlers}))
+    module_globals.update(builtins.__dict__)
+    module_globals[LOCALE_NAME] = locale
+    module_globals[PLURAL_FORM_FOR_NUMBER_NAME] = plural_form_for_number
+    return module_globals
+
+
+def link_module_globals(
+    locale,
+    global_references,
+    functions=None,
+    escapers=None,
+    fallbacks=None,
+    argument_handlers=None,
+    output_handlers=None,
+):
+    """
+    Creates a globals dictionary for compiled message functions, from the
+    `CompiledFtl.global_references` of the compilation and the same
+    `functions`, `escapers`, `fallbacks`, `argument_handlers` and
+    `output_handlers` that were passed to `compile_messages`. Returns a tuple
+    of (globals dictionary, dictionary of message IDs to new MessageStats
+    objects).
+
+    Fallback messages are looked up when needed, so `fallbacks` can be any
+    CompiledFtl objects that contain the referenced messages.
+    """
+    babel_locale = get_babel_locale(locale)
+    module_globals = make_module_globals(
+        babel_locale,
+        get_plural_form_function(babel_locale),
+        argument_handlers=argument_handlers,
+        output_handlers=output_handlers,
+    )
+    _functions = BUILTINS.copy()
+    if functions:
+        _functions.update(functions)
+    escapers = escapers or []
+    fallbacks = fallbacks or []
+    message_stats = {}
+    # Escaped constants are made using escaper functions, so come last.
+    for name, reference in sorted(global_references.items(), key=lambda item: item[1][0] == REFERENCE_ESCAPED_CONSTANT):
+        kind = reference[0]
+        if kind == REFERENCE_FUNCTION:
+            function_name = reference[1]
+            if function_name not in _functions:
+                raise ValueError(f"Function {function_name} is used by compiled messages but was not passed")
+            value = _functions[function_name]
+        elif kind == REFERENCE_ESCAPER:
+            index, escaper_name, attribute = reference[1:]
+            if index >= len(escapers) or escapers[index].name != escaper_name:
+                raise ValueError(f"Escaper {escaper_name} is used by compiled messages but was not passed")
+            value = getattr(escapers[index], attribute)
+        elif kind == REFERENCE_ESCAPED_CONSTANT:
+            value = _make_escaped_constant(module_globals, *reference[1:])
+        elif kind == REFERENCE_FALLBACK:
+            msg_id = reference[1]
+            value = _find_fallback_function(msg_id, fallbacks)
+        elif kind == REFERENCE_MESSAGE_STATS:
+            msg_id, timing = reference[1:]
+            value = message_stats[msg_id] = runtime.MessageStats(timing=timing)
+        elif kind == REFERENCE_PERF_COUNTER:
+            value = time.perf_counter_ns
+        else:
+            raise ValueError(f"Unknown global reference {reference!r}")
+        module_globals[name] = value
+    return module_globals, message_stats
+
+
+def _make_escaped_constant(module_globals, function_name, arg):
+    # See `CompilerEnvironment.escaped_constants`
+    if isinstance(arg, tuple):
+        arg = [_make_escaped_constant(module_globals, *key) for key in arg]
+    return module_globals[function_name](arg)
+
+
+def _find_fallback_function(msg_id, fallbacks):
+    for fallback in fallbacks:
+        if msg_id in fallback.message_functions:
+            return fallback.message_functions[msg_id]
+    raise ValueError(f"Message {msg_id} is used by compiled messages but was not found in the fallbacks")
+
+
+# (builtin names, root codegen.Scope) - see get_root_scope
+_root_scope_template = None
+
+
+def get_root_scope():
+    """
+    Returns a new root scope, with names already reserved for the module
+    globals that every compiled module has.
+    """
+    global _root_scope_template
+    template = _root_scope_template
+    # Builtins can be added at runtime (e.g. by `gettext.install`), so we check
+    # the template is still valid.
+    if template is None or template[0] != builtins.__dict__.keys():
+        template = _root_scope_template = (frozenset(builtins.__dict__), _make_root_scope())
+    return template[1].copy()
+
+
+def _make_root_scope():
+    scope = codegen.Scope()
+    for k in make_module_globals(None, None):
+        name = scope.reserve_name(k, properties=get_name_properties(k), is_builtin=k in builtins.__dict__)
+        # We should have chosen all our module_globals to avoid name conflicts:
+        assert name == k, f"Expected {name}=={k}"
+
+    # Reserve names for function arguments, so that we always
+    # know the name of these arguments without needing to do
+    # lookups etc.
+    for arg in MESSAGE_FUNCTION_ARGS:
+        scope.reserve_function_arg_name(arg)
+    return scope
 
 
 def get_message_function_ast(message_dict):
@@ -414,7 +1102,15 @@ def compile_message(msg, msg_id, function_name, module, compiler_env):
         source=FtlSource(msg, compiler_env.current.ftl_resource),
     )
     function_block = msg_func.body
-    if contains_reference_cycle(msg, compiler_env):
+    if compiler_env.instrument:
+        stats_args = add_instrumentation_start(function_block, compiler_env)
+    if compiler_env.stats is not None:
+        cycle_check_start = time.perf_counter()
+        has_cycle = contains_reference_cycle(msg, compiler_env)
+        compiler_env.stats.cycle_check_time += time.perf_counter() - cycle_check_start
+    else:
+        has_cycle = contains_reference_cycle(msg, compiler_env)
+    if has_cycle:
         error = FluentCyclicReferenceError(f"{display_ast_location(msg, compiler_env)}: Cyclic reference in {msg_id}")
         add_static_msg_error(function_block, error)
         compiler_env.add_current_message_error(error)
@@ -423,11 +1119,184 @@ def compile_message(msg, msg_id, function_name, module, compiler_env):
         )
     else:
         return_expression = compile_expr(msg, function_block, compiler_env)
+    if compiler_env.instrument:
+        return_expression = add_instrumentation_end(return_expression, stats_args, function_block, compiler_env)
     # > return $return_expression
     msg_func.add_return(return_expression)
     return msg_func
 
 
+def make_reference_finder(message_ids_to_ast, term_ids_to_ast, used_term_ids=None):
+    """
+    Returns a function that takes a message or term AST and returns the IDs
+    of the messages it references, directly or via terms. The IDs of the
+    terms found are added to the `used_term_ids` set, if passed.
+    """
+    term_references = {}
+
+    def get_references(item):
+        references = []
+        for node in pattern_expressions(item.value):
+            if isinstance(node, MessageReference):
+                ref_id = reference_to_id(node)
+                if ref_id not in message_ids_to_ast and node.attribute:
+                    ref_id = reference_to_id(node, ignore_attributes=True)
+                if ref_id in message_ids_to_ast:
+                    references.append(ref_id)
+            elif isinstance(node, TermReference):
+                references.extend(get_term_references(node))
+        return references
+
+    def get_term_references(ref):
+        term_id = reference_to_id(ref)
+        if term_id not in term_ids_to_ast and ref.attribute:
+            term_id = reference_to_id(ref, ignore_attributes=True)
+        if term_id not in term_ids_to_ast:
+            return []
+        if term_id not in term_references:
+            if used_term_ids is not None:
+                used_term_ids.add(term_id)
+            # Guard against cyclic references, which are reported elsewhere.
+            term_references[term_id] = []
+            term_references[term_id] = get_references(term_ids_to_ast[term_id])
+        return term_references[term_id]
+
+    return get_references
+
+
+def get_compilation_order(compiler_env):
+    """
+    Returns the IDs of the messages to compile, ordered so that messages come
+    after the messages they reference, directly or via terms (except where
+    there are cycles).
+    """
+    message_ids_to_ast = compiler_env.message_ids_to_ast
+    get_references = make_reference_finder(message_ids_to_ast, compiler_env.term_ids_to_ast)
+
+    # Depth first search, without recursion because chains of references can
+    # be long.
+    order = []
+    visited = set()
+    for root_id, root in message_ids_to_ast.items():
+        if root_id in visited:
+            continue
+        visited.add(root_id)
+        stack = [(root_id, iter(get_references(root)))]
+        while stack:
+            msg_id, references = stack[-1]
+            for ref_id in references:
+                if ref_id not in visited:
+                    visited.add(ref_id)
+                    stack.append((ref_id, iter(get_references(message_ids_to_ast[ref_id]))))
+                    break
+            else:
+                stack.pop()
+                order.append(msg_id)
+    return order
+
+
+def get_included_items(include, message_ids_to_ast, term_ids_to_ast):
+    """
+    Returns (message IDs to AST, term IDs to AST) dictionaries containing only
+    the messages for which `include` returns True, and the messages and terms
+    that they reference, directly or indirectly.
+    """
+    used_term_ids = set()
+    get_references = make_reference_finder(message_ids_to_ast, term_ids_to_ast, used_term_ids=used_term_ids)
+    used_message_ids = set()
+    stack = [msg_id for msg_id in message_ids_to_ast if include(msg_id)]
+    while stack:
+        msg_id = stack.pop()
+        if msg_id in used_message_ids:
+            continue
+        used_message_ids.add(msg_id)
+        stack.extend(get_references(message_ids_to_ast[msg_id]))
+    # Keep the original order, which determines function names and the order
+    # errors are reported in.
+    return (
+        OrderedDict((msg_id, msg) for msg_id, msg in message_ids_to_ast.items() if msg_id in used_message_ids),
+        OrderedDict((term_id, term) for term_id, term in term_ids_to_ast.items() if term_id in used_term_ids),
+    )
+
+
+def make_include_predicate(include):
+    """
+    Returns a function that returns True for the message IDs matched by the
+    `include` option of `compile_messages`, or None if all messages are
+    included.
+
+    `include` can be None, a function that takes a message ID and returns a
+    boolean, or a list of strings. Each string is a message ID, which also
+    matches the attributes of the message, or a prefix ending with `*`.
+    """
+    if include is None or callable(include):
+        return include
+    if isinstance(include, str):
+        raise TypeError("include must be a list of message IDs or prefixes, or a function, not a string")
+    ids = set()
+    prefixes = []
+    for item in include:
+        if item.endswith("*"):
+            prefixes.append(item[:-1])
+        else:
+            ids.add(item)
+    prefixes = tuple(prefixes)
+
+    def predicate(msg_id):
+        return msg_id in ids or msg_id.split(ATTRIBUTE_SEPARATOR)[0] in ids or msg_id.startswith(prefixes)
+
+    return predicate
+
+
+def get_constant_return_value(function):
+    """
+    Returns the string returned by a compiled function, if it does nothing
+    but return a constant string, otherwise None.
+    """
+    statements = function.body.statements
+    if (
+        len(statements) == 1
+        and isinstance(statements[0], codegen.Return)
+        and isinstance(statements[0].value, codegen.String)
+    ):
+        return statements[0].value.string_value
+    return None
+
+
+def add_instrumentation_start(block, compiler_env):
+    """
+    Adds code to the start of a message function for recording statistics,
+    returning the arguments to pass to MessageStats.record at the end.
+    """
+    # > $errors_len_name = len(errors)
+    errors_len_name = reserve_and_assign_name(
+        block,
+        "_errors_len",
+        codegen.FunctionCall("len", [block.scope.variable(ERRORS_NAME)], {}, block.scope),
+    )
+    stats_args = [block.scope.variable(ERRORS_NAME), block.scope.variable(errors_len_name)]
+    if compiler_env.instrument == INSTRUMENT_TIMING:
+        # > $start_name = perf_counter_ns()
+        start_name = reserve_and_assign_name(
+            block, "_start", codegen.FunctionCall(PERF_COUNTER_NAME, [], {}, block.scope)
+        )
+        stats_args.append(block.scope.variable(start_name))
+    return stats_args
+
+
+def add_instrumentation_end(return_expression, stats_args, block, compiler_env):
+    """
+    Adds code to the end of a message function to record statistics, returning
+    the expression to be returned.
+    """
+    # > $ret_name = $return_expression
+    # > $stats_name.record(errors, $errors_len_name, $start_name)
+    ret_name = reserve_and_assign_name(block, "_ret", return_expression)
+    stats_name = compiler_env.message_stats_names[compiler_env.current.message_id]
+    block.add_statement(codegen.MethodCall(block.scope.variable(stats_name), "record", stats_args))
+    return block.scope.variable(ret_name)
+
+
 def traverse_ast(node, func, exclude_attributes=None):
     """
     Postorder-traverse this node and apply `func` to all child nodes.
@@ -726,7 +1595,7 @@ def compile_expr_message_reference(reference, block, compiler_env):
     return handle_message_reference(reference, block, compiler_env)
 
 
-def compile_term(term, block, compiler_env, new_escaper, term_args=None):
+def compile_term(term, block, compiler_env, new_escaper, term_args=None, term_id=None, args_key=()):
     current_escaper = compiler_env.current.escaper
     if not escapers_compatible(current_escaper, new_escaper):
         term_id = ast_to_id(term)
@@ -736,17 +1605,169 @@ def compile_term(term, block, compiler_env, new_escaper, term_args=None):
         add_static_msg_error(block, error)
         compiler_env.add_current_message_error(error)
         return make_fluent_none(term_id, block.scope)
+    elif term_id is not None and use_term_function(term_id, compiler_env):
+        return compile_term_function_call(term, term_id, args_key, block, compiler_env, new_escaper, term_args)
     else:
         with compiler_env.modified(escaper=new_escaper):
             with compiler_env.modified_for_term_reference(term_args=term_args):
                 return compile_expr(term.value, block, compiler_env)
 
 
+def compile_term_function_call(term, term_id, args_key, block, compiler_env, new_escaper, term_args):
+    """
+    Returns a call to the shared helper function for the term and arguments,
+    compiling the function the first time it is needed.
+    """
+    # Term arguments are always literals, so we compile a function for each
+    # set of arguments, which allows select expressions to be resolved at
+    # compile time just like they are for inlined terms.
+    key = (term_id, args_key)
+    if key in compiler_env.term_functions:
+        function_name, value, errors = compiler_env.term_functions[key]
+        # Report compilation errors against every message that uses the term,
+        # as we do when inlining.
+        for error in errors:
+            compiler_env.add_current_message_error(error)
+    else:
+        errors_start = len(compiler_env.errors)
+        module_scope = get_module_scope(block.scope)
+        # The name is filled in below, if it turns out we need the function.
+        term_func = codegen.Function(
+            parent_scope=module_scope,
+            name=None,
+            args=[ERRORS_NAME],
+            source=FtlSource(term, term.ftl_resource),
+        )
+        with compiler_env.modified(escaper=new_escaper):
+            with compiler_env.modified_for_term_reference(term_args=term_args):
+                return_expression = compile_expr(term.value, term_func.body, compiler_env)
+        term_func.add_return(return_expression)
+        # Simplify now, so that we can tell if the function is needed. The
+        # simplifier is idempotent, so simplifying the module later does no
+        # harm.
+        if compiler_env.simplifier is not None:
+            codegen.simplify(term_func, compiler_env.simplifier)
+        constant = get_constant_return_value(term_func)
+        if constant is not None:
+            # Constant, which is cheaper to inline than to call
+            function_name, value = None, constant
+        else:
+            value = None
+            # Different arguments can give the same code, e.g. when they only
+            # differ in arguments that aren't used by the selected variant.
+            body_key = (
+                new_escaper.output_type,
+                ast.dump(ast.Module(body=term_func.body.as_ast_list(allow_empty=False), type_ignores=[])),
+            )
+            function_name = compiler_env.term_function_bodies.get(body_key)
+            if function_name is None:
+                function_name = term_func.func_name = module_scope.reserve_name(
+                    "term" + suggested_function_name_for_msg_id(term_id),
+                    properties={codegen.PROPERTY_RETURN_TYPE: new_escaper.output_type},
+                )
+                compiler_env.term_function_bodies[body_key] = function_name
+                compiler_env.term_function_definitions.append(term_func)
+        compiler_env.term_functions[key] = (
+            function_name,
+            value,
+            [error for _, error in compiler_env.errors[errors_start:]],
+        )
+
+    if function_name is None:
+        return codegen.String(value)
+    # > $function_name(errors)
+    return codegen.FunctionCall(function_name, [block.scope.variable(ERRORS_NAME)], {}, block.scope)
+
+
+def use_term_function(term_id, compiler_env):
+    """
+    Returns True if references to the term should be compiled to calls to
+    a helper function, rather than inlined.
+    """
+    threshold = compiler_env.term_inline_threshold
+    if threshold is None:
+        return False
+    size = get_term_inlined_size(term_id, compiler_env)
+    if size == 0:
+        # Just text
+        return False
+    if compiler_env.term_reference_counts is None:
+        compiler_env.term_reference_counts = get_term_reference_counts(compiler_env)
+    return size * max(compiler_env.term_reference_counts[term_id], 1) > threshold
+
+
+def get_term_inlined_size(term_id, compiler_env):
+    """
+    Returns an estimate of the size of the code for a term when inlined, as
+    the number of expressions and variants in it, including other inlined
+    terms.
+    """
+    sizes = compiler_env.term_sizes
+    if term_id not in sizes:
+        # Guard against cyclic references, which are reported elsewhere.
+        sizes[term_id] = 0
+        size = 0
+        for node in pattern_expressions(compiler_env.term_ids_to_ast[term_id].value):
+            size += 1
+            if isinstance(node, TermReference):
+                ref_id = reference_to_id(node)
+                if ref_id in compiler_env.term_ids_to_ast and not use_term_function(ref_id, compiler_env):
+                    size += get_term_inlined_size(ref_id, compiler_env)
+        sizes[term_id] = size
+    return sizes[term_id]
+
+
+def get_term_reference_counts(compiler_env):
+    """
+    Returns a Counter of term ID -> number of references to the term in all
+    messages and terms.
+    """
+    counts = Counter()
+    items = list(compiler_env.message_ids_to_ast.items()) + [
+        (term_id, term) for term_id, term in compiler_env.term_ids_to_ast.items() if term_id.startswith(TERM_SIGIL)
+    ]
+    for _, item in items:
+        for node in pattern_expressions(item.value):
+            if isinstance(node, TermReference):
+                counts[reference_to_id(node)] += 1
+    return counts
+
+
+def pattern_expressions(pattern):
+    """
+    Yields the expressions and variants in an FTL pattern, including nested
+    ones, but not those in referenced messages and terms.
+    """
+    for element in pattern.elements:
+        if isinstance(element, Placeable):
+            yield from _expressions(element.expression)
+
+
+def _expressions(expr):
+    yield expr
+    if isinstance(expr, Placeable):
+        yield from _expressions(expr.expression)
+    elif isinstance(expr, SelectExpression):
+        yield from _expressions(expr.selector)
+        for variant in expr.variants:
+            yield variant
+            yield from pattern_expressions(variant.value)
+    elif isinstance(expr, (FunctionReference, TermReference)) and expr.arguments is not None:
+        for arg in expr.arguments.positional:
+            yield from _expressions(arg)
+        for kwarg in expr.arguments.named:
+            yield from _expressions(kwarg.value)
+
+
 @compile_expr.register(TermReference)
 def compile_expr_term_reference(reference, block, compiler_env):
     term, new_escaper, err_obj = lookup_term_reference(reference, block, compiler_env)
     if term is None:
         return err_obj
+    term_id = reference_to_id(reference)
+    if term_id not in compiler_env.term_ids_to_ast:
+        # Fallback to parent, see lookup_term_reference
+        term_id = reference_to_id(reference, ignore_attributes=True)
     if reference.arguments:
         args = [compile_expr(arg, block, compiler_env) for arg in reference.arguments.positional]
         kwargs = {
@@ -759,10 +1780,17 @@ def compile_expr_term_reference(reference, block, compiler_env):
             )
             add_static_msg_error(block, args_err)
             compiler_env.add_current_message_error(args_err)
+        # The arguments are always literals, so can be used as a key.
+        args_key = tuple(
+            sorted(
+                (kwarg.name.name, type(kwarg.value).__name__, kwarg.value.value) for kwarg in reference.arguments.named
+            )
+        )
     else:
         kwargs = None
+        args_key = ()
 
-    return compile_term(term, block, compiler_env, new_escaper, term_args=kwargs)
+    return compile_term(term, block, compiler_env, new_escaper, term_args=kwargs, term_id=term_id, args_key=args_key)
 
 
 @compile_expr.register(SelectExpression)
@@ -778,7 +1806,13 @@ def compile_expr_select_expression(select_expr, block, compiler_env):
 
     return_tmp_name = block.scope.reserve_name("_ret")
 
-    need_plural_form = any(is_cldr_plural_form_key(variant.key) for variant in select_expr.variants)
+    # For arguments with a declared type, we know which kind of comparison is
+    # needed for plural category keys (see below).
+    key_type = block.scope.get_name_properties(key_tmp_name).get(PROPERTY_ARGUMENT_TYPE)
+
+    need_plural_form = key_type is not str and any(
+        is_cldr_plural_form_key(variant.key) for variant in select_expr.variants
+    )
     if need_plural_form:
         plural_form_value = codegen.FunctionCall(
             PLURAL_FORM_FOR_NUMBER_NAME,
@@ -813,7 +1847,13 @@ def compile_expr_select_expression(select_expr, block, compiler_env):
                 compile_expr(variant.key, block, compiler_env),
             )
 
-            if is_cldr_plural_form_key(variant.key):
+            if key_type is int and is_cldr_plural_form_key(variant.key):
+                # > $plural_form_tmp_name == $variant.key
+                condition = codegen.Equals(
+                    block.scope.variable(plural_form_tmp_name),
+                    compile_expr(variant.key, block, compiler_env),
+                )
+            elif need_plural_form and is_cldr_plural_form_key(variant.key):
                 # > $plural_form_tmp_name == $variant.key
                 condition2 = codegen.Equals(
                     block.scope.variable(plural_form_tmp_name),
@@ -906,6 +1946,18 @@ def compile_expr_variable_reference(argument, block, compiler_env):
         if not wrap_with_handle_argument:
             return block.scope.variable(arg_tmp_name)
 
+        # If the argument has a declared type, it has already been checked,
+        # and is either of that type or FluentNone.
+        declared_type = block.scope.get_name_properties(arg_tmp_name).get(PROPERTY_ARGUMENT_TYPE)
+        if declared_type is str and escaper is null_escaper:
+            return block.scope.variable(arg_tmp_name)
+        if declared_type is int:
+            # > $arg_handled_tmp_name = fluent_number($arg_tmp_name)
+            block.scope.set_name_properties(arg_handled_tmp_name, {codegen.PROPERTY_TYPE: FluentType})
+            handle_argument_func_call = codegen.FunctionCall(
+                "fluent_number", [block.scope.variable(arg_tmp_name)], {}, block.scope
+            )
+
         block.add_assignment(arg_handled_tmp_name, handle_argument_func_call)
         return block.scope.variable(arg_handled_tmp_name)
 
@@ -933,6 +1985,21 @@ def compile_expr_variable_reference(argument, block, compiler_env):
     # > $arg_tmp_name = FluentNone("$name")
     try_except.except_block.add_assignment(arg_tmp_name, make_fluent_none(name, block.scope), allow_multiple=True)
 
+    declared_type = compiler_env.declared_argument_type(name)
+    if declared_type is str and wrap_with_handle_argument and compiler_env.current.escaper is not null_escaper:
+        # The escaper needs to handle the argument, in case it is already
+        # escaped.
+        declared_type = None
+    if declared_type is not None:
+        return compile_typed_argument(
+            name,
+            declared_type,
+            arg_tmp_name,
+            arg_handled_tmp_name if wrap_with_handle_argument else None,
+            try_except,
+            block,
+        )
+
     if not wrap_with_handle_argument:
         return block.scope.variable(arg_tmp_name)
 
@@ -950,6 +2017,63 @@ def compile_expr_variable_reference(argument, block, compiler_env):
     return block.scope.variable(arg_handled_tmp_name)
 
 
+def compile_typed_argument(name, declared_type, arg_tmp_name, arg_handled_tmp_name, try_except, block):
+    """
+    Adds code to check an external argument that was looked up in
+    `try_except` against its declared type. If `arg_handled_tmp_name` is not
+    None, also adds code to convert the argument for output, without the
+    generic `handle_argument`/`handle_output` functions.
+    """
+    # > if not isinstance($arg_tmp_name, $declared_type):
+    # >     $arg_tmp_name = check_argument_type($arg_tmp_name, "$name", $declared_type, errors)
+    check = codegen.If(block.scope, parent_block=try_except.else_block)
+    check_block = check.add_if(
+        codegen.Not(
+            codegen.FunctionCall(
+                "isinstance",
+                [block.scope.variable(arg_tmp_name), block.scope.variable(declared_type.__name__)],
+                {},
+                block.scope,
+            )
+        )
+    )
+    check_block.add_assignment(
+        arg_tmp_name,
+        codegen.FunctionCall(
+            "check_argument_type",
+            [
+                block.scope.variable(arg_tmp_name),
+                codegen.String(name),
+                block.scope.variable(declared_type.__name__),
+                block.scope.variable(ERRORS_NAME),
+            ],
+            {},
+            block.scope,
+        ),
+        allow_multiple=True,
+    )
+    try_except.else_block.add_statement(check.finalize())
+    block.scope.set_name_properties(arg_tmp_name, {PROPERTY_ARGUMENT_TYPE: declared_type})
+
+    if arg_handled_tmp_name is None:
+        return block.scope.variable(arg_tmp_name)
+
+    if declared_type is str:
+        # Strings can be output directly. FluentNone(name) formats as name.
+        # > $arg_handled_tmp_name = "$name"
+        block.scope.set_name_properties(arg_handled_tmp_name, {codegen.PROPERTY_TYPE: str})
+        try_except.except_block.add_assignment(arg_handled_tmp_name, codegen.String(name))
+        handled_value = block.scope.variable(arg_tmp_name)
+    else:
+        # > $arg_handled_tmp_name = $arg_tmp_name
+        block.scope.set_name_properties(arg_handled_tmp_name, {codegen.PROPERTY_TYPE: FluentType})
+        try_except.except_block.add_assignment(arg_handled_tmp_name, block.scope.variable(arg_tmp_name))
+        # > fluent_number($arg_tmp_name)
+        handled_value = codegen.FunctionCall("fluent_number", [block.scope.variable(arg_tmp_name)], {}, block.scope)
+    try_except.else_block.add_assignment(arg_handled_tmp_name, handled_value, allow_multiple=True)
+    return block.scope.variable(arg_handled_tmp_name)
+
+
 @compile_expr.register(FunctionReference)
 def compile_expr_function_reference(expr, block, compiler_env):
     args = [compile_expr(arg, block, compiler_env) for arg in expr.arguments.positional]
@@ -1027,7 +2151,13 @@ def do_message_call(msg_id, block, compiler_env):
         compiler_env.add_current_message_error(error)
         return make_fluent_none(msg_id, block.scope)
 
-    msg_func_name = compiler_env.message_mapping[msg_id]
+    if msg_id in compiler_env.message_constants:
+        # > $constant
+        return wrap_with_escaper(codegen.String(compiler_env.message_constants[msg_id]), block, compiler_env)
+    if msg_id in compiler_env.message_mapping:
+        msg_func_name = compiler_env.message_mapping[msg_id]
+    else:
+        msg_func_name = reserve_fallback_function_name(msg_id, block, compiler_env)
     if compiler_env.current.term_args is not None:
         # Message call from inside a term.
         # We pass term args to message function, not external args.
@@ -1132,14 +2262,40 @@ def lookup_term_reference(ref, block, compiler_env):
     return None, None, unknown_reference(term_id, block, ref, compiler_env)
 
 
+def get_module_scope(scope):
+    while scope.parent_scope is not None:
+        scope = scope.parent_scope
+    return scope
+
+
+def reserve_fallback_function_name(msg_id, block, compiler_env):
+    """
+    Reserves a module level name for the fallback function for a message,
+    returning the name.
+    """
+    if msg_id not in compiler_env.fallback_function_names:
+        module_scope = get_module_scope(block.scope)
+        # The 'fallback_' prefix ensures we can't clash with local variables in
+        # functions that have already been compiled, which all start with '_'.
+        compiler_env.fallback_function_names[msg_id] = module_scope.reserve_name(
+            "fallback_" + suggested_function_name_for_msg_id(msg_id),
+            properties={codegen.PROPERTY_RETURN_TYPE: compiler_env.escaper_for_message(msg_id).output_type},
+        )
+    return compiler_env.fallback_function_names[msg_id]
+
+
+def is_message_available(msg_id, compiler_env):
+    return msg_id in compiler_env.message_ids_to_ast or msg_id in compiler_env.fallback_functions
+
+
 def handle_message_reference(ref, block, compiler_env):
     msg_id = reference_to_id(ref)
-    if msg_id in compiler_env.message_ids_to_ast:
+    if is_message_available(msg_id, compiler_env):
         return do_message_call(msg_id, block, compiler_env)
     # Fallback to parent
     if ref.attribute:
         parent_id = reference_to_id(ref, ignore_attributes=True)
-        if parent_id in compiler_env.message_ids_to_ast:
+        if is_message_available(parent_id, compiler_env):
             error = unknown_reference_error_obj(msg_id, ref, compiler_env)
             add_static_msg_error(block, error)
             compiler_env.add_current_message_error(error)
@@ -1239,7 +2395,7 @@ def unknown_reference(name, block, ast_node, compiler_env):
 
 def display_ast_location(ast_node, compiler_env):
     ftl_resource = compiler_env.current.ftl_resource
-    return display_location(ftl_resource.filename, span_to_position(ast_node.span, ftl_resource.text))
+    return display_location(ftl_resource.filename, ftl_resource.position(ast_node.span.start))
 
 
 def unknown_reference_error_obj(ref_id, source_ast_node, compiler_env):
@@ -1289,8 +2445,33 @@ def is_NUMBER_function_call(codegen_ast):
 
 
 class Simplifier:
-    def __init__(self, compiler_env):
+    def __init__(self, compiler_env, module_scope):
         self.compiler_env = compiler_env
+        self.module_scope = module_scope
+        # Escaper function name -> (escaper, function), for functions that can
+        # be called at compile time.
+        self.escaper_functions = {}
+        for escaper in compiler_env.escapers or []:
+            self.escaper_functions[escaper.escape_name()] = (escaper, escaper.escape)
+            self.escaper_functions[escaper.mark_escaped_name()] = (escaper, escaper.mark_escaped)
+        # Module name -> key in `compiler_env.escaped_constants` for constants
+        # created by `escaped_constant`
+        self.escaped_constant_keys = {}
+
+    def escaped_constant(self, escaper, function_name, func, arg):
+        """
+        Returns a reference to a module level constant containing the result
+        of calling the escaper function on the argument.
+        """
+        key = (function_name, arg)
+        constants = self.compiler_env.escaped_constants
+        if key not in constants:
+            name = self.module_scope.reserve_name(
+                escaper.constant_name(), properties={codegen.PROPERTY_TYPE: escaper.output_type}
+            )
+            constants[key] = (name, func(arg))
+            self.escaped_constant_keys[name] = key
+        return codegen.VariableReference(constants[key][0], self.module_scope)
 
     def __call__(self, codegen_ast, changes):
         # Simplifications we can do on the AST tree. We append to
@@ -1309,7 +2490,7 @@ class Simplifier:
             and not codegen_ast.kwargs
             and is_NUMBER_function_call(codegen_ast.args[0])
         ):
-            changes.append(True)
+            changes.append("nested_number")
             return codegen_ast.args[0]
 
         # NUMBER(NUMBER(x), kwargs=...) -> NUMBER(x, kwargs=...)
@@ -1318,7 +2499,7 @@ class Simplifier:
             and is_NUMBER_function_call(codegen_ast.args[0])
             and not codegen_ast.args[0].kwargs
         ):
-            changes.append(True)
+            changes.append("nested_number_kwargs")
             codegen_ast.args[0] = codegen_ast.args[0].args[0]
 
         # Numeric literals in some function call keyword arguments don't need to be
@@ -1330,7 +2511,7 @@ class Simplifier:
             for kwarg_name, kwarg_value in list(codegen_ast.kwargs.items()):
                 if is_NUMBER_function_call(kwarg_value) and not kwarg_value.kwargs:
                     codegen_ast.kwargs[kwarg_name] = kwarg_value.args[0]
-                    changes.append(True)
+                    changes.append("number_kwarg_literal")
 
         # Numeric literals used in comparisons (select expressions) don't need to be wrapped
         # in NUMBER(), because FluentNumber and int/float compare in the same way.
@@ -1341,7 +2522,7 @@ class Simplifier:
             and not codegen_ast.left.kwargs
         ):
             codegen_ast.left = codegen_ast.left.args[0]
-            changes.append(True)
+            changes.append("number_comparison")
         # NUMBER(y) == x  -> y == x
         if (
             isinstance(codegen_ast, codegen.Equals)
@@ -1349,7 +2530,49 @@ class Simplifier:
             and not codegen_ast.right.kwargs
         ):
             codegen_ast.right = codegen_ast.right.args[0]
-            changes.append(True)
+            changes.append("number_comparison")
+
+        # Escaper functions called with string literals can be evaluated now,
+        # and the result stored as a module level constant.
+        # escaper_0__mark_escaped('<b>x</b>') -> escaper_0__text
+        if (
+            isinstance(codegen_ast, codegen.FunctionCall)
+            and codegen_ast.function_name in self.escaper_functions
+            and len(codegen_ast.args) == 1
+            and not codegen_ast.kwargs
+            and isinstance(codegen_ast.args[0], codegen.String)
+        ):
+            changes.append("escaped_constant")
+            escaper, func = self.escaper_functions[codegen_ast.function_name]
+            return self.escaped_constant(escaper, codegen_ast.function_name, func, codegen_ast.args[0].string_value)
+
+        # Joins of escaped constants can also be evaluated now.
+        # escaper_0__join([escaper_0__text, escaper_0__text2]) -> escaper_0__text3
+        if isinstance(codegen_ast, EscaperJoin) and all(
+            isinstance(part, codegen.VariableReference) and part.name in self.escaped_constant_keys
+            for part in codegen_ast.parts
+        ):
+            changes.append("escaped_join")
+            escaper = codegen_ast.escaper
+            constants = self.compiler_env.escaped_constants
+            # Keyed by the parts' keys rather than their names, so that the
+            # value can be made again without the parts, which may be unused.
+            return self.escaped_constant(
+                escaper,
+                escaper.join_name(),
+                lambda keys: escaper.join([constants[key][1] for key in keys]),
+                tuple(self.escaped_constant_keys[part.name] for part in codegen_ast.parts),
+            )
+
+        # Joins with parts that have been simplified to adjacent strings can be
+        # merged, possibly into a single string.
+        # f'Firefox {"x"}' -> 'Firefox x'
+        if isinstance(codegen_ast, codegen.StringJoinBase) and any(
+            isinstance(part, codegen.String) and isinstance(next_part, codegen.String)
+            for part, next_part in zip(codegen_ast.parts, codegen_ast.parts[1:])
+        ):
+            changes.append("string_join_merge")
+            return type(codegen_ast).build(codegen_ast.parts)
 
         # FluentNone('x').format(locale) -> 'x'
         if (
@@ -1370,7 +2593,7 @@ class Simplifier:
                 none_object = None
 
             if none_object is not None:
-                changes.append(True)
+                changes.append("fluent_none_format")
                 return codegen.String(none_object.format(self.compiler_env.locale))
 
         return codegen_ast
@@ -90,21 +90,25 @@ class RegisteredEscaper:
         return self._escaper.name
 
     def get_reserved_names_with_properties(self):
-        # escaper.output_type, escaper.mark_escaped, escaper.escape, escaper.join
+        # (module name, escaper attribute name, value, properties) for
+        # escaper.output_type, escaper.escape, escaper.mark_escaped, escaper.join
         return [
-            (self.output_type_name(), self._escaper.output_type, {}),
+            (self.output_type_name(), "output_type", self._escaper.output_type, {}),
             (
                 self.escape_name(),
+                "escape",
                 self._escaper.escape,
                 {codegen.PROPERTY_RETURN_TYPE: self._escaper.output_type},
             ),
             (
                 self.mark_escaped_name(),
+                "mark_escaped",
                 self._escaper.mark_escaped,
                 {codegen.PROPERTY_RETURN_TYPE: self._escaper.output_type},
             ),
             (
                 self.join_name(),
+                "join",
                 self._escaper.join,
                 {codegen.PROPERTY_RETURN_TYPE: self._escaper.output_type},
             ),
@@ -126,6 +130,11 @@ class RegisteredEscaper:
     def join_name(self):
         return f"{self._prefix()}_join"
 
+    def constant_name(self):
+        # Suggested name for module level constants created by calling escaper
+        # functions at compile time.
+        return f"{self._prefix()}_text"
+
     @property
     def use_isolating(self):
         return getattr(self._escaper, "use_isolating", None)
@@ -0,0 +1,124 @@
+"""
+Snapshots of the babel locale data that is needed at runtime.
+
+Loading a `babel.Locale` lazily unpickles babel's complete data file for the
+locale, most of which (language and territory names, unit patterns etc.) is
+never used by fluent_compiler. A snapshot contains just the parts needed for
+compiling and formatting messages, and can be loaded instead.
+"""
+
+import pickle
+
+import babel
+from babel import localedata
+from babel.core import parse_locale
+
+from .compiler import get_babel_locale
+
+# Top level keys of babel's locale data used for plural rules and number/date
+# formatting.
+RUNTIME_LOCALE_DATA_KEYS = [
+    "currency_formats",
+    "currency_names",
+    "currency_names_plural",
+    "currency_symbols",
+    "currency_unit_patterns",
+    "date_formats",
+    "datetime_formats",
+    "day_period_rules",
+    "day_periods",
+    "days",
+    "decimal_formats",
+    "eras",
+    "meta_zones",
+    "months",
+    "number_symbols",
+    "percent_formats",
+    "plural_form",
+    "quarters",
+    "time_formats",
+    "time_zones",
+    "zone_formats",
+]
+
+# Keys containing data for every currency, which can be limited to the ones
+# actually used.
+CURRENCY_LOCALE_DATA_KEYS = [
+    "currency_names",
+    "currency_names_plural",
+    "currency_symbols",
+]
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class SnapshotLocale(babel.Locale):
+    """
+    A `babel.Locale` that gets its data from a snapshot, rather than
+    babel's locale database. If data that is not in the snapshot is needed,
+    it is loaded from babel's database.
+    """
+
+    def __init__(self, identifier, data):
+        super().__init__(*parse_locale(identifier))
+        self._snapshot_data = localedata.LocaleDataDict(_SnapshotDict(data, identifier))
+
+    @property
+    def _data(self):
+        return self._snapshot_data
+
+
+class _SnapshotDict(dict):
+    def __init__(self, data, identifier):
+        super().__init__(data)
+        self.identifier = identifier
+        self._full_data = None
+
+    def __missing__(self, key):
+        if self._full_data is None:
+            self._full_data = localedata.load(self.identifier)
+        return self._full_data[key]
+
+
+def extract_locale_data(locale, currencies=None):
+    """
+    Returns a dictionary containing the babel locale data needed at runtime
+    for the locale (a locale string or `babel.Locale` object).
+
+    If `currencies` is passed, currency data is limited to those currency codes.
+    """
+    full_data = localedata.load(str(get_babel_locale(locale)))
+    data = {key: full_data[key] for key in RUNTIME_LOCALE_DATA_KEYS if key in full_data}
+    if currencies is not None:
+        for key in CURRENCY_LOCALE_DATA_KEYS:
+            if key in data:
+                data[key] = {code: value for code, value in data[key].items() if code in currencies}
+    return data
+
+
+def dump_locale_data(locale, file, currencies=None):
+    """
+    Writes a snapshot of the runtime locale data for the locale to a binary file object.
+    """
+    pickle.dump(
+        {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "identifier": str(get_babel_locale(locale)),
+            "data": extract_locale_data(locale, currencies=currencies),
+        },
+        file,
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def load_locale_data(file):
+    """
+    Loads a snapshot written by `dump_locale_data` from a binary file object,
+    returning a `SnapshotLocale`.
+
+    Snapshots are pickles, so they must only be loaded from trusted sources.
+    """
+    snapshot = pickle.load(file)
+    if snapshot.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported locale data snapshot version {snapshot.get('version')!r}")
+    return SnapshotLocale(snapshot["identifier"], snapshot["data"])
@@ -0,0 +1,186 @@
+import contextlib
+import contextvars
+import functools
+
+# Max number of distinct Accept-Language strings (and fallback chains) to cache.
+DEFAULT_CACHE_SIZE = 1024
+
+
+class FluentLocalization:
+    """
+    A FluentLocalization combines a number of single-locale FluentBundle
+    objects. Messages are formatted using a chain of bundles, negotiated from
+    a list of requested locales (e.g. an HTTP Accept-Language header), so that
+    messages missing from the preferred locales fall back to others.
+
+    Use `FluentLocalization.activate` (or `activated`) to set the requested
+    locales for the current context, and then `FluentLocalization.format`.
+    """
+
+    def __init__(self, bundles, default_locale=None, cache_size=DEFAULT_CACHE_SIZE):
+        if not bundles:
+            raise ValueError("At least one bundle is required")
+        self.bundles = {normalize_locale(bundle.locale): bundle for bundle in bundles}
+        if default_locale is None:
+            default_locale = bundles[0].locale
+        self.default_locale = normalize_locale(default_locale)
+        if self.default_locale not in self.bundles:
+            raise ValueError(f"No bundle for default locale {default_locale!r}")
+
+        # Caches of Accept-Language string -> chain of locales, and (chain of
+        # locales, generation) -> message table. The generation is increased
+        # when a bundle is recompiled, so that tables built from the old
+        # messages are not used.
+        self._negotiate_cached = functools.lru_cache(maxsize=cache_size)(self._negotiate)
+        self._message_table_cached = functools.lru_cache(maxsize=cache_size)(self._build_message_table)
+        self._generation = 0
+        # (chain, generation, message table) for the current context
+        self._current = contextvars.ContextVar(f"FluentLocalization_{id(self)}_current", default=None)
+        self._default_table = self._message_table_cached((self.default_locale,), self._generation)
+        for bundle in self.bundles.values():
+            bundle._add_install_callback(self.clear_cache)
+
+    def negotiate(self, accept_language):
+        """
+        Returns the chain of locales (a tuple of normalized locale strings) to use
+        for an Accept-Language string e.g. "de-AT,de;q=0.9,en;q=0.5"
+        """
+        return self._negotiate_cached(accept_language)
+
+    def _negotiate(self, accept_language):
+        chain = []
+        for requested in parse_accept_language(accept_language):
+            language = requested.split("-")[0]
+            # Exact match, then parent language, then other locales with the same language.
+            candidates = [requested, language] + sorted(
+                locale for locale in self.bundles if locale.split("-")[0] == language
+            )
+            for candidate in candidates:
+                if candidate in self.bundles and candidate not in chain:
+                    chain.append(candidate)
+        if self.default_locale not in chain:
+            chain.append(self.default_locale)
+        return tuple(chain)
+
+    def _build_message_table(self, chain, generation):
+        # Build from lowest to highest priority, so that earlier bundles in the
+        # chain win.
+        table = {}
+        for locale in reversed(chain):
+            table.update(self.bundles[locale]._compiled_messages)
+        return table
+
+    def _message_table(self, accept_language):
+        return self._message_table_cached(self.negotiate(accept_language), self._generation)
+
+    def clear_cache(self):
+        """
+        Discards message tables built from the bundles' compiled messages.
+        This is called automatically when one of the bundles is recompiled.
+        """
+        self._generation += 1
+        self._message_table_cached.cache_clear()
+        self._default_table = self._message_table_cached((self.default_locale,), self._generation)
+
+    def activate(self, accept_language):
+        """
+        Sets the requested locales for the current context (thread, asyncio
+        task etc.), returning a token that can be passed to `deactivate`.
+        """
+        chain = self.negotiate(accept_language)
+        generation = self._generation
+        return self._current.set((chain, generation, self._message_table_cached(chain, generation)))
+
+    def deactivate(self, token):
+        self._current.reset(token)
+
+    @contextlib.contextmanager
+    def activated(self, accept_language):
+        """
+        Context manager version of `activate`
+        """
+        token = self.activate(accept_language)
+        try:
+            yield self
+        finally:
+            self.deactivate(token)
+
+    def has_message(self, message_id, accept_language=None):
+        """
+        Returns True if the message is in any of the bundles for the passed
+        Accept-Language string, or if it is not passed, the locales used by
+        `format`.
+        """
+        return any(self.bundles[locale].has_message(message_id) for locale in self._chain(accept_language))
+
+    def format(self, message_id, args=None):
+        """
+        Formats the message using the locales activated for the current
+        context, or the default locale if none are activated. Returns a tuple
+        of (formatted message, errors list).
+        """
+        current = self._current.get()
+        if current is None:
+            table = self._default_table
+        else:
+            chain, generation, table = current
+            if generation != self._generation:
+                # A bundle was recompiled since `activate`
+                table = self._message_table_cached(chain, self._generation)
+        errors = []
+        return table[message_id](args, errors), errors
+
+    def format_for(self, accept_language, message_id, args=None):
+        """
+        Formats the message using the locales negotiated from the passed Accept-Language string.
+        """
+        errors = []
+        return self._message_table(accept_language)[message_id](args, errors), errors
+
+    def _chain(self, accept_language):
+        if accept_language is None:
+            current = self._current.get()
+            if current is None:
+                return (self.default_locale,)
+            return current[0]
+        return self.negotiate(accept_language)
+
+    def cache_info(self):
+        """
+        Returns statistics for the negotiation and message table caches
+        """
+        return {
+            "negotiate": self._negotiate_cached.cache_info(),
+            "message_tables": self._message_table_cached.cache_info(),
+        }
+
+
+def normalize_locale(locale):
+    """
+    Normalizes a locale string or babel.Locale to lower case BCP 47 form e.g. 'de-at'
+    """
+    return str(locale).replace("_", "-").lower()
+
+
+def parse_accept_language(accept_language):
+    """
+    Parses an Accept-Language string, returning a list of normalized locale
+    strings, most preferred first.
+    """
+    items = []
+    for index, part in enumerate(accept_language.split(",")):
+        tag, _, params = part.partition(";")
+        tag = tag.strip()
+        if not tag or tag == "*":
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if quality <= 0:
+            continue
+        items.append((-quality, index, normalize_locale(tag)))
+    return [tag for _, _, tag in sorted(items)]
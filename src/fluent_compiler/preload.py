@@ -0,0 +1,71 @@
+"""
+Preparing bundles before forking worker processes.
+
+Servers like gunicorn (with ``preload_app``) load the application once and
+then fork workers, which share the parent's memory pages until they are
+written to. Anything that is loaded lazily is loaded separately in each
+worker, and the garbage collector writes to the header of every object it
+examines, so without preparation most of the shared pages end up copied into
+every worker.
+"""
+
+import datetime
+import gc
+
+from .compiler import get_babel_locale
+from .locale_data import RUNTIME_LOCALE_DATA_KEYS
+from .types import fluent_date, fluent_number
+
+# Values formatted to fill the caches of number formatters and parsed date
+# patterns. Only default options are used, so formatters for other options,
+# such as currencies, are still created when first used.
+_SAMPLE_NUMBER = 1234.5
+_SAMPLE_DATE = datetime.datetime(2000, 1, 1, 12, 0, 0)
+
+
+def preload(bundles, freeze=True):
+    """
+    Loads everything that the FluentBundle objects in `bundles`, and their
+    fallbacks, would otherwise load the first time they are used, and then
+    moves all objects to the garbage collector's permanent generation using
+    `gc.freeze()`, so that forked processes can share them.
+
+    Only number and date formatters for default options are created in
+    advance, not those for options used by particular messages.
+
+    Call this as the last thing before forking, since objects created later are
+    not frozen. Pass `freeze=False` to only do the loading.
+    """
+    seen = set()
+    locales = []
+    stack = list(bundles)
+    while stack:
+        bundle = stack.pop()
+        if id(bundle) in seen:
+            continue
+        seen.add(id(bundle))
+        # Message functions from a catalog are loaded when first used.
+        bundle._compiled_messages.values()
+        locale = get_babel_locale(bundle.locale)
+        if locale not in locales:
+            locales.append(locale)
+        stack.extend(bundle._fallbacks or [])
+
+    for locale in locales:
+        _preload_locale(locale)
+
+    if freeze:
+        # Don't freeze garbage, which would never be freed.
+        gc.collect()
+        gc.freeze()
+
+
+def _preload_locale(locale):
+    # Babel loads locale data the first time it is used, and resolves
+    # aliases when items are looked up.
+    locale_data = locale._data
+    for key in RUNTIME_LOCALE_DATA_KEYS:
+        locale_data.get(key)
+    fluent_number(_SAMPLE_NUMBER).format(locale)
+    fluent_date(_SAMPLE_DATE.date()).format(locale)
+    fluent_date(_SAMPLE_DATE).format(locale)
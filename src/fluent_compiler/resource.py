@@ -1,5 +1,25 @@
+import bisect
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import attr
 
+# Files at least this size are decoded directly from a memory map, rather than
+# read into a bytes object first.
+MMAP_THRESHOLD = 1024 * 1024
+
+
+@attr.s(frozen=True)
+class FileMetadata:
+    """
+    Metadata about the file an FtlResource was loaded from
+    """
+
+    size = attr.ib()
+    mtime_ns = attr.ib()
+
 
 @attr.s
 class FtlResource:
@@ -9,12 +29,62 @@ class FtlResource:
 
     text = attr.ib()
     filename = attr.ib(default=None)
+    metadata = attr.ib(default=None, eq=False)
+    # Offsets of the start of each line of `text`, created when needed
+    _line_starts = attr.ib(default=None, init=False, eq=False, repr=False)
 
     @classmethod
     def from_string(cls, text):
         return cls(text)
 
+    def position(self, offset):
+        """
+        Returns the (row, column) of a character offset in the text, both
+        counting from 1.
+        """
+        if self._line_starts is None:
+            line_starts = [0]
+            index = self.text.find("\n")
+            while index != -1:
+                line_starts.append(index + 1)
+                index = self.text.find("\n", index + 1)
+            self._line_starts = line_starts
+        row = bisect.bisect_right(self._line_starts, offset)
+        return row, offset - self._line_starts[row - 1] + 1
+
     @classmethod
     def from_file(cls, filename, encoding="utf-8"):
         with open(filename, "rb") as f:
-            return cls(text=f.read().decode(encoding), filename=filename)
+            stat = os.fstat(f.fileno())
+            # (mmap can't map empty files)
+            if stat.st_size and stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    text = str(mapped, encoding)
+            else:
+                text = f.read().decode(encoding)
+        return cls(
+            text=text,
+            filename=filename,
+            metadata=FileMetadata(size=stat.st_size, mtime_ns=stat.st_mtime_ns),
+        )
+
+    @classmethod
+    def from_files(cls, filenames, encoding="utf-8", max_workers=None):
+        """
+        Returns a list of FtlResource objects for the filenames, reading the
+        files concurrently in a thread pool.
+        """
+        filenames = list(filenames)
+        if len(filenames) < 2:
+            return [cls.from_file(filename, encoding=encoding) for filename in filenames]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda filename: cls.from_file(filename, encoding=encoding), filenames))
+
+    @classmethod
+    def from_directory(cls, path, pattern="**/*.ftl", encoding="utf-8", max_workers=None):
+        """
+        Returns a list of FtlResource objects for the files in the directory
+        that match the glob pattern, sorted by path.
+        """
+        filenames = sorted(str(filename) for filename in Path(path).glob(pattern) if filename.is_file())
+        return cls.from_files(filenames, encoding=encoding, max_workers=max_workers)
@@ -2,15 +2,31 @@
 
 from datetime import date, datetime
 from decimal import Decimal
+from time import perf_counter_ns
+
+import attr
 
 from .errors import FluentCyclicReferenceError, FluentFormatError, FluentReferenceError
-from .types import FluentNone, FluentType, fluent_date, fluent_number
+from .types import (
+    FluentDate,
+    FluentDateTime,
+    FluentDateType,
+    FluentDecimal,
+    FluentFloat,
+    FluentInt,
+    FluentNone,
+    FluentNumber,
+    FluentType,
+    fluent_number,
+)
 
 __all__ = [
     "handle_argument_with_escaper",
     "handle_output_with_escaper",
     "handle_argument",
     "handle_output",
+    "check_argument_type",
+    "fluent_number",
     "FluentCyclicReferenceError",
     "FluentReferenceError",
     "FluentFormatError",
@@ -21,59 +37,175 @@ __all__ = [
 RETURN_TYPES = {
     "handle_argument": object,
     "handle_output": str,
+    "fluent_number": FluentNumber,
     "FluentReferenceError": FluentReferenceError,
     "FluentFormatError": FluentFormatError,
     "FluentNone": FluentNone,
 }
 
 
-def handle_argument_with_escaper(arg, name, output_type, locale, errors):
-    # This needs to be synced with resolver.handle_variable_reference
-    if isinstance(arg, output_type):
-        return arg
-    if isinstance(arg, str):
-        return arg
-    elif isinstance(arg, (int, float, Decimal)):
-        return fluent_number(arg)
-    elif isinstance(arg, (date, datetime)):
-        return fluent_date(arg)
-    errors.append(TypeError(f"Unsupported external type: {name}, {type(arg)}"))
-    return name
-
-
-def handle_argument(arg, name, locale, errors):
-    # handle_argument_with_escaper specialized to null escaper
-    # This needs to be synced with resolver.handle_variable_reference
-    if isinstance(arg, str):
-        return arg
-    elif isinstance(arg, (int, float, Decimal)):
-        return fluent_number(arg)
-    elif isinstance(arg, (date, datetime)):
-        return fluent_date(arg)
-    errors.append(TypeError(f"Unsupported external type: {name}, {type(arg)}"))
-    return name
-
-
-def handle_output_with_escaper(val, output_type, escaper_escape, locale, errors):
-    if isinstance(val, output_type):
-        return val
-    elif isinstance(val, str):
-        return escaper_escape(val)
-    elif isinstance(val, FluentType):
-        return escaper_escape(val.format(locale))
-    else:
-        # The only way for this branch to run is whem functions return
-        # objects of the wrong type.
-        raise TypeError(f"Cannot handle object {val} of type {type(val).__name__}")
-
-
-def handle_output(val, locale, errors):
-    # handle_output_with_escaper specialized to null_escaper
-    if isinstance(val, str):
-        return val
-    elif isinstance(val, FluentType):
-        return val.format(locale)
-    else:
-        # The only way for this branch to run is when functions return
-        # objects of the wrong type.
-        raise TypeError(f"Cannot handle object {val} of type {type(val).__name__}")
+# Default handlers for external arguments, keyed by type. Each handler converts an
+# argument to a str or FluentType, or is None for arguments that can be used
+# as they are. Handlers are found using the MRO of the argument type.
+DEFAULT_ARGUMENT_HANDLERS = {
+    str: None,
+    FluentNumber: None,
+    FluentDateType: None,
+    FluentNone: None,
+    int: FluentInt,
+    float: FluentFloat,
+    Decimal: FluentDecimal,
+    datetime: FluentDateTime.from_date_time,
+    date: FluentDate.from_date,
+}
+
+# Sentinel for unsupported argument types
+_UNSUPPORTED = object()
+
+
+def resolve_handler(handlers, cls, default):
+    for base in cls.__mro__:
+        if base in handlers:
+            return handlers[base]
+    return default
+
+
+def make_argument_handlers(handlers):
+    """
+    Returns a dictionary containing `handle_argument` and
+    `handle_argument_with_escaper` functions that use the passed dictionary of
+    argument handlers (see DEFAULT_ARGUMENT_HANDLERS).
+    """
+    # Cache of type(arg) -> handler
+    resolved = {}
+
+    def handle_argument(arg, name, locale, errors):
+        try:
+            handler = resolved[type(arg)]
+        except KeyError:
+            handler = resolved[type(arg)] = resolve_handler(handlers, type(arg), _UNSUPPORTED)
+        if handler is None:
+            return arg
+        if handler is _UNSUPPORTED:
+            errors.append(TypeError(f"Unsupported external type: {name}, {type(arg)}"))
+            return name
+        return handler(arg)
+
+    def handle_argument_with_escaper(arg, name, output_type, locale, errors):
+        if isinstance(arg, output_type):
+            return arg
+        return handle_argument(arg, name, locale, errors)
+
+    return {
+        "handle_argument": handle_argument,
+        "handle_argument_with_escaper": handle_argument_with_escaper,
+    }
+
+
+_default_argument_handlers = make_argument_handlers(DEFAULT_ARGUMENT_HANDLERS)
+handle_argument = _default_argument_handlers["handle_argument"]
+handle_argument_with_escaper = _default_argument_handlers["handle_argument_with_escaper"]
+
+
+def _unsupported_output(val, locale):
+    # The only way for this to be called is when functions return objects of
+    # the wrong type.
+    raise TypeError(f"Cannot handle object {val} of type {type(val).__name__}")
+
+
+# Default handlers for output values, keyed by type. Each handler takes the
+# value and the locale and returns a str, or is None for values that can be
+# output as they are. Handlers are found using the MRO of the value type.
+DEFAULT_OUTPUT_HANDLERS = {
+    str: None,
+    FluentType: lambda val, locale: val.format(locale),
+}
+
+
+def make_output_handlers(handlers):
+    """
+    Returns a dictionary containing `handle_output` and
+    `handle_output_with_escaper` functions that use the passed dictionary of
+    output handlers (see DEFAULT_OUTPUT_HANDLERS).
+    """
+    # Cache of type(val) -> handler
+    resolved = {}
+
+    def handle_output(val, locale, errors):
+        try:
+            handler = resolved[type(val)]
+        except KeyError:
+            handler = resolved[type(val)] = resolve_handler(handlers, type(val), _unsupported_output)
+        if handler is None:
+            return val
+        return handler(val, locale)
+
+    def handle_output_with_escaper(val, output_type, escaper_escape, locale, errors):
+        if isinstance(val, output_type):
+            return val
+        return escaper_escape(handle_output(val, locale, errors))
+
+    return {
+        "handle_output": handle_output,
+        "handle_output_with_escaper": handle_output_with_escaper,
+    }
+
+
+_default_output_handlers = make_output_handlers(DEFAULT_OUTPUT_HANDLERS)
+handle_output = _default_output_handlers["handle_output"]
+handle_output_with_escaper = _default_output_handlers["handle_output_with_escaper"]
+
+
+def check_argument_type(arg, name, expected_type, errors):
+    """
+    Called for arguments that don't have the type declared for them in
+    `argument_types`. Adds an error, and returns the argument converted to
+    the declared type, or the default value of the type if that fails.
+    """
+    errors.append(TypeError(f"Expected {expected_type.__name__} for argument {name}, got {type(arg).__name__}"))
+    try:
+        return expected_type(arg)
+    except (TypeError, ValueError):
+        return expected_type()
+
+
+@attr.s(frozen=True)
+class MessageCallStats:
+    calls = attr.ib()
+    # Number of errors added to the errors list during calls
+    errors = attr.ib()
+    # Total time spent in calls, in nanoseconds, or None if not measured
+    time_ns = attr.ib()
+
+
+class MessageStats:
+    """
+    Counters updated by instrumented message functions (see the `instrument`
+    option of `compile_messages`).
+    """
+
+    __slots__ = ["calls", "errors", "time_ns", "timing"]
+
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.reset()
+
+    def record(self, errors, errors_len, start=None):
+        # Called at the end of each message function call, with the errors
+        # list, its length at the start of the call, and the start time.
+        self.calls += 1
+        self.errors += len(errors) - errors_len
+        if start is not None:
+            self.time_ns += perf_counter_ns() - start
+
+    def snapshot(self):
+        return MessageCallStats(
+            calls=self.calls,
+            errors=self.errors,
+            time_ns=self.time_ns if self.timing else None,
+        )
+
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
+        self.time_ns = 0
@@ -5,7 +5,15 @@ from decimal import Decimal
 import attr
 import pytz
 from babel.dates import format_date, format_time, get_datetime_format, get_timezone
-from babel.numbers import NumberPattern, get_currency_name, get_currency_unit_pattern, parse_pattern
+from babel.numbers import (
+    NumberPattern,
+    get_currency_name,
+    get_currency_symbol,
+    get_currency_unit_pattern,
+    get_decimal_symbol,
+    get_group_symbol,
+    parse_pattern,
+)
 
 FORMAT_STYLE_DECIMAL = "decimal"
 FORMAT_STYLE_CURRENCY = "currency"
@@ -108,6 +116,13 @@ class FluentNumber(FluentType):
 
     def format(self, locale):
         if self.options.style == FORMAT_STYLE_DECIMAL:
+            if self.options == self.default_number_format_options:
+                # Fast path for the very common case of NUMBER with no options
+                formatter = get_decimal_formatter(locale)
+                if formatter is not None:
+                    retval = formatter.format(self)
+                    if retval is not None:
+                        return retval
             base_pattern = locale.decimal_formats.get(None)
             pattern = self._apply_options(base_pattern)
             return pattern.apply(self, locale)
@@ -116,12 +131,8 @@ class FluentNumber(FluentType):
             pattern = self._apply_options(base_pattern)
             return pattern.apply(self, locale)
         elif self.options.style == FORMAT_STYLE_CURRENCY:
-            if self.options.currencyDisplay == "name":
-                return self._format_currency_long_name(locale)
-            else:
-                base_pattern = locale.currency_formats["standard"]
-                pattern = self._apply_options(base_pattern)
-                return pattern.apply(self, locale, currency=self.options.currency, currency_digits=False)
+            formatter = get_currency_formatter(locale, self.options.currency, self.options.currencyDisplay)
+            return formatter.format(self)
 
     def _apply_options(self, pattern):
         # We are essentially trying to copy the
@@ -134,17 +145,13 @@ class FluentNumber(FluentType):
         # do the right thing. The NumberPattern.pattern string then becomes
         # incorrect, but it is not used when formatting, it is only used
         # initially to set the other attributes.
+        if self._has_default_pattern_options():
+            # Nothing to change, and NumberPattern.apply doesn't mutate the
+            # pattern, so we can skip the clone.
+            return pattern
         pattern = clone_pattern(pattern)
         if not self.options.useGrouping:
             pattern.grouping = _UNGROUPED_PATTERN.grouping
-        if self.options.style == FORMAT_STYLE_CURRENCY and self.options.currencyDisplay == CURRENCY_DISPLAY_CODE:
-            # Not sure of the correct algorithm here, but this seems to
-            # work:
-            def replacer(s):
-                return s.replace("¤", "¤¤")
-
-            pattern.suffix = (replacer(pattern.suffix[0]), replacer(pattern.suffix[1]))
-            pattern.prefix = (replacer(pattern.prefix[0]), replacer(pattern.prefix[1]))
         if self.options.minimumSignificantDigits is not None or self.options.maximumSignificantDigits is not None:
             # This triggers babel routines into 'significant digits' mode:
             pattern.pattern = "@"
@@ -173,24 +180,16 @@ class FluentNumber(FluentType):
 
         return pattern
 
-    def _format_currency_long_name(self, locale):
-        # This reproduces some of bable.numbers._format_currency_long_name
-        # Step 3.
-        unit_pattern = get_currency_unit_pattern(self.options.currency, count=self, locale=locale)
-
-        # Step 4.
-        display_name = get_currency_name(self.options.currency, count=self, locale=locale)
-
-        # Step 5.
-        base_pattern = locale.decimal_formats.get(None)
-        pattern = self._apply_options(base_pattern)
-
-        number_part = pattern.apply(
-            self,
-            locale,
-            currency=self.options.currency,
+    def _has_default_pattern_options(self):
+        options = self.options
+        return (
+            options.useGrouping
+            and options.minimumIntegerDigits is None
+            and options.minimumFractionDigits is None
+            and options.maximumFractionDigits is None
+            and options.minimumSignificantDigits is None
+            and options.maximumSignificantDigits is None
         )
-        return unit_pattern.format(number_part, display_name)
 
 
 def merge_options(options_class, base, kwargs):
@@ -292,6 +291,200 @@ def clone_pattern(pattern):
     )
 
 
+class DecimalFormatter:
+    """
+    Formatter for the default decimal pattern of a locale, that produces the
+    same output as `NumberPattern.apply` for ints and floats, but using only
+    string operations on precomputed locale data.
+    """
+
+    def __init__(self, pattern, group_symbol, decimal_symbol):
+        # The negative prefix/suffix contain the minus sign that babel uses.
+        self.prefix = pattern.prefix
+        self.suffix = pattern.suffix
+        self.primary_grouping, self.secondary_grouping = pattern.grouping
+        self.min_integer_digits = pattern.int_prec[0]
+        self.min_fraction_digits, self.max_fraction_digits = pattern.frac_prec
+        self.group_symbol = group_symbol
+        self.decimal_symbol = decimal_symbol
+
+    @classmethod
+    def for_locale(cls, locale):
+        """
+        Returns a DecimalFormatter for the locale, or None if the locale's
+        decimal pattern uses features that are not supported.
+        """
+        pattern = locale.decimal_formats.get(None)
+        if (
+            pattern.scale != 0
+            or pattern.exp_prec is not None
+            or "@" in pattern.pattern
+            or any("'" in affix or "¤" in affix for affix in pattern.prefix + pattern.suffix)
+        ):
+            return None
+        return cls(pattern, get_group_symbol(locale), get_decimal_symbol(locale))
+
+    def format(self, number):
+        """
+        Returns the formatted number, or None if it should be formatted by babel instead.
+        """
+        if isinstance(number, int):
+            return self.format_int(number)
+        if isinstance(number, float):
+            return self.format_float(number)
+        return None
+
+    def format_int(self, number):
+        is_negative = number < 0
+        return "".join(
+            (
+                self.prefix[is_negative],
+                self._group(abs(number)),
+                self.suffix[is_negative],
+            )
+        )
+
+    def format_float(self, number):
+        text = float.__repr__(number)
+        if "e" in text or "n" in text:
+            # Exponent notation, 'inf' or 'nan'
+            return None
+        is_negative = text[0] == "-"
+        if is_negative:
+            text = text[1:]
+        integer_part, _, fraction_part = text.partition(".")
+        max_digits = self.max_fraction_digits
+        if len(fraction_part) > max_digits:
+            integer_part, fraction_part = _round_half_even(integer_part, fraction_part, max_digits)
+
+        min_digits = self.min_fraction_digits
+        fraction_part = fraction_part.ljust(min_digits, "0")
+        if max_digits == 0 or (min_digits == 0 and not fraction_part.strip("0")):
+            fraction = ""
+        else:
+            fraction = self.decimal_symbol + fraction_part[:min_digits] + fraction_part[min_digits:].rstrip("0")
+        return "".join(
+            (
+                self.prefix[is_negative],
+                self._group(int(integer_part)),
+                fraction,
+                self.suffix[is_negative],
+            )
+        )
+
+    def _group(self, number):
+        # Equivalent to NumberPattern._format_int, for a non-negative int.
+        if self.primary_grouping == self.secondary_grouping == 3 and self.min_integer_digits <= 1:
+            # Most common case, which Python can do for us.
+            return format(number, ",").replace(",", self.group_symbol)
+        digits = str(number).rjust(self.min_integer_digits, "0")
+        group_size = self.primary_grouping
+        groups = []
+        while len(digits) > group_size:
+            groups.append(digits[-group_size:])
+            digits = digits[:-group_size]
+            group_size = self.secondary_grouping
+        groups.append(digits)
+        return self.group_symbol.join(reversed(groups))
+
+
+def _round_half_even(integer_part, fraction_part, digits):
+    """
+    Round the decimal number given as integer and fraction digit strings to
+    `digits` fractional digits, in the same way as the default decimal context
+    does, returning new integer and fraction digit strings.
+    """
+    kept = integer_part + fraction_part[:digits]
+    discarded = fraction_part[digits:].rstrip("0")
+    if discarded and (discarded > "5" or (discarded == "5" and kept[-1] in "13579")):
+        kept = str(int(kept) + 1).rjust(len(kept), "0")
+    if digits == 0:
+        return kept, ""
+    return kept[:-digits] or "0", kept[-digits:]
+
+
+class CurrencyFormatter:
+    """
+    Formatter for a currency in a locale, for a given `currencyDisplay`
+    option, which caches the locale data needed so that it doesn't need
+    to be looked up every time.
+    """
+
+    def __init__(self, locale, currency, currency_display):
+        self.locale = locale
+        self.currency = currency
+        self.currency_display = currency_display
+        if currency_display == CURRENCY_DISPLAY_NAME:
+            self.pattern = locale.decimal_formats.get(None)
+            self.plural_form = locale.plural_form
+            # Plural category -> (unit pattern, currency name), filled lazily
+            self.long_names = {}
+        else:
+            self.pattern = clone_pattern(locale.currency_formats["standard"])
+            if currency_display == CURRENCY_DISPLAY_CODE:
+                # Same as NumberPattern.apply does for '¤¤'
+                currency_sign = currency.upper()
+            else:
+                currency_sign = get_currency_symbol(currency, locale)
+
+            # Do the substitution that NumberPattern.apply would do, in advance.
+            def replacer(s):
+                return s.replace("¤", currency_sign)
+
+            self.pattern.prefix = tuple(replacer(p) for p in self.pattern.prefix)
+            self.pattern.suffix = tuple(replacer(s) for s in self.pattern.suffix)
+
+    def format(self, number):
+        pattern = number._apply_options(self.pattern)
+        if self.currency_display == CURRENCY_DISPLAY_NAME:
+            return self._format_long_name(number, pattern)
+        return pattern.apply(number, self.locale, currency=self.currency, currency_digits=False)
+
+    def _format_long_name(self, number, pattern):
+        # This reproduces some of babel.numbers._format_currency_long_name
+        # The unit pattern and name depend only on the plural category of the number.
+        plural_category = self.plural_form(number)
+        try:
+            unit_pattern, display_name = self.long_names[plural_category]
+        except KeyError:
+            # Step 3.
+            unit_pattern = get_currency_unit_pattern(self.currency, count=number, locale=self.locale)
+            # Step 4.
+            display_name = get_currency_name(self.currency, count=number, locale=self.locale)
+            self.long_names[plural_category] = unit_pattern, display_name
+
+        # Step 5.
+        number_part = pattern.apply(number, self.locale, currency=self.currency)
+        return unit_pattern.format(number_part, display_name)
+
+
+_DECIMAL_FORMATTERS = {}
+_CURRENCY_FORMATTERS = {}
+
+
+def get_decimal_formatter(locale):
+    """
+    Returns the (cached) DecimalFormatter for a locale, or None if not available.
+    """
+    try:
+        return _DECIMAL_FORMATTERS[locale]
+    except KeyError:
+        formatter = _DECIMAL_FORMATTERS[locale] = DecimalFormatter.for_locale(locale)
+        return formatter
+
+
+def get_currency_formatter(locale, currency, currency_display):
+    """
+    Returns the (cached) CurrencyFormatter for a locale, currency and `currencyDisplay` option.
+    """
+    key = (locale, currency, currency_display)
+    try:
+        return _CURRENCY_FORMATTERS[key]
+    except KeyError:
+        formatter = _CURRENCY_FORMATTERS[key] = CurrencyFormatter(locale, currency, currency_display)
+        return formatter
+
+
 @attr.s
 class DateFormatOptions:
     # Parameters.
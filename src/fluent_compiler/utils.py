@@ -182,14 +182,6 @@ def sanitize_function_args(arg_spec, name, errors):
     return (positional_args, cleaned_kwargs)
 
 
-def span_to_position(span, source_text):
-    start = span.start
-    relevant = source_text[0:start]
-    row = relevant.count("\n") + 1
-    col = len(relevant) - relevant.rfind("\n")
-    return row, col
-
-
 def display_location(filename, position):
     row, col = position
     return f"{filename if filename else '<string>'}:{row}:{col}"
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import attr
+
+from .resource import FtlResource
+
+# Default number of seconds between checks for changed files.
+DEFAULT_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class ReloadEvent:
+    bundle = attr.ib()
+    # Filenames that changed. Empty if the bundle was recompiled because one of
+    # its fallbacks was reloaded.
+    filenames = attr.ib()
+    # Seconds taken to recompile the bundle
+    compile_time = attr.ib()
+    # Seconds from the most recent modification of the files to the new
+    # messages being used.
+    latency = attr.ib()
+
+
+class BundleWatcher:
+    """
+    Watches the FTL files used by a number of FluentBundle objects, and
+    recompiles bundles when their files change.
+
+    Files are polled, checking modification time and size, and then a hash of
+    the contents, so no file system notification library is needed.
+    """
+
+    def __init__(self, bundles, interval=DEFAULT_INTERVAL, on_reload=None):
+        # Bundles that weren't made from resources, e.g. loaded from a
+        # catalog, can't be recompiled, so are ignored.
+        self.bundles = [bundle for bundle in bundles if bundle._resources is not None]
+        self.interval = interval
+        self.on_reload = on_reload
+        self.last_reload = None
+        self._files = {}
+        for bundle in self.bundles:
+            self._snapshot(bundle)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _snapshot(self, bundle):
+        # Record the state of the files for a bundle, keyed on the resources list
+        # so that we notice if the bundle was recompiled with other resources.
+        self._files[id(bundle)] = (
+            bundle._resources,
+            [_FileState.for_resource(resource) for resource in bundle._resources],
+        )
+
+    def check(self):
+        """
+        Checks for changed files once, recompiling bundles as needed. Returns
+        a list of ReloadEvent objects for the bundles that were recompiled.
+        """
+        return self._check(log_errors=False)
+
+    def _check(self, log_errors):
+        # If `log_errors` is True, exceptions from reloading a bundle or from
+        # `on_reload` are logged, and the other bundles are still checked.
+        def handle_error(message, bundle):
+            if not log_errors:
+                raise
+            logger.exception(message, bundle.locale)
+
+        with self._lock:
+            events = []
+            reloaded = set()
+            for bundle in self.bundles:
+                try:
+                    event = self._check_bundle(bundle)
+                except Exception:
+                    handle_error("Error reloading bundle for %s", bundle)
+                    continue
+                if event is not None:
+                    events.append(event)
+                    reloaded.add(id(bundle))
+
+            # Bundles that use reloaded bundles as fallbacks need recompiling to
+            # pick up the changes.
+            while True:
+                dependents = [
+                    bundle
+                    for bundle in self.bundles
+                    if id(bundle) not in reloaded
+                    and any(id(fallback) in reloaded for fallback in bundle._fallbacks or [])
+                ]
+                if not dependents:
+                    break
+                for bundle in dependents:
+                    # Even if it fails, so that it isn't tried again.
+                    reloaded.add(id(bundle))
+                    start = time.time()
+                    try:
+                        bundle.recompile()
+                    except Exception:
+                        handle_error("Error recompiling bundle for %s", bundle)
+                        continue
+                    end = time.time()
+                    events.append(ReloadEvent(bundle=bundle, filenames=[], compile_time=end - start, latency=0.0))
+
+        for event in events:
+            self.last_reload = event
+            if self.on_reload is not None:
+                try:
+                    self.on_reload(event)
+                except Exception:
+                    handle_error("Error in on_reload callback for bundle for %s", event.bundle)
+        return events
+
+    def _check_bundle(self, bundle):
+        resources, states = self._files[id(bundle)]
+        if resources is not bundle._resources:
+            self._snapshot(bundle)
+            return None
+
+        new_resources = []
+        new_states = []
+        changed = []
+        for resource, state in zip(resources, states):
+            if state is None:
+                new_resources.append(resource)
+                new_states.append(state)
+                continue
+            try:
+                new_state, new_resource = state.reread_if_changed()
+            except OSError:
+                # Probably in the middle of being saved, try again next time.
+                return None
+            if new_resource is None:
+                new_resources.append(resource)
+            else:
+                new_resources.append(new_resource)
+                changed.append(new_state)
+            new_states.append(new_state)
+
+        if not changed:
+            # Save the new modification times of files that were touched, so
+            # that they aren't read again next time.
+            self._files[id(bundle)] = (resources, new_states)
+            return None
+        start = time.time()
+        bundle.recompile(new_resources)
+        end = time.time()
+        self._files[id(bundle)] = (new_resources, new_states)
+        return ReloadEvent(
+            bundle=bundle,
+            filenames=[state.filename for state in changed],
+            compile_time=end - start,
+            latency=max(0.0, end - max(state.mtime_ns for state in changed) / 1e9),
+        )
+
+    def start(self):
+        """
+        Starts checking for changes in a background thread, every `interval` seconds.
+        """
+        if self._thread is not None:
+            raise RuntimeError("BundleWatcher is already started")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="BundleWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread started by `start`.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._check(log_errors=True)
+            except Exception:
+                # Keep watching, the problem may be fixed by the next change.
+                logger.exception("Error checking for changed files")
+
+
+@attr.s(frozen=True)
+class _FileState:
+    filename = attr.ib()
+    mtime_ns = attr.ib()
+    size = attr.ib()
+    digest = attr.ib()
+
+    @classmethod
+    def for_resource(cls, resource):
+        if resource.filename is None:
+            return None
+        if resource.metadata is not None:
+            # Use the metadata from when the file was read, so that we can't
+            # miss changes made since then.
+            mtime_ns, size = resource.metadata.mtime_ns, resource.metadata.size
+        else:
+            try:
+                stat = os.stat(resource.filename)
+            except OSError:
+                return None
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+        return cls(
+            filename=resource.filename,
+            mtime_ns=mtime_ns,
+            size=size,
+            digest=_digest(resource.text),
+        )
+
+    def reread_if_changed(self):
+        """
+        Returns a tuple of (new state, new FtlResource). The resource is None if
+        the contents are unchanged.
+        """
+        stat = os.stat(self.filename)
+        if stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size:
+            return self, None
+        resource = FtlResource.from_file(self.filename)
+        new_state = _FileState.for_resource(resource)
+        if new_state.digest == self.digest:
+            # Touched, but not changed
+            return new_state, None
+        return new_state, resource
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
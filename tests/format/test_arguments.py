@@ -2,6 +2,7 @@ import unittest
 
 from fluent_compiler.bundle import FluentBundle
 from fluent_compiler.errors import FluentReferenceError
+from fluent_compiler.types import fluent_number
 
 from ..utils import dedent_ftl
 
@@ -84,3 +85,153 @@ class TestMissing(unittest.TestCase):
         val, errs = self.bundle.format("foo")
         self.assertEqual(val, "arg")
         self.assertEqual(errs, [FluentReferenceError("<string>:2:9: Unknown external: arg")])
+
+
+class Money:
+    def __init__(self, amount, currency):
+        self.amount = amount
+        self.currency = currency
+
+
+class LazyString:
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return self.func()
+
+
+class SpecialLazyString(LazyString):
+    pass
+
+
+class TestArgumentHandlers(unittest.TestCase):
+    def setUp(self):
+        self.bundle = FluentBundle.from_string(
+            "en-US",
+            dedent_ftl(
+                """
+            price = Price: { $price }
+            greeting = Hello, { $name }
+            count = { $count ->
+                [one] One
+               *[other] Many
+             }
+        """
+            ),
+            use_isolating=False,
+            argument_handlers={
+                Money: lambda m: fluent_number(m.amount, style="currency", currency=m.currency),
+                LazyString: str,
+            },
+        )
+
+    def test_custom_type(self):
+        self.assertEqual(self.bundle.format("price", {"price": Money(1234.5, "USD")}), ("Price: $1,234.50", []))
+
+    def test_subclass(self):
+        val, errs = self.bundle.format("greeting", {"name": SpecialLazyString(lambda: "Jane")})
+        self.assertEqual(val, "Hello, Jane")
+        self.assertEqual(errs, [])
+
+    def test_builtin_types_still_handled(self):
+        self.assertEqual(self.bundle.format("greeting", {"name": "Jane"}), ("Hello, Jane", []))
+        self.assertEqual(self.bundle.format("count", {"count": 1}), ("One", []))
+        self.assertEqual(self.bundle.format("price", {"price": 1234.5}), ("Price: 1,234.5", []))
+
+    def test_unsupported_type(self):
+        for bundle in [self.bundle, FluentBundle.from_string("en-US", "greeting = Hello, { $name }")]:
+            val, errs = bundle.format("greeting", {"name": object()})
+            self.assertIn("name", val)
+            self.assertEqual(len(errs), 1)
+            self.assertEqual(type(errs[0]), TypeError)
+
+    def test_not_shared_with_other_bundles(self):
+        bundle = FluentBundle.from_string("en-US", "greeting = Hello, { $name }", use_isolating=False)
+        val, errs = bundle.format("greeting", {"name": LazyString(lambda: "Jane")})
+        self.assertEqual(val, "Hello, name")
+        self.assertEqual(len(errs), 1)
+
+
+class TestArgumentTypes(unittest.TestCase):
+    def setUp(self):
+        self.bundle = FluentBundle.from_string(
+            "en-US",
+            dedent_ftl(
+                """
+            greeting = Hello, { $name }
+            items = { $count ->
+                [0] No items
+                [one] One item
+               *[other] { $count } items
+             }
+            kind = { $kind ->
+                [one] Kind one
+               *[other] Other
+             }
+            label = { $name }
+                .title = Title { $name }
+        """
+            ),
+            use_isolating=False,
+            argument_types={
+                "name": str,
+                "count": int,
+                "kind": str,
+                "label": {"name": int},
+            },
+        )
+
+    def test_str(self):
+        self.assertEqual(self.bundle.format("greeting", {"name": "Jane"}), ("Hello, Jane", []))
+
+    def test_int(self):
+        self.assertEqual(self.bundle.format("items", {"count": 0}), ("No items", []))
+        self.assertEqual(self.bundle.format("items", {"count": 1}), ("One item", []))
+        self.assertEqual(self.bundle.format("items", {"count": 1234}), ("1,234 items", []))
+
+    def test_int_subclass(self):
+        self.assertEqual(
+            self.bundle.format("items", {"count": fluent_number(1234, useGrouping=False)}), ("1234 items", [])
+        )
+
+    def test_str_selector_not_plural_category(self):
+        self.assertEqual(self.bundle.format("kind", {"kind": "one"}), ("Kind one", []))
+        self.assertEqual(self.bundle.format("kind", {"kind": "two"}), ("Other", []))
+
+    def test_per_message(self):
+        self.assertEqual(self.bundle.format("label", {"name": 1234}), ("1,234", []))
+        self.assertEqual(self.bundle.format("label.title", {"name": 1234}), ("Title 1,234", []))
+
+    def test_wrong_type(self):
+        val, errs = self.bundle.format("greeting", {"name": 123})
+        self.assertEqual(val, "Hello, 123")
+        self.assertEqual(len(errs), 1)
+        self.assertEqual(type(errs[0]), TypeError)
+        self.assertEqual(errs[0].args[0], "Expected str for argument name, got int")
+
+        val, errs = self.bundle.format("items", {"count": "1"})
+        self.assertEqual(val, "One item")
+        self.assertEqual(len(errs), 1)
+        self.assertEqual(type(errs[0]), TypeError)
+        self.assertEqual(errs[0].args[0], "Expected int for argument count, got str")
+
+    def test_wrong_type_not_convertible(self):
+        val, errs = self.bundle.format("items", {"count": "many"})
+        self.assertEqual(val, "No items")
+        self.assertEqual(len(errs), 1)
+        self.assertEqual(type(errs[0]), TypeError)
+        self.assertEqual(errs[0].args[0], "Expected int for argument count, got str")
+
+    def test_missing(self):
+        val, errs = self.bundle.format("greeting", {})
+        self.assertEqual(val, "Hello, name")
+        self.assertEqual(errs, [FluentReferenceError("<string>:2:21: Unknown external: name")])
+
+        val, errs = self.bundle.format("items", {})
+        self.assertEqual(val, "count items")
+        self.assertEqual(errs, [FluentReferenceError("<string>:3:11: Unknown external: count")])
+
+    def test_unsupported_declared_type(self):
+        with self.assertRaises(ValueError):
+            FluentBundle.from_string("en-US", "foo = { $arg }", argument_types={"arg": float})
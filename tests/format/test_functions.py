@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from fluent_compiler.bundle import FluentBundle
@@ -266,3 +267,61 @@ class TestKeywordArgs(unittest.TestCase):
         val, errs = self.bundle.format("pass-user-arg", {})
         self.assertEqual(self.args_passed, [(FluentNone("arg"), None, "default")])
         self.assertEqual(len(errs), 1)
+
+
+class Money:
+    def __init__(self, amount, currency):
+        self.amount = amount
+        self.currency = currency
+
+
+class SpecialMoney(Money):
+    pass
+
+
+def MONEY(amount, currency="USD"):
+    return Money(amount, currency)
+
+
+def SPECIAL_MONEY(amount):
+    return SpecialMoney(amount, "EUR")
+
+
+def format_money(money, locale):
+    return fluent_number(money.amount, style="currency", currency=money.currency).format(locale)
+
+
+class TestOutputHandlers(unittest.TestCase):
+    def setUp(self):
+        self.ftl = dedent_ftl(
+            """
+            price         = Price: { MONEY(1234.5) }
+            special-price = { SPECIAL_MONEY(2) }
+        """
+        )
+        self.bundle = FluentBundle.from_string(
+            "en-US",
+            self.ftl,
+            use_isolating=False,
+            functions={"MONEY": MONEY, "SPECIAL_MONEY": SPECIAL_MONEY},
+            output_handlers={Money: format_money},
+        )
+
+    def test_custom_type(self):
+        self.assertEqual(self.bundle.format("price"), ("Price: $1,234.50", []))
+
+    def test_subclass(self):
+        self.assertEqual(self.bundle.format("special-price"), ("€2.00", []))
+
+    def test_not_shared_with_other_bundles(self):
+        bundle = FluentBundle.from_string(
+            "en-US", self.ftl, use_isolating=False, functions={"MONEY": MONEY, "SPECIAL_MONEY": SPECIAL_MONEY}
+        )
+        self.bundle.format("price")
+        with self.assertRaises(TypeError) as cm:
+            bundle.format("price")
+        self.assertIn("Money", cm.exception.args[0])
+
+    def test_pickle(self):
+        unpickled = pickle.loads(pickle.dumps(self.bundle))
+        self.assertEqual(unpickled.format("price"), ("Price: $1,234.50", []))
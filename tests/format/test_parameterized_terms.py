@@ -307,3 +307,44 @@ class TestMessagesCalledFromTerms(unittest.TestCase):
         val, errs = self.bundle.format("ref-foo", {"arg": 2})
         self.assertEqual(val, "Msg is 1")
         self.assertEqual(errs, [])
+
+
+class TestTermHelperFunctions(unittest.TestCase):
+    # Terms compiled to shared helper functions, instead of being inlined,
+    # should behave the same.
+    def setUp(self):
+        self.bundle = FluentBundle.from_string(
+            "en-US",
+            dedent_ftl(
+                """
+            msg = Msg is {$arg}
+            -thing = { $article ->
+                  *[definite]    the { -other } { msg }
+                   [indefinite]  a { -other } { msg }
+                 }
+            -other = { -missing } thing
+
+            definite = { -thing(arg: 1) }
+            indefinite = { -thing(article: "indefinite", arg: 2) }
+            indefinite-again = { -thing(arg: 2, article: "indefinite") }
+        """
+            ),
+            use_isolating=False,
+            term_inline_threshold=0,
+        )
+
+    def test_with_arguments(self):
+        val, errs = self.bundle.format("definite", {"arg": 3})
+        self.assertEqual(val, "the -missing thing Msg is 1")
+        self.assertEqual(errs, [FluentReferenceError("<string>:7:12: Unknown term: -missing")])
+
+    def test_shared_function(self):
+        self.assertEqual(self.bundle.format("indefinite", {}), self.bundle.format("indefinite-again", {}))
+        val, errs = self.bundle.format("indefinite", {})
+        self.assertEqual(val, "a -missing thing Msg is 2")
+
+    def test_compilation_errors_for_every_message(self):
+        self.assertEqual(
+            [message_id for message_id, error in self.bundle.check_messages()],
+            ["definite", "indefinite", "indefinite-again"],
+        )
@@ -1,8 +1,20 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
 import traceback
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+from markupsafe import Markup, escape
 
 from fluent_compiler.bundle import FluentBundle, FtlResource
+from fluent_compiler.compiler import compile_messages
 from fluent_compiler.errors import FluentDuplicateMessageId, FluentJunkFound, FluentReferenceError
+from fluent_compiler.runtime import MessageCallStats
 from fluent_compiler.types import FluentNumber
 
 from .utils import dedent_ftl
@@ -50,6 +62,24 @@ class TestFluentBundle(unittest.TestCase):
         self.assertFalse(bundle.has_message("foo.attr"))
         self.assertFalse(bundle.has_message("foo.other-attribute"))
 
+    def test_include(self):
+        bundle = FluentBundle.from_string(
+            "en-US",
+            dedent_ftl(
+                """
+            foo = Foo { bar }
+            bar = Bar
+            baz = Baz
+        """
+            ),
+            use_isolating=False,
+            include=["foo"],
+        )
+
+        self.assertEqual(bundle.format("foo"), ("Foo Bar", []))
+        self.assertTrue(bundle.has_message("bar"))
+        self.assertFalse(bundle.has_message("baz"))
+
     def test_format_args(self):
         bundle = FluentBundle.from_string("en-US", "foo = Foo")
         val, errs = bundle.format("foo")
@@ -187,3 +217,289 @@ class TestFluentBundle(unittest.TestCase):
                 )
             else:
                 self.fail("Expected ZeroDivisionError")
+
+    def test_positional_options(self):
+        bundle = FluentBundle("en-US", [FtlResource("foo = { UPPER($x) }")], {"UPPER": upper}, False)
+        self.assertEqual(bundle.format("foo", {"x": "a"}), ("A", []))
+
+    def test_unknown_option(self):
+        self.assertRaises(TypeError, FluentBundle.from_string, "en-US", "foo = Foo", unknown=True)
+        compiled_ftl = compile_messages("en-US", [FtlResource("foo = Foo")])
+        self.assertRaises(TypeError, FluentBundle.from_compiled_ftl, compiled_ftl, unknown=True)
+
+
+class TestFluentBundleFallbacks(unittest.TestCase):
+    def setUp(self):
+        self.en = FluentBundle.from_string(
+            "en",
+            dedent_ftl(
+                """
+            greeting = Hello
+            only-en = English only
+        """
+            ),
+        )
+        self.de = FluentBundle.from_string(
+            "de",
+            dedent_ftl(
+                """
+            greeting = Hallo
+            items = { $count ->
+                [one] Ein Element
+               *[other] { $count } Elemente
+             }
+            title = Titel
+                .tooltip = Tooltip
+        """
+            ),
+            use_isolating=False,
+            fallbacks=[self.en],
+        )
+        self.de_at = FluentBundle.from_string(
+            "de-AT",
+            dedent_ftl(
+                """
+            greeting = Servus
+            summary = { greeting }: { items } ({ only-en })
+            tooltip = { title.tooltip }
+        """
+            ),
+            use_isolating=False,
+            fallbacks=[self.de, self.en],
+        )
+
+    def test_fallback_reference(self):
+        val, errs = self.de_at.format("summary", {"count": 1000})
+        self.assertEqual(val, "Servus: 1.000 Elemente (English only)")
+        self.assertEqual(errs, [])
+        self.assertEqual(self.de_at.check_messages(), [])
+
+    def test_fallback_attribute_reference(self):
+        self.assertEqual(self.de_at.format("tooltip"), ("Tooltip", []))
+
+    def test_fallback_top_level(self):
+        self.assertTrue(self.de_at.has_message("items"))
+        self.assertTrue(self.de_at.has_message("only-en"))
+        self.assertEqual(self.de_at.format("items", {"count": 1}), ("Ein Element", []))
+        self.assertEqual(self.de_at.format("title.tooltip"), ("Tooltip", []))
+        self.assertEqual(self.de_at.format("greeting"), ("Servus", []))
+
+    def test_missing_everywhere(self):
+        bundle = FluentBundle.from_string("de-AT", "foo = { bar }", fallbacks=[self.de])
+        val, errs = bundle.format("foo")
+        self.assertEqual(val, "bar")
+        self.assertEqual(len(errs), 1)
+        self.assertEqual(type(errs[0]), FluentReferenceError)
+
+
+class TestFluentBundleRecompile(unittest.TestCase):
+    def test_recompile(self):
+        bundle = FluentBundle.from_string("en", "foo = Foo")
+        bundle.recompile([FtlResource("foo = New Foo\nbar = { baz }")])
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+        self.assertEqual(len(bundle.check_messages()), 1)
+        # Same resources again
+        bundle.recompile()
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+
+    def test_recompile_from_compiled_ftl(self):
+        bundle = FluentBundle.from_compiled_ftl(compile_messages("en", [FtlResource("foo = Foo")]))
+        self.assertEqual(bundle.format("foo"), ("Foo", []))
+        self.assertRaises(ValueError, bundle.recompile)
+        bundle.recompile([FtlResource("foo = New Foo")])
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+
+    def test_recompile_picks_up_fallback_changes(self):
+        en = FluentBundle.from_string("en", "foo = Foo")
+        de = FluentBundle.from_string("de", "bar = { foo }", fallbacks=[en])
+        en.recompile([FtlResource("foo = New Foo")])
+        de.recompile()
+        self.assertEqual(de.format("bar"), ("New Foo", []))
+
+    def test_recompile_async(self):
+        bundle = FluentBundle.from_string("en", "foo = Foo")
+        compiling = threading.Event()
+        finish = threading.Event()
+
+        def slow_compile_messages(*args, **kwargs):
+            compiling.set()
+            finish.wait()
+            return compile_messages(*args, **kwargs)
+
+        async def main():
+            with mock.patch("fluent_compiler.compiler.compile_messages", side_effect=slow_compile_messages):
+                task = asyncio.create_task(bundle.recompile_async([FtlResource("foo = New Foo")]))
+                await asyncio.get_running_loop().run_in_executor(None, compiling.wait)
+                # The event loop is not blocked, and the old messages are still used
+                self.assertEqual(bundle.format("foo"), ("Foo", []))
+                finish.set()
+                await task
+            self.assertEqual(bundle.format("foo"), ("New Foo", []))
+
+        asyncio.run(main())
+
+
+class TestFluentBundleStats(unittest.TestCase):
+    def setUp(self):
+        self.ftl = dedent_ftl(
+            """
+            foo = Foo { $arg }
+                .title = Title
+            bar = { foo } { missing }
+        """
+        )
+
+    def test_counts(self):
+        bundle = FluentBundle.from_string("en", self.ftl, instrument=True)
+        bundle.format("foo", {"arg": 1})
+        bundle.format("foo")
+        bundle.format("bar", {"arg": 1})
+        stats = bundle.stats()
+        self.assertEqual(stats["foo"], MessageCallStats(calls=3, errors=1, time_ns=None))
+        # Errors from messages that are called are included
+        self.assertEqual(stats["bar"], MessageCallStats(calls=1, errors=1, time_ns=None))
+        self.assertEqual(stats["foo.title"], MessageCallStats(calls=0, errors=0, time_ns=None))
+
+    def test_timing(self):
+        bundle = FluentBundle.from_string("en", self.ftl, instrument="timing")
+        bundle.format("foo", {"arg": 1})
+        stats = bundle.stats()
+        self.assertEqual(stats["foo"].calls, 1)
+        self.assertGreater(stats["foo"].time_ns, 0)
+        self.assertEqual(stats["bar"].time_ns, 0)
+
+    def test_reset(self):
+        bundle = FluentBundle.from_string("en", self.ftl, instrument=True)
+        bundle.format("foo", {"arg": 1})
+        self.assertEqual(bundle.stats(reset=True)["foo"].calls, 1)
+        self.assertEqual(bundle.stats()["foo"].calls, 0)
+
+    def test_not_instrumented(self):
+        bundle = FluentBundle.from_string("en", self.ftl)
+        with self.assertRaises(ValueError):
+            bundle.stats()
+
+
+class TestFluentBundleFromDirectory(unittest.TestCase):
+    def test_from_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "sub"))
+            for name, text in [("main.ftl", "foo = Foo"), ("sub/other.ftl", "bar = Bar"), ("notes.txt", "baz = Baz")]:
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write(text)
+            bundle = FluentBundle.from_directory("en", tmp_dir)
+        self.assertEqual(bundle.format("foo"), ("Foo", []))
+        self.assertEqual(bundle.format("bar"), ("Bar", []))
+        self.assertFalse(bundle.has_message("baz"))
+
+
+def upper(text):
+    return text.upper()
+
+
+class HtmlEscaper:
+    name = "html"
+    output_type = Markup
+    use_isolating = False
+
+    def select(self, message_id=None, **hints):
+        return message_id.endswith("-html")
+
+    def mark_escaped(self, escaped):
+        return Markup(escaped)
+
+    def escape(self, unescaped):
+        return escape(unescaped)
+
+    def join(self, parts):
+        return Markup("").join(parts)
+
+
+def format_message(bundle, message_id, args):
+    return bundle.format(message_id, args)
+
+
+class TestFluentBundlePickle(unittest.TestCase):
+    ftl = dedent_ftl(
+        """
+        -brand = { $case ->
+            [genitive] Firefoxu
+           *[nominative] Firefox
+         }
+        brand-name = { -brand }
+        welcome = Welcome to { brand-name }, { $name }
+            .title = About { -brand(case: "genitive") }
+        items = { $count ->
+            [one] One item
+           *[other] { $count } items
+         }
+        shout = { UPPER($text) }
+        bold-html = <b>{ $name }</b> and { brand-name }
+        constant-html = { "<i>" } <b>Hello</b>
+        mixed-html = { "<i>" } <b>{ $name }</b>
+        broken = { missing }
+        """
+    )
+    messages = [
+        ("welcome", {"name": "Jo"}),
+        ("welcome.title", {}),
+        ("items", {"count": 1}),
+        ("items", {"count": 5}),
+        ("shout", {"text": "hi"}),
+        ("bold-html", {"name": "<i>"}),
+        ("constant-html", {}),
+        ("mixed-html", {"name": "<Jo>"}),
+        ("broken", {}),
+    ]
+
+    def make_bundle(self, **kwargs):
+        return FluentBundle.from_string(
+            "pl",
+            self.ftl,
+            functions={"UPPER": upper},
+            escapers=[HtmlEscaper()],
+            use_isolating=False,
+            term_inline_threshold=0,
+            **kwargs,
+        )
+
+    def assertSameOutput(self, bundle, other):
+        for message_id, args in self.messages:
+            self.assertEqual(
+                [repr(item) for item in bundle.format(message_id, args)],
+                [repr(item) for item in other.format(message_id, args)],
+            )
+
+    def test_pickle(self):
+        bundle = self.make_bundle()
+        unpickled = pickle.loads(pickle.dumps(bundle))
+        self.assertSameOutput(bundle, unpickled)
+        self.assertEqual(unpickled.format("bold-html", {"name": "<i>"}), (Markup("<b>&lt;i&gt;</b> and Firefox"), []))
+        self.assertEqual(unpickled.format("constant-html"), (Markup("&lt;i&gt; <b>Hello</b>"), []))
+        self.assertEqual(unpickled.format("mixed-html", {"name": "<Jo>"}), (Markup("&lt;i&gt; <b>&lt;Jo&gt;</b>"), []))
+        self.assertEqual(len(unpickled.check_messages()), 1)
+        unpickled.recompile([FtlResource("welcome = New")])
+        self.assertEqual(unpickled.format("welcome"), ("New", []))
+
+    def test_pickle_fallbacks(self):
+        en = FluentBundle.from_string("en", "foo = Foo { $arg }\nonly-en = Only en", use_isolating=False)
+        de = FluentBundle.from_string("de", "bar = Bar { foo }", fallbacks=[en], use_isolating=False)
+        unpickled_en, unpickled_de = pickle.loads(pickle.dumps([en, de]))
+        self.assertEqual(unpickled_de.format("bar", {"arg": 1}), ("Bar Foo 1", []))
+        self.assertEqual(unpickled_de.format("only-en"), ("Only en", []))
+        # Fallback functions come from the unpickled fallback bundle
+        self.assertIs(unpickled_de._compiled_messages["only-en"], unpickled_en._compiled_messages["only-en"])
+
+    def test_pickle_instrumented(self):
+        bundle = self.make_bundle(instrument=True)
+        bundle.format("welcome")
+        unpickled = pickle.loads(pickle.dumps(bundle))
+        unpickled.format("items", {"count": 1})
+        self.assertEqual(unpickled.stats()["items"].calls, 1)
+        self.assertEqual(unpickled.stats()["welcome"].calls, 0)
+
+    def test_spawn(self):
+        bundle = self.make_bundle()
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(format_message, bundle, "welcome", {"name": "Jo"}).result()
+        self.assertEqual(result, ("Welcome to Firefox, Jo", []))
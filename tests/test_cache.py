@@ -0,0 +1,139 @@
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from markupsafe import Markup, escape
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.cache import BundleCache, CacheStats, _estimate_object_size, estimate_bundle_size
+from fluent_compiler.resource import FtlResource
+
+from .utils import dedent_ftl
+
+
+def make_resources(text="foo = Foo"):
+    return [FtlResource.from_string(text)]
+
+
+class TestBundleCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = BundleCache()
+        bundle = cache.get_bundle("en", make_resources())
+        self.assertEqual(bundle.format("foo"), ("Foo", []))
+        # Same contents, different resource objects
+        self.assertIs(cache.get_bundle("en", make_resources()), bundle)
+        self.assertIsNot(cache.get_bundle("de", make_resources()), bundle)
+        self.assertIsNot(cache.get_bundle("en", make_resources("foo = Bar")), bundle)
+        self.assertIsNot(cache.get_bundle("en", make_resources(), use_isolating=False), bundle)
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.evictions, stats.count), (1, 4, 0, 4))
+        self.assertEqual(stats.size, sum(size for _, size in cache._entries.values()))
+
+    def test_default_options(self):
+        cache = BundleCache()
+        bundle = cache.get_bundle("en", make_resources())
+        self.assertIs(cache.get_bundle("en", make_resources(), use_isolating=True, fallbacks=None), bundle)
+        self.assertRaises(TypeError, cache.get_bundle, "en", make_resources(), unknown=True)
+
+    def test_functions_compared_by_identity(self):
+        cache = BundleCache()
+        resources = make_resources("foo = { UPPER($x) }")
+        bundle1 = cache.get_bundle("en", resources, functions={"UPPER": lambda s: s.upper()})
+        bundle2 = cache.get_bundle("en", resources, functions={"UPPER": lambda s: s.upper()})
+        self.assertIsNot(bundle1, bundle2)
+
+    def test_eviction(self):
+        size = estimate_bundle_size(FluentBundle("en", make_resources()))
+        cache = BundleCache(max_size=size * 2)
+        bundle1 = cache.get_bundle("en", make_resources())
+        cache.get_bundle("de", make_resources())
+        # Use bundle1 so that it is most recently used
+        cache.get_bundle("en", make_resources())
+        cache.get_bundle("fr", make_resources())
+        self.assertEqual(cache.stats(), CacheStats(hits=1, misses=3, evictions=1, count=2, size=size * 2))
+        self.assertIs(cache.get_bundle("en", make_resources()), bundle1)
+
+    def test_single_flight(self):
+        cache = BundleCache()
+        compile_count = []
+
+        def slow_bundle(*args, **kwargs):
+            compile_count.append(1)
+            time.sleep(0.05)
+            return FluentBundle(*args, **kwargs)
+
+        results = []
+        with mock.patch("fluent_compiler.cache.FluentBundle", side_effect=slow_bundle):
+            threads = [
+                threading.Thread(target=lambda: results.append(cache.get_bundle("en", make_resources())))
+                for i in range(5)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(compile_count), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual((cache.stats().hits, cache.stats().misses), (4, 1))
+
+    def test_error_not_cached(self):
+        cache = BundleCache()
+        with mock.patch("fluent_compiler.cache.FluentBundle", side_effect=ValueError("Boom")):
+            self.assertRaises(ValueError, cache.get_bundle, "en", make_resources())
+        self.assertEqual(cache.get_bundle("en", make_resources()).format("foo"), ("Foo", []))
+
+    def test_include_string_rejected(self):
+        cache = BundleCache()
+        with mock.patch("fluent_compiler.cache.FluentBundle") as bundle_class:
+            self.assertRaises(TypeError, cache.get_bundle, "en", make_resources(), include="foo")
+        bundle_class.assert_not_called()
+        self.assertEqual(cache.stats().misses, 0)
+
+    def test_estimate_excludes_fallbacks(self):
+        fallback = FluentBundle.from_string("en", "bar = A long message " * 10)
+        bundle = FluentBundle.from_string("de", "foo = Foo", fallbacks=[fallback])
+        self.assertEqual(
+            estimate_bundle_size(bundle, fallbacks=[fallback]),
+            estimate_bundle_size(FluentBundle.from_string("de", "foo = Foo")),
+        )
+
+    def test_estimate_includes_helpers_and_constants(self):
+        escaper = SimpleNamespace(
+            select=lambda message_id=None, **kwargs: message_id.endswith("-html"),
+            output_type=Markup,
+            mark_escaped=Markup,
+            escape=escape,
+            join=Markup("").join,
+            name="html",
+            use_isolating=False,
+        )
+        bundle = FluentBundle.from_string(
+            "en",
+            dedent_ftl(
+                """
+                -term = { $case ->
+                   *[a] { NUMBER($count) } and some long text that makes the helper function bigger
+                    [b] B
+                 }
+                foo = { -term(count: 1) }
+                bar-html = <b>{ "<i>A long constant</i>" }</b>
+                """
+            ),
+            escapers=[escaper],
+            term_inline_threshold=0,
+        )
+        module_globals = bundle._compiled_ftl.module_globals
+        self.assertIn("term_term", module_globals)
+        message_code_size = sum(_estimate_object_size(f.__code__, set()) for f in bundle._compiled_messages.values())
+        helper_size = _estimate_object_size(module_globals["term_term"].__code__, set())
+        constant_size = sum(
+            sys.getsizeof(module_globals[name])
+            for name, reference in bundle._compiled_ftl.global_references.items()
+            if reference[0] == "escaped_constant"
+        )
+        self.assertGreater(constant_size, 0)
+        self.assertGreater(estimate_bundle_size(bundle), message_code_size + helper_size + constant_size)
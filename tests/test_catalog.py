@@ -0,0 +1,240 @@
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from markupsafe import Markup, escape
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.catalog import Catalog, write_catalog
+from fluent_compiler.compiler import compile_messages
+from fluent_compiler.resource import FtlResource
+
+from .utils import dedent_ftl
+
+
+class HtmlEscaper:
+    name = "html"
+    output_type = Markup
+    mark_escaped = Markup
+    escape = staticmethod(escape)
+    use_isolating = False
+
+    def select(self, message_id=None, **hints):
+        return message_id.endswith("-html")
+
+    def join(self, parts):
+        return Markup("").join(parts)
+
+
+html_escaper = HtmlEscaper()
+
+
+def upper(text):
+    return text.upper()
+
+
+FTL = dedent_ftl(
+    """
+    -brand = { $case ->
+        [genitive] Firefoxu
+       *[nominative] Firefox
+     }
+    brand-name = { -brand }
+    welcome = Welcome to { brand-name }
+        .title = About { -brand(case: "genitive") }
+    items = { $count ->
+        [one] One item
+       *[other] { $count } items
+     }
+    shout = { UPPER($text) }
+    bold-html = <b>{ $name }</b> and { brand-name }
+    """
+)
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "messages.ftlc")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, locales=("en-US", "pl"), text=FTL, **kwargs):
+        kwargs.setdefault("functions", {"UPPER": upper})
+        kwargs.setdefault("escapers", [html_escaper])
+        compiled = [
+            compile_messages(locale, [FtlResource(text)], use_isolating=False, term_inline_threshold=0, **kwargs)
+            for locale in locales
+        ]
+        write_catalog(self.filename, compiled)
+        return compiled
+
+    def open(self):
+        catalog = Catalog(self.filename)
+        self.addCleanup(catalog.close)
+        return catalog
+
+    def test_roundtrip(self):
+        compiled = self.write()
+        catalog = self.open()
+        self.assertEqual(catalog.locales, ["en_US", "pl"])
+        for compiled_ftl in compiled:
+            bundle = catalog.get_bundle(compiled_ftl.locale, functions={"UPPER": upper}, escapers=[html_escaper])
+            for msg_id, args in [
+                ("welcome", {}),
+                ("welcome.title", {}),
+                ("items", {"count": 1}),
+                ("items", {"count": 2}),
+                ("items", {"count": 5}),
+                ("shout", {"text": "hi"}),
+                ("bold-html", {"name": "<i>"}),
+            ]:
+                errors = []
+                expected = compiled_ftl.message_functions[msg_id](args, errors)
+                self.assertEqual(bundle.format(msg_id, args), (expected, errors))
+        bundle = catalog.get_bundle("en-US", functions={"UPPER": upper}, escapers=[html_escaper])
+        self.assertEqual(bundle.format("items", {"count": 1}), ("One item", []))
+        self.assertEqual(bundle.format("bold-html", {"name": "<i>"}), (Markup("<b>&lt;i&gt;</b> and Firefox"), []))
+        self.assertTrue(bundle.has_message("welcome"))
+        self.assertFalse(bundle.has_message("missing"))
+
+    def test_escaped_constants(self):
+        text = dedent_ftl(
+            """
+            constant-html = { "<i>" } <b>Hello</b>
+            mixed-html = { "<i>" } <b>{ $name }</b> { brand-name }
+            brand-name = Firefox & co
+            """
+        )
+        compiled = self.write(locales=["en-US"], text=text)
+        bundle = self.open().get_bundle("en-US", functions={"UPPER": upper}, escapers=[html_escaper])
+        self.assertEqual(bundle.format("constant-html"), (Markup("&lt;i&gt; <b>Hello</b>"), []))
+        self.assertEqual(
+            bundle.format("mixed-html", {"name": "<Jo>"}),
+            (Markup("&lt;i&gt; <b>&lt;Jo&gt;</b> Firefox &amp; co"), []),
+        )
+        for msg_id in ["constant-html", "mixed-html"]:
+            self.assertEqual(
+                bundle.format(msg_id, {"name": "Jo"}), (compiled[0].message_functions[msg_id]({"name": "Jo"}, []), [])
+            )
+
+    def test_lazy_loading(self):
+        self.write(
+            text=dedent_ftl(
+                """
+                count = { $count }
+                message = You have { count }
+                other = { $other }
+                """
+            ),
+            functions=None,
+            escapers=None,
+        )
+        compiled_ftl = self.open().get_compiled_ftl("en-US")
+        self.assertEqual(compiled_ftl.message_functions["message"]({"count": 2}, []), "You have 2")
+        loaded = {name for name in compiled_ftl.module_globals if name in compiled_ftl.message_mapping.values()}
+        self.assertEqual(loaded, {"message", "count"})
+        self.assertEqual(len(compiled_ftl.message_functions), 3)
+
+    def test_concurrent_loading(self):
+        # A function must not be usable from another thread before the
+        # functions it calls are loaded.
+        self.write(
+            text=dedent_ftl(
+                """
+                count = { $count }
+                message = You have { count }
+                """
+            ),
+            functions=None,
+            escapers=None,
+        )
+        catalog = self.open()
+        compiled_ftl = catalog.get_compiled_ftl("en-US")
+        loader = compiled_ftl.message_functions._loader
+        results = []
+
+        def use_message():
+            try:
+                results.append(loader.load("message")({"count": 2}, []))
+            except Exception as e:
+                results.append(e)
+
+        original_load = catalog._load
+        load_calls = []
+        threads = []
+
+        def slow_load(offset, length):
+            load_calls.append(offset)
+            if len(load_calls) == 2:
+                # While the dependency is being loaded, try to use the message.
+                thread = threading.Thread(target=use_message)
+                threads.append(thread)
+                thread.start()
+                thread.join(0.1)
+            return original_load(offset, length)
+
+        with mock.patch.object(catalog, "_load", slow_load):
+            self.assertEqual(compiled_ftl.message_functions["message"]({"count": 3}, []), "You have 3")
+        threads[0].join()
+        self.assertEqual(results, ["You have 2"])
+
+    def test_pickle(self):
+        self.write(locales=["en-US"])
+        bundle = self.open().get_bundle("en-US", functions={"UPPER": upper}, escapers=[html_escaper])
+        unpickled = pickle.loads(pickle.dumps(bundle))
+        self.assertEqual(unpickled.format("shout", {"text": "hi"}), ("HI", []))
+
+    def test_output_handlers(self):
+        class Shout:
+            def __init__(self, text):
+                self.text = text
+
+        functions = {"UPPER": Shout}
+        output_handlers = {Shout: lambda shout, locale: shout.text.upper()}
+        self.write(locales=["en-US"], functions=functions, output_handlers=output_handlers)
+        bundle = self.open().get_bundle(
+            "en-US", functions=functions, escapers=[html_escaper], output_handlers=output_handlers
+        )
+        self.assertEqual(bundle.format("shout", {"text": "hi"}), ("HI", []))
+
+    def test_fallbacks(self):
+        fallback_compiled = compile_messages("en", [FtlResource("fallback = Fallback\nother = Other")])
+        fallback = FluentBundle.from_compiled_ftl(fallback_compiled)
+        compiled = compile_messages(
+            "de", [FtlResource("message = Message { fallback }")], use_isolating=False, fallbacks=[fallback_compiled]
+        )
+        write_catalog(self.filename, [compiled])
+        bundle = self.open().get_bundle("de", fallbacks=[fallback])
+        self.assertEqual(bundle.format("message"), ("Message Fallback", []))
+        self.assertEqual(bundle.format("other"), ("Other", []))
+
+    def test_missing_function(self):
+        self.write()
+        catalog = self.open()
+        self.assertRaises(ValueError, catalog.get_bundle, "en-US", escapers=[html_escaper])
+        self.assertRaises(ValueError, catalog.get_bundle, "en-US", functions={"UPPER": upper})
+
+    def test_instrument(self):
+        self.write(locales=["en-US"], instrument=True)
+        bundle = self.open().get_bundle("en-US", functions={"UPPER": upper}, escapers=[html_escaper])
+        bundle.format("welcome")
+        stats = bundle.stats()
+        self.assertEqual(stats["welcome"].calls, 1)
+        self.assertEqual(stats["items"].calls, 0)
+
+    def test_unknown_locale(self):
+        self.write()
+        self.assertRaises(KeyError, self.open().get_bundle, "fr")
+
+    def test_not_a_catalog(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"\0" * 100)
+        self.assertRaises(ValueError, Catalog, self.filename)
+
+    def test_duplicate_locale(self):
+        self.assertRaises(ValueError, self.write, locales=["en-US", "en_US"])
@@ -101,6 +101,22 @@ class TestCodeGen(unittest.TestCase):
         scope.reserve_name("name", properties={"FOO": True})
         self.assertEqual(scope.get_name_properties("name"), {"FOO": True})
 
+    def test_scope_copy(self):
+        scope = codegen.Scope()
+        scope.reserve_name("name", properties={"FOO": True})
+        scope.reserve_function_arg_name("arg")
+        scope2 = scope.copy()
+        self.assertTrue(scope2.is_name_in_use("name"))
+        self.assertTrue(scope2.is_name_reserved_function_arg("arg"))
+        scope2.reserve_name("other")
+        scope2.set_name_properties("name", {"FOO": False})
+        self.assertFalse(scope.is_name_in_use("other"))
+        self.assertEqual(scope.get_name_properties("name"), {"FOO": True})
+
+    def test_scope_copy_non_root(self):
+        scope = codegen.Scope(parent_scope=codegen.Scope())
+        self.assertRaises(AssertionError, scope.copy)
+
     def test_function(self):
         module = codegen.Module()
         func = codegen.Function("myfunc", args=["myarg1", "myarg2"], parent_scope=module.scope)
@@ -1,10 +1,20 @@
+import builtins
+import pickle
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 
 from markupsafe import Markup, escape
 
 from fluent_compiler import codegen
-from fluent_compiler.compiler import compile_messages
+from fluent_compiler.compiler import (
+    DEFAULT_TERM_INLINE_THRESHOLD,
+    CompiledFtl,
+    CompilerEnvironment,
+    add_compile_stats_callback,
+    compile_messages,
+    remove_compile_stats_callback,
+)
 from fluent_compiler.errors import FluentCyclicReferenceError, FluentFormatError, FluentReferenceError
 from fluent_compiler.resource import FtlResource
 
@@ -16,7 +26,18 @@ from .utils import dedent_ftl
 # the other FluentBundle.format tests.
 
 
-def compile_messages_to_python(source, locale, use_isolating=False, functions=None, escapers=None, filename=None):
+def compile_messages_to_python(
+    source,
+    locale,
+    use_isolating=False,
+    functions=None,
+    escapers=None,
+    filename=None,
+    fallbacks=None,
+    argument_types=None,
+    instrument=False,
+    term_inline_threshold=DEFAULT_TERM_INLINE_THRESHOLD,
+):
     # We use FluentBundle partially here, but then switch to
     # messages_to_module instead of compile_messages so that we can get the AST
     # back instead of a compiled function.
@@ -27,6 +48,10 @@ def compile_messages_to_python(source, locale, use_isolating=False, functions=No
         use_isolating=use_isolating,
         functions=functions,
         escapers=escapers,
+        fallbacks=fallbacks,
+        argument_types=argument_types,
+        instrument=instrument,
+        term_inline_threshold=term_inline_threshold,
     )
     return decompile_ast_list([output.module_ast]), output.errors
 
@@ -133,7 +158,7 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
                 return 'Foo'
 
             def bar(message_args, errors):
-                return 'X ' + foo(message_args, errors)
+                return 'X Foo'
         """,
         )
         self.assertEqual(errs, [])
@@ -152,12 +177,69 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
             def foo(message_args, errors):
                 return 'Foo'
 
+            def bar(message_args, errors):
+                return 'Foo'
+        """,
+        )
+        self.assertEqual(errs, [])
+
+    def test_single_message_reference_not_constant(self):
+        code, errs = compile_messages_to_python(
+            """
+            foo = Foo { $arg }
+            bar = { foo }
+        """,
+            self.locale,
+            argument_types={"arg": str},
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo(message_args, errors):
+                try:
+                    _arg = message_args['arg']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:2:13: Unknown external: arg'))
+                    _arg = FluentNone('arg')
+                    _arg_h = 'arg'
+                else:
+                    if not isinstance(_arg, str):
+                        _arg = check_argument_type(_arg, 'arg', str, errors)
+                    _arg_h = _arg
+                return 'Foo ' + _arg_h
+
             def bar(message_args, errors):
                 return foo(message_args, errors)
         """,
         )
         self.assertEqual(errs, [])
 
+    def test_constant_message_reference_chain(self):
+        # Messages are compiled in dependency order, so that chains of
+        # references to constant messages collapse to constants.
+        code, errs = compile_messages_to_python(
+            """
+            baz = { bar }!
+            bar = { foo } Bar
+            foo = Foo
+        """,
+            self.locale,
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def baz(message_args, errors):
+                return 'Foo Bar!'
+
+            def bar(message_args, errors):
+                return 'Foo Bar'
+
+            def foo(message_args, errors):
+                return 'Foo'
+        """,
+        )
+        self.assertEqual(errs, [])
+
     def test_message_attr_reference(self):
         code, errs = compile_messages_to_python(
             """
@@ -174,7 +256,25 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
                 return 'Foo Attr'
 
             def bar(message_args, errors):
-                return foo__attr(message_args, errors)
+                return 'Foo Attr'
+        """,
+        )
+        self.assertEqual(errs, [])
+
+    def test_fallback_message_reference(self):
+        fallback = compile_messages("en", [FtlResource("foo = Foo\nbar = Bar")])
+        code, errs = compile_messages_to_python(
+            """
+            bar = { foo } { foo }
+        """,
+            self.locale,
+            fallbacks=[fallback],
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def bar(message_args, errors):
+                return fallback_foo(message_args, errors) + ' ' + fallback_foo(message_args, errors)
         """,
         )
         self.assertEqual(errs, [])
@@ -192,7 +292,7 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
             code,
             """
             def bar(message_args, errors):
-                return foo(message_args, errors)
+                return 'Foo'
 
             def foo(message_args, errors):
                 return 'Foo'
@@ -273,7 +373,7 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
         # of the message function to call.
         code, errs = compile_messages_to_python(
             """
-            zip = Foo
+            zip = { NUMBER(1) }
             str = { zip }
         """,
             self.locale,
@@ -282,7 +382,7 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
             code,
             """
             def zip2(message_args, errors):
-                return 'Foo'
+                return NUMBER(1).format(locale)
 
             def str2(message_args, errors):
                 return zip2(message_args, errors)
@@ -296,10 +396,10 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
         code, errs = compile_messages_to_python(
             """
             foo--bar = Foo Bar
-                    .attr = Attr
+                    .attr = { NUMBER(1) }
 
             foo     = Foo
-               .bar--attr = Bar Attr
+               .bar--attr = { NUMBER(2) }
 
             caller1 = { foo--bar.attr }
             caller2 = { foo.bar--attr }
@@ -313,13 +413,13 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
                 return 'Foo Bar'
 
             def foo__bar__attr(message_args, errors):
-                return 'Attr'
+                return NUMBER(1).format(locale)
 
             def foo(message_args, errors):
                 return 'Foo'
 
             def foo__bar__attr2(message_args, errors):
-                return 'Bar Attr'
+                return NUMBER(2).format(locale)
 
             def caller1(message_args, errors):
                 return foo__bar__attr(message_args, errors)
@@ -1014,6 +1114,94 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
         """,
         )
 
+    def test_term_helper_functions(self):
+        code, errs = compile_messages_to_python(
+            """
+            -thing = { $article ->
+                  *[definite] the thing
+                   [indefinite] a { NUMBER($count) } things
+            }
+            -brand = { $case ->
+                  *[nominative] Brand
+                   [genitive] Brand's
+            }
+            the-thing = { -thing } { -brand }
+            a-thing = { -thing(article: "indefinite", count: 1) }
+            other-thing = { -thing(count: 1, article: "indefinite") }
+        """,
+            self.locale,
+            term_inline_threshold=3,
+        )
+        # -thing is compiled to a function for each set of arguments. -brand is
+        # below the threshold so is inlined.
+        self.assertCodeEqual(
+            code,
+            """
+            def the_thing(message_args, errors):
+                return 'the thing Brand'
+
+            def a_thing(message_args, errors):
+                return term_thing(errors)
+
+            def other_thing(message_args, errors):
+                return term_thing(errors)
+
+            def term_thing(errors):
+                return 'a ' + NUMBER(1).format(locale) + ' things'
+        """,
+        )
+
+    def test_term_helper_function_simplified_to_constant(self):
+        code, errs = compile_messages_to_python(
+            """
+            -brand = Firefox { $x }
+            a = { -brand }
+            b = { -brand(y: 1) } again
+        """,
+            self.locale,
+            term_inline_threshold=0,
+        )
+        # The missing argument is simplified to a string, so no function is needed.
+        self.assertCodeEqual(
+            code,
+            """
+            def a(message_args, errors):
+                return 'Firefox x'
+
+            def b(message_args, errors):
+                return 'Firefox x again'
+        """,
+        )
+
+    def test_term_helper_functions_shared(self):
+        code, errs = compile_messages_to_python(
+            """
+            -thing = { $article ->
+                  *[definite] the thing { $name }
+                   [indefinite] a { NUMBER($count) } things
+            }
+            a-thing = { -thing(article: "indefinite", count: 1, name: "x") }
+            other-thing = { -thing(article: "indefinite", count: 1, name: "y") }
+        """,
+            self.locale,
+            term_inline_threshold=0,
+        )
+        # Arguments that aren't used by the selected variant don't need
+        # separate functions.
+        self.assertCodeEqual(
+            code,
+            """
+            def a_thing(message_args, errors):
+                return term_thing(errors)
+
+            def other_thing(message_args, errors):
+                return term_thing(errors)
+
+            def term_thing(errors):
+                return 'a ' + NUMBER(1).format(locale) + ' things'
+        """,
+        )
+
     def test_message_call_from_inside_term(self):
         # This might get removed sometime, but for now it is a corner case we
         # need to cover.
@@ -1176,6 +1364,148 @@ class TestCompiler(CompilerTestMixin, UseConcatJoinMixin, unittest.TestCase):
         """,
         )
 
+    def test_declared_str_argument(self):
+        code, errs = compile_messages_to_python(
+            """
+            foo = Hello { $name }
+            bar = { $name ->
+                [one] One
+               *[other] Other
+              }
+        """,
+            self.locale,
+            argument_types={"name": str},
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo(message_args, errors):
+                try:
+                    _arg = message_args['name']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:2:15: Unknown external: name'))
+                    _arg = FluentNone('name')
+                    _arg_h = 'name'
+                else:
+                    if not isinstance(_arg, str):
+                        _arg = check_argument_type(_arg, 'name', str, errors)
+                    _arg_h = _arg
+                return 'Hello ' + _arg_h
+
+            def bar(message_args, errors):
+                try:
+                    _arg = message_args['name']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:3:9: Unknown external: name'))
+                    _arg = FluentNone('name')
+                else:
+                    if not isinstance(_arg, str):
+                        _arg = check_argument_type(_arg, 'name', str, errors)
+                if _arg == 'one':
+                    _ret = 'One'
+                else:
+                    _ret = 'Other'
+                return _ret
+        """,
+        )
+        self.assertEqual(errs, [])
+
+    def test_declared_int_argument(self):
+        code, errs = compile_messages_to_python(
+            """
+            foo = { $count ->
+                [0] None
+                [one] One
+               *[other] { $count } items
+              }
+        """,
+            self.locale,
+            argument_types={"foo": {"count": int}},
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo(message_args, errors):
+                try:
+                    _arg = message_args['count']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:2:9: Unknown external: count'))
+                    _arg = FluentNone('count')
+                else:
+                    if not isinstance(_arg, int):
+                        _arg = check_argument_type(_arg, 'count', int, errors)
+                _plural_form = plural_form_for_number(_arg)
+                if _arg == 0:
+                    _ret = 'None'
+                elif _plural_form == 'one':
+                    _ret = 'One'
+                else:
+                    _arg_h = fluent_number(_arg)
+                    _ret = _arg_h.format(locale) + ' items'
+                return _ret
+        """,
+        )
+        self.assertEqual(errs, [])
+
+    def test_instrument(self):
+        code, errs = compile_messages_to_python(
+            """
+            foo = { $arg ->
+                [a] A
+               *[b] B
+              }
+            bar = Bar
+        """,
+            self.locale,
+            instrument=True,
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo(message_args, errors):
+                _errors_len = len(errors)
+                try:
+                    _arg = message_args['arg']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:2:9: Unknown external: arg'))
+                    _arg = FluentNone('arg')
+                if _arg == 'a':
+                    _ret = 'A'
+                else:
+                    _ret = 'B'
+                foo__stats.record(errors, _errors_len)
+                return _ret
+
+            def bar(message_args, errors):
+                _errors_len = len(errors)
+                _ret = 'Bar'
+                bar__stats.record(errors, _errors_len)
+                return _ret
+        """,
+        )
+        self.assertEqual(errs, [])
+
+    def test_instrument_timing(self):
+        code, errs = compile_messages_to_python(
+            """
+            foo = Foo
+        """,
+            self.locale,
+            instrument="timing",
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo(message_args, errors):
+                _errors_len = len(errors)
+                _start = perf_counter_ns()
+                _ret = 'Foo'
+                foo__stats.record(errors, _errors_len, _start)
+                return _ret
+        """,
+        )
+        self.assertEqual(errs, [])
+
     # TODO - eliminate unused assignments e.g. `_plural_form = plural_form_for_number(_arg)` is unneeded
     # def test_unused_assignments(self):
     #     code, errs = compile_messages_to_python("""
@@ -1256,7 +1586,7 @@ class TestCompilerEscaping(CompilerTestMixin, unittest.TestCase):
             code,
             """
             def foo_html(message_args, errors):
-                return escaper_0__mark_escaped('<b>Some HTML</b>')
+                return escaper_0__text
         """,
         )
 
@@ -1272,7 +1602,7 @@ class TestCompilerEscaping(CompilerTestMixin, unittest.TestCase):
             code,
             """
             def foo_html(message_args, errors):
-                return escaper_0__mark_escaped('<b>Some HTML</b>')
+                return escaper_0__text
 
             def bar_html(message_args, errors):
                 return foo_html(message_args, errors)
@@ -1290,7 +1620,7 @@ class TestCompilerEscaping(CompilerTestMixin, unittest.TestCase):
             code,
             """
             def foo_html(message_args, errors):
-                return escaper_0__mark_escaped('<b>Some HTML</b>')
+                return escaper_0__text
         """,
         )
 
@@ -1305,10 +1635,94 @@ class TestCompilerEscaping(CompilerTestMixin, unittest.TestCase):
             code,
             """
             def foo_html(message_args, errors):
-                return escaper_0__mark_escaped('Hello <b>Some HTML</b>')
+                return escaper_0__text
         """,
         )
 
+    def test_escaped_constants(self):
+        code, errs = self.compile_messages(
+            """
+            foo-html = <b>Hello</b> { $name }
+            bar-html = { "<i>" } <b>Hello</b> { $name }
+            baz-html = { "<i>" } <b>Hello</b>
+        """
+        )
+        self.assertCodeEqual(
+            code,
+            """
+            def foo_html(message_args, errors):
+                try:
+                    _arg = message_args['name']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:2:27: Unknown external: name'))
+                    _arg = FluentNone('name')
+                    _arg_h = _arg
+                else:
+                    _arg_h = handle_argument_with_escaper(_arg, 'name', escaper_0__output_type, locale, errors)
+                return escaper_0__join(
+                    [
+                        escaper_0__text,
+                        handle_output_with_escaper(
+                            _arg_h,
+                            escaper_0__output_type,
+                            escaper_0__escape,
+                            locale,
+                            errors
+                        ),
+                    ]
+                )
+
+            def bar_html(message_args, errors):
+                try:
+                    _arg = message_args['name']
+                except (LookupError, TypeError):
+                    errors.append(FluentReferenceError('<string>:3:37: Unknown external: name'))
+                    _arg = FluentNone('name')
+                    _arg_h = _arg
+                else:
+                    _arg_h = handle_argument_with_escaper(_arg, 'name', escaper_0__output_type, locale, errors)
+                return escaper_0__join(
+                    [
+                        escaper_0__text2,
+                        escaper_0__text3,
+                        handle_output_with_escaper(
+                            _arg_h,
+                            escaper_0__output_type,
+                            escaper_0__escape,
+                            locale,
+                            errors
+                        ),
+                    ]
+                )
+
+            def baz_html(message_args, errors):
+                return escaper_0__text5
+        """,
+        )
+        output = compile_messages(
+            self.locale, [FtlResource('baz-html = { "<i>" } <b>Hello</b>')], escapers=self.escapers
+        )
+        self.assertEqual(output.message_functions["baz-html"]({}, []), Markup("&lt;i&gt; <b>Hello</b>"))
+
+    def test_escaper_selected_once_per_message(self):
+        selected = []
+
+        def select(message_id=None, **kwargs):
+            selected.append(message_id)
+            return message_id.endswith("-html")
+
+        escaper = SimpleNamespace(**{**html_escaper.__dict__, "select": select})
+        compile_messages_to_python(
+            """
+            -term-html = Term
+            foo-html = { -term-html } { -term-html }
+            bar-html = { foo-html } { foo-html } { -term-html }
+        """,
+            self.locale,
+            escapers=[escaper],
+        )
+        self.assertEqual(sorted(selected), ["-term-html", "bar-html", "foo-html"])
+
     def test_non_unique_escaper(self):
         self.assertRaises(
             ValueError,
@@ -1317,3 +1731,211 @@ class TestCompilerEscaping(CompilerTestMixin, unittest.TestCase):
             self.locale,
             escapers=[html_escaper, html_escaper],
         )
+
+
+class TestCompilerPrelude(unittest.TestCase):
+    def test_locale_data_reused(self):
+        output1 = compile_messages("en-US", [FtlResource("foo = Foo")])
+        output2 = compile_messages("en-US", [FtlResource("bar = Bar")])
+        globals1 = output1.message_functions["foo"].__globals__
+        globals2 = output2.message_functions["bar"].__globals__
+        self.assertIs(globals1["locale"], globals2["locale"])
+        self.assertIs(globals1["plural_form_for_number"], globals2["plural_form_for_number"])
+        # But we don't share module globals
+        self.assertNotIn("foo", globals2)
+
+    def test_function_arg_errors_reported_every_time(self):
+        def foo():
+            pass
+
+        foo.ftl_arg_spec = (0, ["bad kwarg"])
+        for i in range(0, 2):
+            output = compile_messages("en-US", [FtlResource("foo = Foo")], functions={"FOO": foo})
+            self.assertEqual(
+                output.errors, [(None, FluentFormatError("FOO() has invalid keyword argument name 'bad kwarg'"))]
+            )
+
+    def test_new_builtins(self):
+        compile_messages("en-US", [FtlResource("foo = Foo")])
+        builtins.fluent_compiler_test_builtin = None
+        try:
+            code, errs = compile_messages_to_python("fluent-compiler-test-builtin = Foo", "en-US")
+        finally:
+            del builtins.fluent_compiler_test_builtin
+        self.assertEqual(
+            normalize_python(code),
+            normalize_python(
+                """
+                def fluent_compiler_test_builtin2(message_args, errors):
+                    return 'Foo'
+            """
+            ),
+        )
+
+
+class TestCompileStats(unittest.TestCase):
+    def test_stats(self):
+        compiled = compile_messages(
+            "en",
+            [
+                FtlResource(
+                    dedent_ftl(
+                        """
+            foo = { NUMBER(NUMBER(1)) }
+                .attr = Attr
+            bar = { -term }
+            -term = Term
+        """
+                    )
+                )
+            ],
+        )
+        stats = compiled.stats
+        self.assertEqual(stats.message_count, 3)
+        self.assertEqual(stats.term_count, 1)
+        self.assertEqual(stats.function_count, 3)
+        # NUMBER(NUMBER(NUMBER(1))), since number literals are also wrapped in NUMBER
+        self.assertEqual(stats.simplifier_rule_hits, {"nested_number": 2})
+        self.assertEqual(stats.message_rule_hits, {"foo": {"nested_number": 2}})
+        self.assertGreaterEqual(stats.simplifier_passes, 2)
+        self.assertGreater(stats.ast_node_count, 0)
+        for phase in ["parse", "cycle_check", "compile", "simplify", "as_ast", "exec"]:
+            phase_time = getattr(stats, f"{phase}_time")
+            self.assertGreaterEqual(phase_time, 0)
+            self.assertLessEqual(phase_time, stats.total_time)
+
+    def test_callback(self):
+        compiled_ftls = []
+        add_compile_stats_callback(compiled_ftls.append)
+        try:
+            compiled = compile_messages("en", [FtlResource("foo = Foo")])
+        finally:
+            remove_compile_stats_callback(compiled_ftls.append)
+        compile_messages("en", [FtlResource("foo = Foo")])
+        self.assertEqual(compiled_ftls, [compiled])
+
+
+class TestCompiledFtlPickle(unittest.TestCase):
+    def test_pickle(self):
+        compiled = compile_messages(
+            "en", [FtlResource("foo = Foo { $arg }\nbar = { foo } { missing }")], use_isolating=False
+        )
+        unpickled = pickle.loads(pickle.dumps(compiled))
+        self.assertEqual(unpickled.message_functions["bar"]({"arg": 1}, []), "Foo 1 missing")
+        self.assertEqual(unpickled.message_mapping, compiled.message_mapping)
+        self.assertEqual(unpickled.errors, compiled.errors)
+        self.assertEqual(unpickled.stats, compiled.stats)
+        self.assertIsNone(unpickled.module_ast)
+
+    def test_not_compiled(self):
+        compiled = CompiledFtl(message_functions={"foo": lambda args, errors: "Foo"})
+        self.assertRaises(TypeError, pickle.dumps, compiled)
+
+
+class TestCompileInclude(unittest.TestCase):
+    ftl = dedent_ftl(
+        """
+        -brand = Firefox
+            .gender = masculine
+        -other-brand = { other }
+        other = Other
+        checkout-title = Pay with { -brand }
+        checkout-button = { checkout-title }
+            .title = { -other-brand }
+        login = Log in
+            .title = { -unused-brand }
+        -unused-brand = Unused
+        cycle-1 = { cycle-2 }
+        cycle-2 = { cycle-1 }
+        """
+    )
+
+    def compile(self, include):
+        return compile_messages("en", [FtlResource(self.ftl)], use_isolating=False, include=include)
+
+    def test_include_all(self):
+        compiled = self.compile(None)
+        self.assertIn("login", compiled.message_functions)
+        self.assertEqual(len(compiled.errors), 2)
+
+    def test_include_ids(self):
+        compiled = self.compile(["checkout-button"])
+        self.assertEqual(
+            sorted(compiled.message_functions),
+            ["checkout-button", "checkout-button.title", "checkout-title", "other"],
+        )
+        errors = []
+        self.assertEqual(compiled.message_functions["checkout-button"]({}, errors), "Pay with Firefox")
+        self.assertEqual(compiled.message_functions["checkout-button.title"]({}, errors), "Other")
+        self.assertEqual(errors, [])
+        self.assertEqual(compiled.errors, [])
+        self.assertEqual(compiled.stats.message_count, 4)
+        self.assertEqual(compiled.stats.term_count, 2)
+
+    def test_include_attribute(self):
+        compiled = self.compile(["checkout-button.title"])
+        self.assertEqual(sorted(compiled.message_functions), ["checkout-button.title", "other"])
+
+    def test_include_prefix(self):
+        compiled = self.compile(["checkout-*"])
+        self.assertEqual(
+            sorted(compiled.message_functions),
+            ["checkout-button", "checkout-button.title", "checkout-title", "other"],
+        )
+
+    def test_include_predicate(self):
+        compiled = self.compile(lambda msg_id: msg_id.startswith("cycle-"))
+        self.assertEqual(sorted(compiled.message_functions), ["cycle-1", "cycle-2"])
+        self.assertEqual(len(compiled.errors), 2)
+        self.assertEqual(type(compiled.errors[0][1]), FluentCyclicReferenceError)
+
+    def test_include_string(self):
+        self.assertRaises(TypeError, self.compile, "login")
+
+    def test_include_fallbacks(self):
+        fallback = compile_messages("en", [FtlResource("login = Log in\nlogout = Log out")])
+        compiled = compile_messages(
+            "de", [FtlResource("welcome = Willkommen")], fallbacks=[fallback], include=["welcome", "login"]
+        )
+        self.assertEqual(sorted(compiled.message_functions), ["login", "welcome"])
+
+
+class TestCompilerThreads(unittest.TestCase):
+    def test_concurrent_compilation(self):
+        ftl = dedent_ftl(
+            """
+            -brand = { $case ->
+                *[nominative] Firefox
+                 [genitive] Firefoxu
+             }
+            items = { $count ->
+                [one] { $count } item from { -brand(case: "genitive") }
+               *[other] { $count } items from { -brand }
+             }
+            price = { NUMBER($amount, style: "currency", currency: "EUR") }
+        """
+        )
+        jobs = [
+            (locale, FtlResource(ftl + f"msg-{i} = Message { i }")) for i in range(40) for locale in ["en", "de", "pl"]
+        ]
+
+        def compile_and_format(job):
+            locale, resource = job
+            output = compile_messages(locale, [resource], use_isolating=False)
+            return (
+                decompile_ast_list([output.module_ast]),
+                output.message_functions["items"]({"count": 3}, []),
+                output.message_functions["price"]({"amount": 1234.5}, []),
+            )
+
+        expected = [compile_and_format(job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(list(executor.map(compile_and_format, jobs)), expected)
+
+    def test_modified_restored_after_exception(self):
+        compiler_env = CompilerEnvironment(locale=None, plural_form_function=None, use_isolating=False)
+        original = compiler_env.current
+        with self.assertRaises(ZeroDivisionError):
+            with compiler_env.modified(message_id="foo"):
+                1 / 0
+        self.assertIs(compiler_env.current, original)
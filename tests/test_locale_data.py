@@ -0,0 +1,76 @@
+import io
+import pickle
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import pytz
+from babel import Locale
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.locale_data import SnapshotLocale, dump_locale_data, extract_locale_data, load_locale_data
+from fluent_compiler.types import fluent_date, fluent_number
+
+from .utils import dedent_ftl
+
+
+def make_snapshot(locale, **kwargs):
+    f = io.BytesIO()
+    dump_locale_data(locale, f, **kwargs)
+    f.seek(0)
+    return f
+
+
+class TestLocaleData(unittest.TestCase):
+    def test_extract_locale_data(self):
+        data = extract_locale_data("de-AT")
+        self.assertIn("decimal_formats", data)
+        self.assertIn("plural_form", data)
+        self.assertNotIn("languages", data)
+        self.assertNotIn("territories", data)
+
+    def test_extract_locale_data_currencies(self):
+        data = extract_locale_data("de-AT", currencies=["EUR"])
+        self.assertEqual(list(data["currency_symbols"].keys()), ["EUR"])
+
+    def test_roundtrip(self):
+        locale = load_locale_data(make_snapshot("de-AT"))
+        self.assertIsInstance(locale, SnapshotLocale)
+        self.assertEqual(locale, Locale.parse("de_AT"))
+        self.assertEqual(str(locale), "de_AT")
+
+    def test_bad_version(self):
+        f = io.BytesIO(pickle.dumps({"version": 1000}))
+        self.assertRaises(ValueError, load_locale_data, f)
+
+    def test_format_without_babel_database(self):
+        snapshot = make_snapshot("de-AT", currencies=["EUR"])
+        full_locale = Locale.parse("de_AT")
+        values = [
+            fluent_number(1234567.891),
+            fluent_number(0.5, style="percent"),
+            fluent_number(1234.5, style="currency", currency="EUR"),
+            fluent_number(2, style="currency", currency="EUR", currencyDisplay="name"),
+            fluent_date(datetime(2020, 1, 2, 3, 4, 5, tzinfo=pytz.UTC), dateStyle="full", timeStyle="full"),
+        ]
+        expected = [v.format(full_locale) for v in values]
+        with mock.patch("babel.localedata.load", side_effect=AssertionError("babel locale data loaded")):
+            locale = load_locale_data(snapshot)
+            bundle = FluentBundle.from_string(
+                locale,
+                dedent_ftl(
+                    """
+                items = { $count ->
+                    [one] One item
+                   *[other] { $count } items
+                 }
+            """
+                ),
+                use_isolating=False,
+            )
+            self.assertEqual(bundle.format("items", {"count": 1000}), ("1.000 items", []))
+            self.assertEqual([v.format(locale) for v in values], expected)
+
+    def test_fallback_to_babel_database(self):
+        locale = load_locale_data(make_snapshot("de-AT"))
+        self.assertEqual(locale.territories["AT"], "Österreich")
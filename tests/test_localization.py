@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+
+from fluent_compiler.bundle import FluentBundle, FtlResource
+from fluent_compiler.localization import FluentLocalization, parse_accept_language
+
+from .utils import dedent_ftl
+
+
+def make_localization(**kwargs):
+    return FluentLocalization(
+        [
+            FluentBundle.from_string(
+                "en",
+                dedent_ftl(
+                    """
+                hello = Hello
+                goodbye = Goodbye
+                only-en = English only
+            """
+                ),
+            ),
+            FluentBundle.from_string(
+                "de",
+                dedent_ftl(
+                    """
+                hello = Hallo
+                goodbye = Auf Wiedersehen
+            """
+                ),
+            ),
+            FluentBundle.from_string(
+                "de-AT",
+                dedent_ftl(
+                    """
+                hello = Servus
+            """
+                ),
+            ),
+            FluentBundle.from_string(
+                "fr-FR",
+                dedent_ftl(
+                    """
+                hello = Bonjour
+            """
+                ),
+            ),
+        ],
+        **kwargs,
+    )
+
+
+class TestParseAcceptLanguage(unittest.TestCase):
+    def test_simple(self):
+        self.assertEqual(parse_accept_language("de-AT"), ["de-at"])
+
+    def test_quality(self):
+        self.assertEqual(
+            parse_accept_language("en;q=0.5, de-AT, fr;q=0.8, *;q=0.1, it;q=0, es;q=junk"),
+            ["de-at", "fr", "en"],
+        )
+
+    def test_empty(self):
+        self.assertEqual(parse_accept_language(""), [])
+
+
+class TestFluentLocalization(unittest.TestCase):
+    def test_negotiate(self):
+        l10n = make_localization()
+        self.assertEqual(l10n.negotiate("de-AT,de;q=0.9"), ("de-at", "de", "en"))
+        self.assertEqual(l10n.negotiate("de-CH"), ("de", "de-at", "en"))
+        self.assertEqual(l10n.negotiate("fr"), ("fr-fr", "en"))
+        self.assertEqual(l10n.negotiate("ja"), ("en",))
+
+    def test_negotiate_cached(self):
+        l10n = make_localization()
+        l10n.negotiate("de-AT")
+        l10n.negotiate("de-AT")
+        info = l10n.cache_info()["negotiate"]
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_default_locale(self):
+        l10n = make_localization(default_locale="de")
+        self.assertEqual(l10n.format("hello"), ("Hallo", []))
+        self.assertEqual(l10n.negotiate("ja"), ("de",))
+
+    def test_bad_default_locale(self):
+        self.assertRaises(ValueError, make_localization, default_locale="ja")
+
+    def test_format_fallback(self):
+        l10n = make_localization()
+        with l10n.activated("de-AT"):
+            self.assertEqual(l10n.format("hello"), ("Servus", []))
+            self.assertEqual(l10n.format("goodbye"), ("Auf Wiedersehen", []))
+            self.assertEqual(l10n.format("only-en"), ("English only", []))
+            self.assertRaises(LookupError, l10n.format, "missing")
+        self.assertEqual(l10n.format("hello"), ("Hello", []))
+
+    def test_format_for(self):
+        l10n = make_localization()
+        self.assertEqual(l10n.format_for("fr-FR", "hello"), ("Bonjour", []))
+        self.assertEqual(l10n.format_for("fr-FR", "goodbye"), ("Goodbye", []))
+
+    def test_has_message(self):
+        l10n = make_localization()
+        self.assertTrue(l10n.has_message("goodbye", "de-AT"))
+        self.assertTrue(l10n.has_message("only-en", "fr"))
+        self.assertFalse(l10n.has_message("missing"))
+        l10n = make_localization(default_locale="de")
+        self.assertFalse(l10n.has_message("only-en", "fr"))
+        self.assertFalse(l10n.has_message("only-en"))
+
+    def test_has_message_activated(self):
+        # Without accept_language, has_message uses the same locales as format
+        l10n = make_localization(default_locale="de")
+        self.assertFalse(l10n.has_message("only-en"))
+        with l10n.activated("fr-FR,en;q=0.5"):
+            self.assertTrue(l10n.has_message("only-en"))
+            self.assertEqual(l10n.format("only-en"), ("English only", []))
+            self.assertFalse(l10n.has_message("only-en", "de"))
+        self.assertFalse(l10n.has_message("only-en"))
+
+    def test_context_per_task(self):
+        l10n = make_localization()
+
+        async def handle_request(accept_language):
+            l10n.activate(accept_language)
+            await asyncio.sleep(0)
+            return l10n.format("hello")[0]
+
+        async def main():
+            return await asyncio.gather(handle_request("de-AT"), handle_request("fr"), handle_request("de"))
+
+        self.assertEqual(asyncio.run(main()), ["Servus", "Bonjour", "Hallo"])
+
+    def test_recompile(self):
+        l10n = make_localization()
+        en = l10n.bundles["en"]
+        de = l10n.bundles["de"]
+        self.assertEqual(l10n.format("hello"), ("Hello", []))
+        self.assertEqual(l10n.format_for("de", "goodbye"), ("Auf Wiedersehen", []))
+        with l10n.activated("de"):
+            de.recompile([FtlResource("hello = Hallo!")])
+            # The table activated before recompiling isn't used
+            self.assertEqual(l10n.format("hello"), ("Hallo!", []))
+            self.assertEqual(l10n.format("goodbye"), ("Goodbye", []))
+        en.recompile([FtlResource("hello = Hi there")])
+        self.assertEqual(en.format("hello"), ("Hi there", []))
+        self.assertEqual(l10n.format("hello"), ("Hi there", []))
+        self.assertEqual(l10n.format_for("en", "hello"), ("Hi there", []))
+        self.assertRaises(LookupError, l10n.format, "goodbye")
@@ -0,0 +1,55 @@
+import gc
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fluent_compiler import types
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.catalog import Catalog, write_catalog
+from fluent_compiler.compiler import compile_messages, get_babel_locale
+from fluent_compiler.preload import preload
+from fluent_compiler.resource import FtlResource
+
+from .utils import dedent_ftl
+
+FTL = dedent_ftl(
+    """
+    count = { $count }
+    message = You have { count }
+    other = { $other }
+    """
+)
+
+
+class TestPreload(unittest.TestCase):
+    def get_catalog_bundle(self, locale, fallbacks=None):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        filename = os.path.join(tempdir.name, "messages.ftlc")
+        write_catalog(filename, [compile_messages(locale, [FtlResource(FTL)])])
+        catalog = Catalog(filename)
+        self.addCleanup(catalog.close)
+        return catalog.get_bundle(locale, fallbacks=fallbacks)
+
+    def test_loads_catalog_messages(self):
+        fallback = self.get_catalog_bundle("en")
+        bundle = self.get_catalog_bundle("de", fallbacks=[fallback])
+        for b in [bundle, fallback]:
+            self.assertEqual(set(dict.keys(b._compiled_messages)), set())
+        preload([bundle], freeze=False)
+        for b in [bundle, fallback]:
+            self.assertEqual(set(dict.keys(b._compiled_messages)), {"count", "message", "other"})
+
+    def test_warms_formatter_cache(self):
+        bundle = FluentBundle.from_string("pl", "count = { $count }")
+        with mock.patch.dict(types._DECIMAL_FORMATTERS, clear=True):
+            preload([bundle], freeze=False)
+            self.assertIn(get_babel_locale("pl"), types._DECIMAL_FORMATTERS)
+
+    def test_freeze(self):
+        bundle = FluentBundle.from_string("en", "count = { $count }")
+        self.addCleanup(gc.unfreeze)
+        preload([bundle])
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertEqual(bundle.format("count", {"count": 1}), ("1", []))
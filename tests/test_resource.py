@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fluent_compiler import resource
+from fluent_compiler.resource import FileMetadata, FtlResource
+
+
+class TestFtlResource(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def write(self, name, text):
+        filename = os.path.join(self.tmp_dir.name, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+        return filename
+
+    def test_from_file_metadata(self):
+        filename = self.write("main.ftl", "foo = Föö")
+        r = FtlResource.from_file(filename)
+        self.assertEqual(r.text, "foo = Föö")
+        self.assertEqual(r.filename, filename)
+        stat = os.stat(filename)
+        self.assertEqual(r.metadata, FileMetadata(size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+        # Metadata doesn't affect equality
+        self.assertEqual(r, FtlResource("foo = Föö", filename=filename))
+
+    def test_from_file_mmap(self):
+        filename = self.write("main.ftl", "foo = Föö\n" * 100)
+        with mock.patch.object(resource, "MMAP_THRESHOLD", 10):
+            self.assertEqual(FtlResource.from_file(filename).text, "foo = Föö\n" * 100)
+
+    def test_from_file_empty(self):
+        filename = self.write("main.ftl", "")
+        with mock.patch.object(resource, "MMAP_THRESHOLD", 0):
+            self.assertEqual(FtlResource.from_file(filename).text, "")
+
+    def test_position(self):
+        r = FtlResource("foo = Foo\n\nbar = Bar\n")
+        self.assertEqual(r.position(0), (1, 1))
+        self.assertEqual(r.position(6), (1, 7))
+        self.assertEqual(r.position(9), (1, 10))
+        self.assertEqual(r.position(10), (2, 1))
+        self.assertEqual(r.position(17), (3, 7))
+        self.assertEqual(r.position(21), (4, 1))
+
+    def test_from_directory(self):
+        self.write("b.ftl", "b = B")
+        self.write("a/z.ftl", "z = Z")
+        self.write("a/y.ftl", "y = Y")
+        self.write("a/x.txt", "x = X")
+        resources = FtlResource.from_directory(self.tmp_dir.name)
+        self.assertEqual([r.text for r in resources], ["y = Y", "z = Z", "b = B"])
+        self.assertTrue(all(r.metadata is not None for r in resources))
+
+    def test_from_directory_pattern(self):
+        self.write("b.ftl", "b = B")
+        self.write("a/z.ftl", "z = Z")
+        resources = FtlResource.from_directory(self.tmp_dir.name, pattern="*.ftl")
+        self.assertEqual([r.text for r in resources], ["b = B"])
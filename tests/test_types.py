@@ -5,8 +5,17 @@ from decimal import Decimal
 
 import pytz
 from babel import Locale
+from babel.localedata import locale_identifiers
+from babel.numbers import format_currency
 
-from fluent_compiler.types import FluentDateType, FluentNumber, fluent_date, fluent_number
+from fluent_compiler.types import (
+    FluentDateType,
+    FluentNumber,
+    fluent_date,
+    fluent_number,
+    get_currency_formatter,
+    get_decimal_formatter,
+)
 
 
 def currency(amount, *args, **kwargs):
@@ -187,6 +196,98 @@ class TestFluentNumber(unittest.TestCase):
         self.assertEqual(FluentNumber.default_number_format_options.style, "decimal")
 
 
+class TestDecimalFormatter(unittest.TestCase):
+    numbers = [
+        0,
+        1,
+        -1,
+        12,
+        999,
+        1000,
+        -1234,
+        123456,
+        1234567,
+        -123456789,
+        10**20,
+        0.0,
+        -0.0,
+        0.5,
+        -0.0004,
+        1.0005,
+        1.0015,
+        2.5,
+        12.3456,
+        999.9996,
+        -1234.5,
+        123456.78,
+        1234567.891,
+        0.1 + 0.2,
+        1e15,
+        1.5e-7,
+        1e16,
+        float("inf"),
+        float("nan"),
+    ]
+
+    def test_matches_babel_for_all_locales(self):
+        for locale_id in locale_identifiers():
+            locale = Locale.parse(locale_id)
+            pattern = locale.decimal_formats.get(None)
+            for number in self.numbers:
+                # Compare against a direct call to babel:
+                expected = pattern.apply(number, locale)
+                self.assertEqual(fluent_number(number).format(locale), expected, f"{locale_id}: {number!r}")
+
+    def test_formatter_cached(self):
+        locale = Locale.parse("en_US")
+        self.assertIs(get_decimal_formatter(locale), get_decimal_formatter(Locale.parse("en_US")))
+
+    def test_indian_grouping(self):
+        self.assertEqual(fluent_number(123456789).format(Locale.parse("hi_IN")), "12,34,56,789")
+
+    def test_non_default_options_use_babel(self):
+        locale = Locale.parse("en_US")
+        self.assertEqual(fluent_number(1234567, useGrouping=False).format(locale), "1234567")
+        self.assertEqual(fluent_number(1.5, minimumFractionDigits=2).format(locale), "1.50")
+        self.assertEqual(fluent_number(Decimal("1234.5")).format(locale), "1,234.5")
+
+
+class TestCurrencyFormatter(unittest.TestCase):
+    numbers = [0, 1, 2, 5, -3, 21, 1234.5, -123456.78]
+
+    def test_matches_babel_for_all_locales(self):
+        for locale_id in locale_identifiers():
+            locale = Locale.parse(locale_id)
+            for currency_code in ["USD", "JPY"]:
+                for number in self.numbers:
+                    self.assertEqual(
+                        fluent_number(number, style="currency", currency=currency_code).format(locale),
+                        format_currency(number, currency_code, locale=locale, currency_digits=False),
+                        f"{locale_id}: {number!r} {currency_code}",
+                    )
+                    self.assertEqual(
+                        fluent_number(number, style="currency", currency=currency_code, currencyDisplay="name").format(
+                            locale
+                        ),
+                        format_currency(number, currency_code, locale=locale, format_type="name"),
+                        f"{locale_id}: {number!r} {currency_code}",
+                    )
+
+    def test_formatter_cached(self):
+        locale = Locale.parse("en_US")
+        self.assertIs(get_currency_formatter(locale, "USD", "name"), get_currency_formatter(locale, "USD", "name"))
+        self.assertIsNot(get_currency_formatter(locale, "USD", "name"), get_currency_formatter(locale, "USD", "code"))
+
+    def test_currency_display_name_plural_categories(self):
+        locale = Locale.parse("en_US")
+        self.assertEqual(currency(1, currencyDisplay="name").format(locale), "1.00 US dollar")
+        self.assertEqual(currency(2, currencyDisplay="name").format(locale), "2.00 US dollars")
+        pl = Locale.parse("pl_PL")
+        self.assertEqual(currency(1, currencyDisplay="name").format(pl), "1,00 dolar amerykański")
+        self.assertEqual(currency(2, currencyDisplay="name").format(pl), "2,00 dolary amerykańskie")
+        self.assertEqual(currency(5, currencyDisplay="name").format(pl), "5,00 dolarów amerykańskich")
+
+
 class TestFluentDate(unittest.TestCase):
     locale = Locale.parse("en_US")
 
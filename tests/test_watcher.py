@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.compiler import compile_messages
+from fluent_compiler.resource import FtlResource
+from fluent_compiler.watcher import BundleWatcher
+
+
+class TestBundleWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.mtime = time.time() - 100
+
+    def write(self, name, text):
+        filename = os.path.join(self.tmp_dir.name, name)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+        # Make sure the mtime changes, even on file systems with coarse timestamps
+        self.mtime += 1
+        os.utime(filename, (self.mtime, self.mtime))
+        return filename
+
+    def test_reload(self):
+        main = self.write("main.ftl", "foo = Foo")
+        other = self.write("other.ftl", "bar = Bar")
+        bundle = FluentBundle.from_files("en", [main, other])
+        events = []
+        watcher = BundleWatcher([bundle], on_reload=events.append)
+        self.assertEqual(watcher.check(), [])
+
+        self.write("main.ftl", "foo = New Foo")
+        [event] = watcher.check()
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+        self.assertEqual(bundle.format("bar"), ("Bar", []))
+        self.assertIs(event.bundle, bundle)
+        self.assertEqual(event.filenames, [main])
+        self.assertGreaterEqual(event.latency, 0)
+        self.assertEqual(events, [event])
+        self.assertIs(watcher.last_reload, event)
+
+        # No more changes
+        self.assertEqual(watcher.check(), [])
+
+    def test_touched_but_unchanged(self):
+        main = self.write("main.ftl", "foo = Foo")
+        bundle = FluentBundle.from_files("en", [main])
+        watcher = BundleWatcher([bundle])
+        self.write("main.ftl", "foo = Foo")
+        self.assertEqual(watcher.check(), [])
+        # The file is only read again if it changes again.
+        with mock.patch("fluent_compiler.watcher.FtlResource.from_file") as from_file:
+            self.assertEqual(watcher.check(), [])
+        from_file.assert_not_called()
+
+    def test_missing_file(self):
+        main = self.write("main.ftl", "foo = Foo")
+        bundle = FluentBundle.from_files("en", [main])
+        watcher = BundleWatcher([bundle])
+        os.remove(main)
+        self.assertEqual(watcher.check(), [])
+        self.assertEqual(bundle.format("foo"), ("Foo", []))
+        self.write("main.ftl", "foo = New Foo")
+        self.assertEqual(len(watcher.check()), 1)
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+
+    def test_fallback_dependents_recompiled(self):
+        en_file = self.write("en.ftl", "foo = Foo")
+        en = FluentBundle.from_files("en", [en_file])
+        de = FluentBundle.from_string("de", "bar = { foo }", fallbacks=[en])
+        watcher = BundleWatcher([de, en])
+        self.write("en.ftl", "foo = New Foo")
+        events = watcher.check()
+        self.assertEqual([event.bundle for event in events], [en, de])
+        self.assertEqual(events[1].filenames, [])
+        self.assertEqual(de.format("bar"), ("New Foo", []))
+
+    def test_bundles_without_resources(self):
+        en_file = self.write("en.ftl", "foo = Foo")
+        en = FluentBundle.from_files("en", [en_file])
+        compiled = FluentBundle.from_compiled_ftl(compile_messages("de", [FtlResource("bar = Bar")]), fallbacks=[en])
+        watcher = BundleWatcher([compiled, en])
+        self.assertEqual(watcher.bundles, [en])
+        self.write("en.ftl", "foo = New Foo")
+        self.assertEqual([event.bundle for event in watcher.check()], [en])
+
+    def test_background_thread(self):
+        main = self.write("main.ftl", "foo = Foo")
+        bundle = FluentBundle.from_files("en", [main])
+        watcher = BundleWatcher([bundle], interval=0.01)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        self.assertRaises(RuntimeError, watcher.start)
+        self.write("main.ftl", "foo = New Foo")
+        for i in range(500):
+            if watcher.last_reload is not None:
+                break
+            time.sleep(0.01)
+        watcher.stop()
+        self.assertEqual(bundle.format("foo"), ("New Foo", []))
+
+    def test_background_thread_errors(self):
+        main = self.write("main.ftl", "foo = Foo")
+        bundle = FluentBundle.from_files("en", [main])
+        events = []
+
+        def on_reload(event):
+            events.append(event)
+            if len(events) == 1:
+                raise ValueError("Broken callback")
+
+        watcher = BundleWatcher([bundle], interval=0.01, on_reload=on_reload)
+        with self.assertLogs("fluent_compiler.watcher") as logs:
+            watcher.start()
+            self.addCleanup(watcher.stop)
+            self.write("main.ftl", "foo = New Foo")
+            for i in range(500):
+                if events:
+                    break
+                time.sleep(0.01)
+            # Still watching after the error
+            self.write("main.ftl", "foo = Newer Foo")
+            for i in range(500):
+                if len(events) > 1:
+                    break
+                time.sleep(0.01)
+            watcher.stop()
+        self.assertEqual(bundle.format("foo"), ("Newer Foo", []))
+        self.assertIn("Broken callback", logs.output[0])
+
+    def test_check_raises_errors(self):
+        main = self.write("main.ftl", "foo = Foo")
+        bundle = FluentBundle.from_files("en", [main])
+        watcher = BundleWatcher([bundle])
+        self.write("main.ftl", "foo = New Foo")
+        with mock.patch.object(bundle, "recompile", side_effect=ValueError("Broken")):
+            self.assertRaises(ValueError, watcher.check)
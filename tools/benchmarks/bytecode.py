@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+# Regression checks for the size and shape of the generated code.
+#
+# Runtime speed comes down to the code that codegen emits, so this compiles a
+# reference corpus and records, for each message, the number of bytecode
+# instructions, calls to runtime helpers and other messages, f-string joins,
+# the sizes of co_consts and co_names, and the simplifier rules that were
+# applied. These are compared against a stored baseline, and differences are
+# reported grouped by the optimizations that changed.
+#
+#     $ ./bytecode.py             # report differences from the baseline
+#     $ ./bytecode.py --update    # save the current output as the new baseline
+#
+# It can also be run using py.test, and fails if anything differs from the
+# baseline. Bytecode varies between Python versions, so the baseline records
+# the version it was made with, and the comparison is skipped for others.
+
+import argparse
+import builtins
+import dis
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+import markupsafe
+import pytest
+from generate_ftl_file import Config, generate_texts, made_up_words
+
+from fluent_compiler.compiler import compile_messages
+from fluent_compiler.resource import FtlResource
+
+this_file = os.path.abspath(__file__)
+this_dir = os.path.dirname(this_file)
+
+BASELINE_FILE = os.path.join(this_dir, "bytecode_baseline.json")
+
+# Messages that exercise the simplifier rules and the different ways of
+# joining strings.
+REFERENCE_FTL = """
+plain = Just some text
+interpolation = Hello { $name }
+two-interpolations = Hello { $name }, you have { $count } messages
+nested-number = { NUMBER(NUMBER($count)) }
+nested-number-kwargs = { NUMBER(NUMBER($count), minimumFractionDigits: 2) }
+number-kwarg-literal = { NUMBER($count, minimumIntegerDigits: 3) }
+number-comparison = { $count ->
+    [0] None
+    [1] One
+   *[other] { $count }
+ }
+plural = { $count ->
+    [one] One thing
+   *[other] { $count } things
+ }
+datetime = { DATETIME($date, hour12: 1) }
+missing-message = { does-not-exist }
+
+-brand = { $case ->
+    [genitive] Firefoxa
+   *[nominative] Firefox
+ }
+term = Welcome to { -brand(case: "genitive") }
+message-reference = { plain } { interpolation }
+attributes = Login
+    .title = Log in, { $name }
+
+static-html = <b>Bold</b> text
+interpolation-html = <b>Hello</b> { $name }
+joined-html = { static-html } <i>and</i> { static-html }
+"""
+
+GENERATED_CONFIG = Config(filename="generated.ftl", num_items=200, num_files=2, seed=0)
+
+METRICS = ["instructions", "helper_calls", "message_calls", "fstring_joins", "consts", "names"]
+
+
+def make_html_escaper():
+    return SimpleNamespace(
+        select=lambda message_id=None, **kwargs: message_id.endswith("-html"),
+        output_type=markupsafe.Markup,
+        mark_escaped=markupsafe.Markup,
+        escape=markupsafe.escape,
+        join=markupsafe.Markup("").join,
+        name="html_escaper",
+        use_isolating=False,
+    )
+
+
+def reference_resources():
+    # Not `load_words`, which uses the system dictionary if there is one, so
+    # the corpus would depend on the machine.
+    return [FtlResource(REFERENCE_FTL)] + [
+        FtlResource(text) for text in generate_texts(GENERATED_CONFIG, made_up_words())
+    ]
+
+
+def message_shape(func, message_function_names, rule_hits):
+    """
+    Returns a dictionary describing the generated code for a message function
+    """
+    instructions = list(dis.get_instructions(func))
+    helper_calls = Counter()
+    message_calls = 0
+    for instruction in instructions:
+        if instruction.opname != "LOAD_GLOBAL":
+            continue
+        # From Python 3.11, the low bit of the arg is set if the global is
+        # loaded to be called. Before that, count every load.
+        if sys.version_info >= (3, 11) and not instruction.arg & 1:
+            continue
+        name = instruction.argval
+        if name in message_function_names:
+            message_calls += 1
+        elif callable(func.__globals__.get(name, getattr(builtins, name, None))):
+            helper_calls[name] += 1
+    return {
+        "instructions": len(instructions),
+        "helper_calls": dict(sorted(helper_calls.items())),
+        "message_calls": message_calls,
+        "fstring_joins": sum(1 for instruction in instructions if instruction.opname == "BUILD_STRING"),
+        "consts": len(func.__code__.co_consts),
+        "names": len(func.__code__.co_names),
+        "rules": dict(sorted(rule_hits.items())),
+    }
+
+
+def collect():
+    """
+    Compiles the reference corpus, and returns a dictionary of message IDs to
+    message shapes.
+    """
+    compiled = compile_messages("en", reference_resources(), escapers=[make_html_escaper()])
+    message_function_names = {func.__name__ for func in compiled.message_functions.values()}
+    return {
+        msg_id: message_shape(func, message_function_names, compiled.stats.message_rule_hits.get(msg_id, {}))
+        for msg_id, func in sorted(compiled.message_functions.items())
+    }
+
+
+def python_version():
+    return f"{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def load_baseline(filename=BASELINE_FILE):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_baseline(messages, filename=BASELINE_FILE):
+    with open(filename, "w") as f:
+        json.dump({"python": python_version(), "messages": messages}, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def optimizations(shape):
+    """
+    Returns a Counter of the optimizations used for a message, i.e. simplifier
+    rules and join strategies.
+    """
+    result = Counter(shape["rules"])
+    if shape["fstring_joins"]:
+        result["fstring_join"] = shape["fstring_joins"]
+    for name, count in shape["helper_calls"].items():
+        if name.endswith("__join"):
+            result["escaper_join"] += count
+    return result
+
+
+def compare(old_messages, new_messages):
+    """
+    Returns a list of lines describing the differences between two sets of
+    message shapes. The list is empty if there are no differences.
+    """
+    lines = []
+    removed = sorted(set(old_messages) - set(new_messages))
+    added = sorted(set(new_messages) - set(old_messages))
+    if removed:
+        lines.append(f"Removed messages: {', '.join(removed)}")
+    if added:
+        lines.append(f"Added messages: {', '.join(added)}")
+
+    # Changed message IDs, grouped by the optimizations that differ
+    by_optimization = defaultdict(list)
+    for msg_id in sorted(set(old_messages) & set(new_messages)):
+        old, new = old_messages[msg_id], new_messages[msg_id]
+        if old == new:
+            continue
+        lines.append(f"{msg_id}:")
+        for metric in METRICS + ["rules"]:
+            if old[metric] != new[metric]:
+                lines.append(f"    {metric}: {old[metric]} -> {new[metric]}")
+        old_optimizations, new_optimizations = optimizations(old), optimizations(new)
+        changed = sorted(
+            name
+            for name in set(old_optimizations) | set(new_optimizations)
+            if old_optimizations[name] != new_optimizations[name]
+        )
+        for name in changed or ["(other code generation changes)"]:
+            by_optimization[name].append(msg_id)
+
+    if by_optimization:
+        lines.append("")
+        lines.append("Changed messages by optimization:")
+        for name, msg_ids in sorted(by_optimization.items()):
+            lines.append(f"    {name}: {', '.join(msg_ids)}")
+
+    common = set(old_messages) & set(new_messages)
+    if lines and common:
+        lines.append("")
+        for metric in ["instructions", "consts", "names"]:
+            old_total = sum(old_messages[msg_id][metric] for msg_id in common)
+            new_total = sum(new_messages[msg_id][metric] for msg_id in common)
+            lines.append(f"Total {metric}: {old_total} -> {new_total} ({new_total - old_total:+d})")
+    return lines
+
+
+def test_bytecode_matches_baseline():
+    baseline = load_baseline()
+    if baseline["python"] != python_version():
+        pytest.skip(f"Baseline was made with {baseline['python']}")
+    differences = compare(baseline["messages"], collect())
+    assert not differences, "\n".join(["Generated code differs from baseline:"] + differences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the shape of generated code against a baseline")
+    parser.add_argument("--update", action="store_true", help="Save the current output as the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file")
+    args = parser.parse_args()
+
+    messages = collect()
+    if args.update:
+        save_baseline(messages, args.baseline)
+        print(f"Saved {len(messages)} messages to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline["python"] != python_version():
+        print(
+            f"Baseline was made with {baseline['python']}, not {python_version()}, "
+            "so instruction counts may differ for reasons unrelated to fluent_compiler."
+        )
+    differences = compare(baseline["messages"], messages)
+    if not differences:
+        print(f"No differences in {len(messages)} messages")
+        return
+    print("\n".join(differences))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
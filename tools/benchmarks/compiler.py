@@ -4,9 +4,15 @@
 
 # This should be run using pytest, see end of file
 
+import functools
+import gc
 import os
 import subprocess
 import sys
+import time
+
+import pytest
+from generate_ftl_file import Config, generate_texts, load_words
 
 from fluent_compiler.compiler import compile_messages
 from fluent_compiler.resource import FtlResource
@@ -14,6 +20,21 @@ from fluent_compiler.resource import FtlResource
 this_file = os.path.abspath(__file__)
 this_dir = os.path.dirname(this_file)
 
+# Sizes of generated corpora for the scaling tests, in number of items.
+SCALING_SIZES = [1_000, 10_000, 50_000, 100_000]
+# Items per generated file
+SCALING_ITEMS_PER_FILE = 5_000
+# Corpus size that the largest corpus is compared with in
+# test_linear_scaling. Smaller corpora are dominated by fixed costs.
+SCALING_BASE_SIZE = 10_000
+# Number of times each corpus is compiled in test_linear_scaling, taking the
+# fastest.
+SCALING_REPEATS = 3
+# Maximum allowed ratio of compile time per item between the largest corpus
+# and SCALING_BASE_SIZE. Compilation should be roughly linear in the number
+# of items, so anything much above 1 indicates something quadratic.
+MAX_SCALING_RATIO = 2.0
+
 
 def test_simple_message(benchmark):
     resources = [FtlResource("single-string-literal = Hello I am a single string literal")]
@@ -56,6 +77,109 @@ my-message = { NUMBER($count) ->
     benchmark(lambda: compile_messages("en", resources))
 
 
+def test_1000_tiny_bundles(benchmark):
+    # Many small bundles, e.g. per-tenant customizations, where fixed
+    # per-compilation overhead dominates.
+    locales = ["en", "de", "fr", "pl", "ru"]
+    resources = [
+        [
+            FtlResource(
+                f"""
+welcome = Welcome to tenant {i}, {{ $name }}!
+items = {{ $count ->
+    [one] One item
+   *[other] {{ $count }} items
+ }}
+"""
+            )
+        ]
+        for i in range(0, 1000)
+    ]
+
+    def upper(text):
+        return text.upper()
+
+    def compile_all():
+        for i, tenant_resources in enumerate(resources):
+            compile_messages(locales[i % len(locales)], tenant_resources, functions={"UPPER": upper})
+
+    benchmark(compile_all)
+
+
+def test_widely_used_term(benchmark):
+    # A large term, with a select that can't be resolved at compile time, used
+    # by many messages. Without `term_inline_threshold`, this is inlined into
+    # every message.
+    variants = "\n".join(f"    [v{i}] Variant {i} of {{ -brand }} for {{ PLATFORM() }}" for i in range(10))
+    resources = [
+        FtlResource(
+            f"""
+-brand = {{ PLATFORM() ->
+    [windows] Brand for Windows
+   *[other] Brand
+ }}
+-term = {{ PLATFORM() ->
+{variants}
+   *[other] Other
+ }}
+"""
+            + "\n".join(f"message-{i} = Message {i} uses {{ -term }}" for i in range(500))
+        )
+    ]
+
+    def platform():
+        return "linux"
+
+    benchmark(lambda: compile_messages("en", resources, functions={"PLATFORM": platform}))
+
+
+@functools.lru_cache
+def generated_resources(num_items):
+    config = Config(
+        filename="generated.ftl",
+        num_items=num_items,
+        num_files=max(1, num_items // SCALING_ITEMS_PER_FILE),
+    )
+    return [FtlResource(text) for text in generate_texts(config, load_words())]
+
+
+@pytest.mark.parametrize("num_items", SCALING_SIZES)
+def test_generated_corpus(benchmark, num_items):
+    # Corpora with terms, parameterized terms, attributes, selects, nested
+    # placeables and cross-message references, split over multiple files.
+    resources = generated_resources(num_items)
+    benchmark.group = "generated-corpus"
+    benchmark.pedantic(lambda: compile_messages("en", resources), rounds=1, warmup_rounds=0)
+
+
+def min_compile_time(resources):
+    """
+    Returns the fastest of SCALING_REPEATS compilations of `resources`, with
+    the garbage collector disabled while timing.
+    """
+    times = []
+    for _ in range(SCALING_REPEATS):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            compiled = compile_messages("en", resources)
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+        assert compiled.errors == []
+    return min(times)
+
+
+def test_linear_scaling():
+    times_per_item = {}
+    for num_items in [SCALING_BASE_SIZE, SCALING_SIZES[-1]]:
+        times_per_item[num_items] = min_compile_time(generated_resources(num_items)) / num_items
+
+    base, largest = times_per_item[SCALING_BASE_SIZE], times_per_item[SCALING_SIZES[-1]]
+    assert largest < base * MAX_SCALING_RATIO, times_per_item
+
+
 if __name__ == "__main__":
     # You can execute this file directly, and optionally add more py.test args
     # to the command line (e.g. -k for keyword matching certain tests).
@@ -1,9 +1,30 @@
 import argparse
+import os
 import random
 
 import attrs
 from fluent.syntax import serialize
-from fluent.syntax.ast import Comment, Identifier, Message, Pattern, Placeable, Resource, TextElement, VariableReference
+from fluent.syntax.ast import (
+    Attribute,
+    CallArguments,
+    Comment,
+    Identifier,
+    Message,
+    MessageReference,
+    NamedArgument,
+    Pattern,
+    Placeable,
+    Resource,
+    SelectExpression,
+    StringLiteral,
+    Term,
+    TermReference,
+    TextElement,
+    VariableReference,
+    Variant,
+)
+
+WORDS_FILE = "/usr/share/dict/words"
 
 
 @attrs.frozen
@@ -13,6 +34,7 @@ class ItemRatios:
     """
 
     message: int
+    term: int
     comment: int
 
 
@@ -28,21 +50,47 @@ class ElementCountRatios:
     four: int
 
 
+@attrs.frozen
+class PlaceableRatios:
+    """
+    Represent the ratios of the different kinds of placeable within a pattern
+    """
+
+    variable: int
+    select: int
+    message_reference: int
+    term_reference: int
+    parameterized_term_reference: int
+    nested: int
+
+
 @attrs.frozen
 class Config:
     filename: str
     num_items: int
+    num_files: int = 1
+    seed: int = 0
 
     # Controls for the random generation of various elements
-    item_ratios: ItemRatios = ItemRatios(message=40, comment=1)
+    item_ratios: ItemRatios = ItemRatios(message=40, term=2, comment=1)
     element_ratios: ElementCountRatios = ElementCountRatios(one=400, two=10, three=10, four=1)
+    placeable_ratios: PlaceableRatios = PlaceableRatios(
+        variable=20,
+        select=5,
+        message_reference=3,
+        term_reference=5,
+        parameterized_term_reference=2,
+        nested=1,
+    )
+    # Percentage of messages that have attributes
+    attribute_percent: int = 10
 
 
 def parse_config() -> Config:
     parser = argparse.ArgumentParser(description="Generate a sample ftl file")
     parser.add_argument(
         "filename",
-        help="Filename for the generated file",
+        help="Filename for the generated file. With --num-files, a number is added to the name of each file",
     )
     parser.add_argument(
         "-n",
@@ -51,39 +99,145 @@ def parse_config() -> Config:
         help="The number of items in the generated file",
         default=100,
     )
+    parser.add_argument(
+        "-f",
+        "--num-files",
+        type=int,
+        help="The number of files to split the items between",
+        default=1,
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        help="Seed for the random number generator",
+        default=0,
+    )
     return Config(**parser.parse_args().__dict__)
 
 
 def generate_file(config: Config) -> None:
-    with open("/usr/share/dict/words") as dictionary_file:
-        all_words = [line.strip() for line in dictionary_file.readlines()]
+    texts = generate_texts(config, load_words())
+    if len(texts) == 1:
+        filenames = [config.filename]
+    else:
+        stem, ext = os.path.splitext(config.filename)
+        filenames = [f"{stem}_{i}{ext}" for i in range(len(texts))]
+    for filename, text in zip(filenames, texts):
+        with open(filename, "w") as outfile:
+            outfile.write(text)
+
+
+def load_words() -> list[str]:
+    """
+    Returns a list of words from the system dictionary, or made up words if
+    that isn't available.
+    """
+    try:
+        with open(WORDS_FILE) as dictionary_file:
+            return [line.strip() for line in dictionary_file.readlines() if line.strip().isalpha()]
+    except FileNotFoundError:
+        return made_up_words()
 
-    with open(config.filename, "w") as outfile:
-        outfile.write(serialize(_generate_resource(config, all_words)))
 
+def made_up_words() -> list[str]:
+    """
+    Returns a list of made up words, which is the same on every machine.
+    """
+    rng = random.Random(0)
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    return ["".join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(20000)]
 
-def _generate_resource(config: Config, words: list[str]) -> Resource:
-    body = []
 
-    generators = (_generate_message, _generate_comment)
-    weights = (config.item_ratios.message, config.item_ratios.comment)
+def generate_texts(config: Config, words: list[str]) -> list[str]:
+    """
+    Returns the FTL text for each of the files
+    """
+    random.seed(config.seed)
+    return [serialize(resource) for resource in _generate_resources(config, words)]
 
-    for _ in range(config.num_items):
-        (generator,) = random.choices(generators, weights)
-        body.append(generator(config, words))
 
-    return Resource(body=body)
+@attrs.define
+class _State:
+    # IDs of the messages and terms generated so far, which can be referenced
+    # by later items. Only referencing earlier items avoids cycles.
+    used_ids: set[str] = attrs.Factory(set)
+    message_ids: list[str] = attrs.Factory(list)
+    term_ids: list[str] = attrs.Factory(list)
+    parameterized_term_ids: list[str] = attrs.Factory(list)
 
 
-def _generate_message(config: Config, words: list[str]) -> Message:
-    id = _generate_identifier(words, joiner="-", elements=4)
-    return Message(
+def _generate_resources(config: Config, words: list[str]) -> list[Resource]:
+    state = _State()
+    bodies = [[] for _ in range(config.num_files)]
+
+    generators = (_generate_message, _generate_term, _generate_comment)
+    weights = (config.item_ratios.message, config.item_ratios.term, config.item_ratios.comment)
+
+    for i in range(config.num_items):
+        (generator,) = random.choices(generators, weights)
+        # Split into contiguous chunks, so that references are mostly, but
+        # not always, to items in the same file.
+        bodies[i * config.num_files // config.num_items].append(generator(config, words, state))
+
+    return [Resource(body=body) for body in bodies]
+
+
+def _generate_message(config: Config, words: list[str], state: _State) -> Message:
+    id = _generate_unique_identifier(words, state, prefix="", elements=4)
+    attributes = []
+    if random.randrange(100) < config.attribute_percent:
+        attributes = [
+            Attribute(
+                id=_generate_identifier(words, joiner="-", elements=1), value=_generate_pattern(config, words, state)
+            )
+            for _ in range(random.randint(1, 3))
+        ]
+    message = Message(
         id=id,
-        value=_generate_pattern(config, words),
+        value=_generate_pattern(config, words, state),
+        attributes=attributes,
     )
+    state.message_ids.append(id.name)
+    return message
+
+
+def _generate_term(config: Config, words: list[str], state: _State) -> Term:
+    """
+    Generate a term, which may be parameterized, of the form:
 
+    -some-brand = Foo
 
-def _generate_comment(config: Config, words: list[str]) -> Comment:
+    -other-brand = { $case ->
+        [genitive] Foos
+       *[nominative] Foo
+     }
+    """
+    id = _generate_unique_identifier(words, state, prefix="-", elements=2)
+    if random.randrange(2):
+        value = Pattern(
+            elements=[
+                Placeable(
+                    expression=SelectExpression(
+                        selector=VariableReference(id=Identifier("case")),
+                        variants=[
+                            Variant(
+                                key=Identifier(case), value=_generate_text_pattern(words), default=case == "nominative"
+                            )
+                            for case in ["genitive", "nominative"]
+                        ],
+                    )
+                )
+            ]
+        )
+        state.parameterized_term_ids.append(id.name)
+    else:
+        value = _generate_text_pattern(words)
+    state.term_ids.append(id.name)
+    return Term(id=id, value=value)
+
+
+def _generate_comment(config: Config, words: list[str], state: _State) -> Comment:
     """
     Generate a random comment, of the form:
 
@@ -101,7 +255,15 @@ def _generate_identifier(words: list[str], joiner: str, elements: int) -> Identi
     return Identifier(name=joiner.join(random.choices(words, k=elements)))
 
 
-def _generate_pattern(config: Config, words: list[str]) -> Pattern:
+def _generate_unique_identifier(words: list[str], state: _State, prefix: str, elements: int) -> Identifier:
+    while True:
+        id = _generate_identifier(words, joiner="-", elements=elements)
+        if prefix + id.name not in state.used_ids:
+            state.used_ids.add(prefix + id.name)
+            return id
+
+
+def _generate_pattern(config: Config, words: list[str], state: _State) -> Pattern:
     """
     Generate a pattern, which is a sequence of elements of the form:
 
@@ -119,13 +281,17 @@ def _generate_pattern(config: Config, words: list[str]) -> Pattern:
     elements = []
     for i in range(num_elements):
         if i % 2:
-            elements.append(_generate_placeable(words))
+            elements.append(_generate_placeable(config, words, state))
         else:
             elements.append(_generate_text_element(words))
 
     return Pattern(elements=elements)
 
 
+def _generate_text_pattern(words: list[str]) -> Pattern:
+    return Pattern(elements=[_generate_text_element(words)])
+
+
 def _generate_text_element(words: list[str]) -> TextElement:
     """
     Generate a random text element, of the form:
@@ -135,10 +301,68 @@ def _generate_text_element(words: list[str]) -> TextElement:
     return TextElement(value=" ".join(random.choices(words, k=random.randint(1, 10))))
 
 
-def _generate_placeable(words: list[str]) -> Placeable:
+def _generate_placeable(config: Config, words: list[str], state: _State) -> Placeable:
+    ratios = config.placeable_ratios
+    (kind,) = random.choices(
+        ("variable", "select", "message_reference", "term_reference", "parameterized_term_reference", "nested"),
+        weights=(
+            ratios.variable,
+            ratios.select,
+            ratios.message_reference if state.message_ids else 0,
+            ratios.term_reference if state.term_ids else 0,
+            ratios.parameterized_term_reference if state.parameterized_term_ids else 0,
+            ratios.nested,
+        ),
+    )
+    if kind == "select":
+        return Placeable(expression=_generate_select_expression(words))
+    if kind == "message_reference":
+        return Placeable(expression=MessageReference(id=Identifier(random.choice(state.message_ids))))
+    if kind == "term_reference":
+        return Placeable(expression=TermReference(id=Identifier(random.choice(state.term_ids))))
+    if kind == "parameterized_term_reference":
+        return Placeable(
+            expression=TermReference(
+                id=Identifier(random.choice(state.parameterized_term_ids)),
+                arguments=CallArguments(
+                    named=[NamedArgument(name=Identifier("case"), value=StringLiteral("genitive"))]
+                ),
+            )
+        )
+    if kind == "nested":
+        return Placeable(expression=Placeable(expression=_generate_variable_reference(words)))
     return Placeable(expression=_generate_variable_reference(words))
 
 
+def _generate_select_expression(words: list[str]) -> SelectExpression:
+    """
+    Generate a select expression on plural categories, of the form:
+
+    { $some_variable ->
+        [one] some words
+       *[other] some { $some_variable } words
+     }
+    """
+    selector = _generate_variable_reference(words)
+    keys = ["zero", "one", "two", "few", "many"][: random.randint(1, 5)] + ["other"]
+    return SelectExpression(
+        selector=selector,
+        variants=[
+            Variant(
+                key=Identifier(key),
+                value=Pattern(
+                    elements=[
+                        _generate_text_element(words),
+                        Placeable(expression=VariableReference(id=Identifier(selector.id.name))),
+                    ]
+                ),
+                default=key == "other",
+            )
+            for key in keys
+        ],
+    )
+
+
 def _generate_variable_reference(words: list[str]) -> VariableReference:
     """
     Generate a variable reference, of the form:
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# Benchmark for the memory that forked worker processes share with their
+# parent, with and without `fluent_compiler.preload.preload`.
+#
+# The parent compiles bundles for a generated corpus in several locales, and
+# then forks workers, as gunicorn does with `preload_app`. Each worker formats
+# every message once and runs the garbage collector, and then reports its
+# private memory (pages that are no longer shared with the parent), from
+# /proc/self/smaps_rollup, so this only works on Linux.
+#
+# Each mode is run in a fresh interpreter, since `gc.freeze()` affects the
+# whole process. Run it directly:
+#
+#     $ ./preload.py
+#     $ ./preload.py --items 20000 --workers 8
+#
+# or using py.test, which runs a smaller check that preloading helps.
+
+import argparse
+import gc
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+from generate_ftl_file import Config, generate_texts, load_words
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.preload import preload
+from fluent_compiler.resource import FtlResource
+
+this_file = os.path.abspath(__file__)
+this_dir = os.path.dirname(this_file)
+
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+LOCALES = ["en", "de", "fr", "pl", "ru"]
+MODES = ["plain", "preload"]
+
+
+def make_bundles(num_items):
+    config = Config(filename="generated.ftl", num_items=num_items)
+    resources = [FtlResource(text) for text in generate_texts(config, load_words())]
+    return [FluentBundle(locale, resources) for locale in LOCALES]
+
+
+def private_memory_kb():
+    """
+    Returns the size of the pages that this process does not share with any
+    other process, in kB.
+    """
+    total = 0
+    with open(SMAPS_ROLLUP) as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def work(bundles):
+    for bundle in bundles:
+        for msg_id in bundle._compiled_messages:
+            bundle.format(msg_id, {})
+    gc.collect()
+
+
+def run_workers(bundles, worker_count):
+    """
+    Forks `worker_count` workers that each call `work`, returning a list of
+    their private memory in kB.
+    """
+    pipes = []
+    for _ in range(worker_count):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                work(bundles)
+                os.write(write_fd, str(private_memory_kb()).encode("ascii"))
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+    results = []
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd, "rb") as f:
+            results.append(int(f.read()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def run_mode(mode, num_items, worker_count):
+    bundles = make_bundles(num_items)
+    if mode == "preload":
+        preload(bundles)
+    else:
+        gc.collect()
+    return run_workers(bundles, worker_count)
+
+
+def measure(mode, num_items, worker_count):
+    """
+    Runs `run_mode` in a new interpreter, returning the mean private memory of
+    the workers in kB.
+    """
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            this_file,
+            "--mode",
+            mode,
+            "--items",
+            str(num_items),
+            "--workers",
+            str(worker_count),
+        ],
+        cwd=this_dir,
+    )
+    return statistics.mean(int(value) for value in output.split())
+
+
+def supported():
+    return hasattr(os, "fork") and os.path.exists(SMAPS_ROLLUP)
+
+
+@pytest.mark.skipif(not supported(), reason="Needs os.fork and /proc/self/smaps_rollup")
+def test_preload_reduces_worker_memory():
+    plain = measure("plain", 2000, 2)
+    preloaded = measure("preload", 2000, 2)
+    assert preloaded < plain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the private memory of forked workers")
+    parser.add_argument("--items", type=int, default=10_000, help="Number of items in the generated corpus")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=MODES, help="Run a single mode, printing each worker's private memory")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(" ".join(str(kb) for kb in run_mode(args.mode, args.items, args.workers)))
+        return
+
+    if not supported():
+        sys.exit("This benchmark needs os.fork and /proc/self/smaps_rollup")
+    print(f"Python {sys.version}")
+    print(f"{args.items} items, {len(LOCALES)} locales, {args.workers} workers")
+    print()
+    print(f"{'mode':<10} {'private MB per worker':>22}")
+    for mode in MODES:
+        print(f"{mode:<10} {measure(mode, args.items, args.workers) / 1024:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
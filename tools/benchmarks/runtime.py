@@ -5,16 +5,25 @@
 
 # This should be run using pytest, see end of file
 
+import functools
 import os
 import subprocess
 import sys
+from datetime import date
 from gettext import translation
+from types import SimpleNamespace
 
 import pytest
 from fluent.runtime import FluentBundle as InterpretingFluentBundle
 from fluent.runtime import FluentResource
 
 from fluent_compiler.bundle import FluentBundle as CompilingFluentBundle
+from fluent_compiler.types import fluent_number
+
+try:
+    import markupsafe
+except ImportError:
+    markupsafe = None
 
 this_file = os.path.abspath(__file__)
 this_dir = os.path.dirname(this_file)
@@ -34,9 +43,79 @@ plural-form-select = { $count ->
     [many] There are many things, in Polish
    *[other] There are other things, in Polish
  }
+
+price = Price: { $price }
+"""
+
+FTL_HTML_MESSAGES = """
+single-string-literal-html = <b>Hello</b> I am a single string literal in Polish
+
+single-interpolation-html = <b>Hello</b> { $username }, welcome to <i>our website</i>! in Polish
 """
 
 
+# Messages for the matrix of features and locales, run with the compiler only.
+FTL_MATRIX_MESSAGES = """
+number-interpolation = You have { $number } points
+date-interpolation = Last login: { $date }
+number-options = Total: { NUMBER($number, minimumFractionDigits: 2, useGrouping: 0) }
+date-options = Joined on { DATETIME($date, dateStyle: "long") }
+
+-brand = { $case ->
+    [genitive] Firefoxa
+   *[nominative] Firefox
+ }
+parameterized-term = Welcome to { -brand(case: "genitive") }, { $username }
+
+greeting = Hello { $username }
+nested-reference = { greeting }! { number-interpolation }
+
+attribute = Login
+    .title = Log in to your account, { $username }
+
+many-variants = { $count ->
+    [0] Zero
+    [1] One
+    [2] Two
+    [3] Three
+    [4] Four
+    [5] Five
+    [6] Six
+    [7] Seven
+    [8] Eight
+    [9] Nine
+   *[other] Lots
+ }
+
+missing-argument = Hello { $username }
+
+interpolation-html = <b>Hello</b> { $username }, you have { $number } <i>points</i>
+"""
+
+MATRIX_LOCALES = ["en", "pl", "de", "ar", "ja"]
+
+MATRIX_CASES = [
+    # (name, message ID, args, whether errors are expected)
+    ("number", "number-interpolation", {"number": 1234567}, False),
+    ("date", "date-interpolation", {"date": date(2021, 3, 14)}, False),
+    ("number-options", "number-options", {"number": 1234.5}, False),
+    ("date-options", "date-options", {"date": date(2021, 3, 14)}, False),
+    ("parameterized-term", "parameterized-term", {"username": "Mary"}, False),
+    ("nested-reference", "nested-reference", {"username": "Mary", "number": 3}, False),
+    ("attribute", "attribute.title", {"username": "Mary"}, False),
+    ("many-variants", "many-variants", {"count": 9}, False),
+    ("missing-argument", "missing-argument", {}, True),
+    ("html", "interpolation-html", {"username": "<Mary>", "number": 3}, False),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def matrix_bundle(locale, use_isolating):
+    return CompilingFluentBundle.from_string(
+        locale, FTL_MATRIX_MESSAGES, use_isolating=use_isolating, escapers=[make_html_escaper()]
+    )
+
+
 @pytest.fixture(scope="module")
 def gettext_translations():
     pot_file = os.path.join(this_dir, "benchmark.pot")
@@ -109,6 +188,25 @@ def compiling_fluent_bundle():
     return CompilingFluentBundle.from_string("pl", FTL_MESSAGES, use_isolating=False)
 
 
+def make_html_escaper():
+    return SimpleNamespace(
+        select=lambda message_id=None, **kwargs: message_id.endswith("-html"),
+        output_type=markupsafe.Markup,
+        mark_escaped=markupsafe.Markup,
+        escape=markupsafe.escape,
+        join=markupsafe.Markup("").join,
+        name="html_escaper",
+        use_isolating=False,
+    )
+
+
+@pytest.fixture
+def compiling_fluent_bundle_html():
+    if markupsafe is None:
+        pytest.skip("markupsafe is required for HTML escaping benchmarks")
+    return CompilingFluentBundle.from_string("pl", FTL_HTML_MESSAGES, escapers=[make_html_escaper()])
+
+
 def unicode_gettext_method(gettext_translations):
     if hasattr(gettext_translations, "ugettext"):
         return gettext_translations.ugettext
@@ -217,6 +315,39 @@ def test_plural_form_select_fluent_interpreter(interpreting_fluent_bundle, bench
     benchmark(f)
 
 
+def test_single_string_literal_html_fluent_compiler(compiling_fluent_bundle_html, benchmark):
+    result = benchmark(compiling_fluent_bundle_html.format, "single-string-literal-html")
+    assert result[0] == "<b>Hello</b> I am a single string literal in Polish"
+
+
+def test_single_interpolation_html_fluent_compiler(compiling_fluent_bundle_html, benchmark):
+    args = {"username": "<Mary>"}
+    result = benchmark(compiling_fluent_bundle_html.format, "single-interpolation-html", args)
+    assert result[0] == "<b>Hello</b> &lt;Mary&gt;, welcome to <i>our website</i>! in Polish"
+
+
+@pytest.mark.parametrize("currency_display", ["symbol", "code", "name"])
+def test_currency_fluent_compiler(compiling_fluent_bundle, benchmark, currency_display):
+    args = {"price": fluent_number(1234.5, style="currency", currency="PLN", currencyDisplay=currency_display)}
+    result = benchmark(compiling_fluent_bundle.format, "price", args)
+    assert result[0].startswith("Price: 1\xa0234,50")
+
+
+@pytest.mark.parametrize("use_isolating", [False, True], ids=["no-isolating", "isolating"])
+@pytest.mark.parametrize("locale", MATRIX_LOCALES)
+@pytest.mark.parametrize("name, message_id, args, expect_errors", MATRIX_CASES, ids=[c[0] for c in MATRIX_CASES])
+def test_matrix_fluent_compiler(benchmark, name, message_id, args, expect_errors, locale, use_isolating):
+    if markupsafe is None:
+        pytest.skip("markupsafe is required for HTML escaping benchmarks")
+    bundle = matrix_bundle(locale, use_isolating)
+    # Group by feature, so that locales and isolating can be compared, and
+    # `--benchmark-compare` shows regressions per feature.
+    benchmark.group = f"matrix-{name}"
+    result, errors = benchmark(bundle.format, message_id, args)
+    assert bool(errors) == expect_errors, errors
+    assert type(result) in (str, markupsafe.Markup)
+
+
 if __name__ == "__main__":
     # You can execute this file directly, and optionally add more py.test args
     # to the command line (e.g. -k for keyword matching certain tests).
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Benchmark for throughput of compiling and formatting from multiple threads.
+#
+# This is mainly interesting on free-threaded builds of CPython (3.13t and
+# later), where threads can run in parallel. With the GIL, you should expect
+# throughput to stay flat or drop slightly as threads are added.
+#
+# Run it directly:
+#
+#     $ python3.13t threads.py
+#     $ python3.13t threads.py --threads 1 2 4 8 16 --duration 5
+
+import argparse
+import sys
+import threading
+import time
+
+from fluent_compiler.bundle import FluentBundle
+from fluent_compiler.compiler import compile_messages
+from fluent_compiler.resource import FtlResource
+
+FTL = """
+welcome = Welcome, { $name }!
+items = { $count ->
+    [one] One item
+   *[other] { $count } items
+ }
+price = Price: { NUMBER($price, style: "currency", currency: "EUR") }
+"""
+
+LOCALES = ["en", "de", "fr", "pl", "ru"]
+
+
+def compile_task(i):
+    compile_messages(LOCALES[i % len(LOCALES)], [FtlResource(FTL + f"tenant = Tenant {i}\n")])
+
+
+def make_format_task():
+    bundles = [FluentBundle.from_string(locale, FTL) for locale in LOCALES]
+
+    def format_task(i):
+        bundle = bundles[i % len(bundles)]
+        bundle.format("welcome", {"name": "Jane"})
+        bundle.format("items", {"count": i})
+        bundle.format("price", {"price": 1234.5})
+
+    return format_task
+
+
+def measure(task, thread_count, duration):
+    """
+    Runs `task` repeatedly in `thread_count` threads for `duration` seconds,
+    returning the total number of calls per second.
+    """
+    counts = [0] * thread_count
+    start_barrier = threading.Barrier(thread_count + 1)
+    stop = threading.Event()
+
+    def worker(index):
+        start_barrier.wait()
+        count = 0
+        while not stop.is_set():
+            task(count)
+            count += 1
+        counts[index] = count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure compile and format throughput with multiple threads")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds to run each measurement for")
+    args = parser.parse_args()
+
+    gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version}")
+    print(f"GIL enabled: {gil_enabled}")
+    print()
+    print(f"{'benchmark':<10} {'threads':>8} {'calls/s':>12} {'speedup':>8}")
+
+    for name, task in [("compile", compile_task), ("format", make_format_task())]:
+        # Warm up caches (locale data etc.)
+        for i in range(len(LOCALES)):
+            task(i)
+        baseline = None
+        for thread_count in args.threads:
+            rate = measure(task, thread_count, args.duration)
+            if baseline is None:
+                baseline = rate
+            print(f"{name:<10} {thread_count:>8} {rate:>12.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()